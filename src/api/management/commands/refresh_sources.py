@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Source
+from api.sources import get_prefetch_store
+from api.sources.refresh import RefreshScheduler
+
+class Command(BaseCommand):
+    """
+    Long-running command that prefetches every source that has a refresh
+    interval.
+
+    Prefetched copies are written to `SOURCE_PREFETCH_DIR`, where they are
+    served by the API instead of fetching the source on the request path.
+    """
+
+    help = 'Prefetches every source that has a refresh interval, each on its own schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SOURCE_REFRESH_WORKERS, help='Number of sources that may be refreshed at once.')
+        parser.add_argument('--jitter', type=float, default=settings.SOURCE_REFRESH_JITTER, help='Maximum jitter added to each delay, as a fraction of the delay.')
+        parser.add_argument('--reload', type=float, default=settings.SOURCE_REFRESH_RELOAD, help='Seconds between reloading the sources from the database.')
+        parser.add_argument('--once', action='store_true', help='Refresh every source once and exit.')
+
+    def handle(self, *args, **options):
+        if get_prefetch_store() is None:
+            raise CommandError('`SOURCE_PREFETCH_DIR` must be set to refresh sources in the background.')
+
+        scheduler = RefreshScheduler(
+            workers=options['workers'],
+            jitter=options['jitter'],
+            max_backoff=settings.SOURCE_REFRESH_MAX_BACKOFF,
+            grace=settings.SOURCE_PREFETCH_GRACE
+        )
+
+        try:
+            if options['once']:
+                scheduler.load(self.source_intervals(), self.append_only_locations())
+                scheduler.dispatch()
+                scheduler.wait()
+                return
+
+            next_reload = 0
+            while True:
+                now = time.monotonic()
+                if now >= next_reload:
+                    intervals = self.source_intervals()
+                    scheduler.load(intervals, self.append_only_locations())
+                    next_reload = now + options['reload']
+                    self.stdout.write(f'Refreshing {len(intervals)} source(s).')
+                delay = scheduler.dispatch()
+                time.sleep(min(delay if delay is not None else options['reload'], 1))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.shutdown()
+
+    def source_intervals(self):
+        """
+        Gets the refresh interval of every source location that should be
+        refreshed. If several sources share a location, the shortest interval
+        is used.
+        """
+
+        intervals = {}
+        for location, interval in Source.objects.exclude(refresh_interval=None).values_list('location', 'refresh_interval'):
+            intervals[location] = min(interval, intervals.get(location, interval))
+        return intervals
+
+    def append_only_locations(self):
+        """
+        Gets every source location that is only ever appended to.
+        """
+
+        return set(Source.objects.filter(append_only=True).values_list('location', flat=True))
@@ -0,0 +1,169 @@
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError: # pragma: no cover - brotli is an optional dependency.
+    brotli = None
+
+# Content codings that responses can be compressed with, in order of preference:
+ENCODINGS = ('br', 'gzip')
+
+def accepted_encoding(header):
+    """
+    Selects the content coding to compress a response with from the
+    `Accept-Encoding` header of the request. Brotli is preferred over gzip
+    when the client accepts both equally, and is only selected if it is
+    installed.
+
+    Arguments:
+    - header (str): Value of the `Accept-Encoding` header.
+
+    Returns:
+    str: `br`, `gzip`, or `None` if the response should not be compressed.
+    """
+
+    weights = {}
+    for coding in header.split(','):
+        name, _, parameters = coding.partition(';')
+        name = name.strip().lower()
+        weight = 1.0
+        parameter, _, value = parameters.partition('=')
+        if parameter.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    available = [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+    candidates = [(weights.get(encoding, weights.get('*', 0.0)), -index, encoding) for index, encoding in enumerate(available)]
+    weight, _, encoding = max(candidates)
+    return encoding if weight > 0 else None
+
+class _Compressor:
+    """
+    Incremental compressor for a single response body.
+    """
+
+    def __init__(self, encoding, level):
+        self._encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=level)
+        else:
+            # A window size of 16 + 15 produces a gzip header and trailer:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        """
+        Compresses part of the body. The compressed bytes are flushed, so that
+        each part reaches the client as soon as it is sent.
+        """
+
+        if self._encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """
+        Gets the end of the compressed body.
+        """
+
+        return self._compressor.finish() if self._encoding == 'br' else self._compressor.flush()
+
+class ApiCompressionMiddleware:
+    """
+    Compresses `/api/` responses with brotli or gzip, whichever the client
+    prefers, following the `API_COMPRESSION_*` settings.
+
+    Responses smaller than `API_COMPRESSION_MIN_SIZE` are sent as they are,
+    since compressing them saves too little to be worth the time. Streaming
+    responses are compressed a chunk at a time as they are sent, other than
+    Server-Sent Events.
+
+    Views can tune how hard their responses are compressed by setting
+    `gzip_level` or `brotli_quality` on the view class; otherwise the
+    `API_GZIP_LEVEL` and `API_BROTLI_QUALITY` settings are used.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Remember the view class, so that its compression levels can be used:
+        request.api_view_class = getattr(view_func, 'view_class', None)
+
+    def compress(self, request, response):
+        """
+        Compresses a response if the request and response allow it.
+        """
+
+        from django.conf import settings
+
+        if not settings.API_COMPRESSION_ENABLED or not request.path.startswith('/api/'):
+            return response
+        # Only successful responses with a body that is not already encoded
+        # are compressed:
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return response
+        # Event streams are sent an event at a time, which is too little to be
+        # worth compressing:
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < settings.API_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        compressor = _Compressor(encoding, self._level(request, encoding))
+
+        if response.streaming:
+            response.streaming_content = self._compress_stream(compressor, response.streaming_content)
+            # The length of the compressed body is not known up front:
+            del response['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different set of bytes, so a strong ETag
+        # becomes weak, as with Django's `GZipMiddleware`:
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _level(self, request, encoding):
+        """
+        Gets the level to compress the response to a request with.
+        """
+
+        from django.conf import settings
+
+        view_class = getattr(request, 'api_view_class', None)
+        if encoding == 'br':
+            level = getattr(view_class, 'brotli_quality', None)
+            return settings.API_BROTLI_QUALITY if level is None else level
+        level = getattr(view_class, 'gzip_level', None)
+        return settings.API_GZIP_LEVEL if level is None else level
+
+    def _compress_stream(self, compressor, chunks):
+        """
+        Compresses the chunks of a streaming response as they are sent.
+        """
+
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.17 on 2026-10-17 04:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_graphdataset_plot_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='refresh_interval',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_source_refresh_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='append_only',
+            field=models.BooleanField(default=False),
+        ),
+    ]
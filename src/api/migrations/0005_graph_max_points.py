@@ -0,0 +1,19 @@
+# Generated by Django 4.2.17 on 2026-10-17 05:09
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_source_append_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graph',
+            name='max_points',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True, validators=[django.core.validators.MinValueValidator(3)]),
+        ),
+    ]
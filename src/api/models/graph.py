@@ -1,5 +1,5 @@
 from django.db import models
-from django.core.validators import MinLengthValidator
+from django.core.validators import MinLengthValidator, MinValueValidator
 
 class Graph(models.Model):
     """
@@ -10,6 +10,9 @@ class Graph(models.Model):
       can be used to easily identify the graph. This should be unique. 
     - source_id (int, foreign key): ID of the data-source that supplies data to
       this graph.
+    - max_points (int): Most points that each request for the graph's data
+      returns. Series with more points are downsampled. If this is `None`,
+      every point is returned unless the request asks for fewer.
     """
 
     class Meta:
@@ -27,4 +30,5 @@ class Graph(models.Model):
         db_table_comment = 'Contains information about a graph'
 
     name = models.CharField(max_length=128, unique=False, validators=[MinLengthValidator(4)])
-    description = models.CharField(max_length=512)
\ No newline at end of file
+    description = models.CharField(max_length=512)
+    max_points = models.PositiveIntegerField(null=True, blank=True, default=None, validators=[MinValueValidator(3)])
\ No newline at end of file
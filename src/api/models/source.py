@@ -1,5 +1,5 @@
 from django.db import models
-from django.core.validators import MinLengthValidator
+from django.core.validators import MinLengthValidator, MinValueValidator
 
 class Source(models.Model):
     """
@@ -13,6 +13,12 @@ class Source(models.Model):
       This should be formatted like a URL.
     - has_header (bool): Describes if the CSV file is expected to have a
       header.
+    - refresh_interval (int): Number of seconds between background refreshes
+      of the source by the `refresh_sources` command. If this is `None`, the
+      source is only fetched when it is requested.
+    - append_only (bool): Describes if rows are only ever appended to the end
+      of the CSV file. Append-only sources are fetched incrementally by
+      requesting only the bytes added since they were last fetched.
     """
 
     class Meta:
@@ -31,4 +37,6 @@ class Source(models.Model):
 
     name = models.CharField(max_length=128, unique=False, validators=[MinLengthValidator(4)])
     location = models.CharField(max_length=256)
-    has_header = models.BooleanField(default=False)
\ No newline at end of file
+    has_header = models.BooleanField(default=False)
+    refresh_interval = models.PositiveIntegerField(null=True, blank=True, default=None, validators=[MinValueValidator(1)])
+    append_only = models.BooleanField(default=False)
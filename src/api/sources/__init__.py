@@ -0,0 +1,33 @@
+from .breaker import CircuitBreaker, SourceGuard, breaker_stats, get_source_guard, reset_source_guard
+from .cache import SnapshotStore, SourceCache, SourceSnapshot, get_prefetch_store, source_cache
+from .client import SourceClient, get_source_client, reset_source_client
+from .coalesce import FileSingleFlight, SingleFlight, coalesce_stats, source_flight
+from .fetch import SourceFetchError, fetch_source, fetch_sources, refresh_source
+from .projection import ColumnProjection
+from .table import ParsedSource
+
+__all__ = [
+    "CircuitBreaker",
+    "ColumnProjection",
+    "FileSingleFlight",
+    "ParsedSource",
+    "SingleFlight",
+    "SnapshotStore",
+    "SourceCache",
+    "SourceClient",
+    "SourceFetchError",
+    "SourceGuard",
+    "SourceSnapshot",
+    "breaker_stats",
+    "coalesce_stats",
+    "fetch_source",
+    "fetch_sources",
+    "get_prefetch_store",
+    "get_source_client",
+    "get_source_guard",
+    "refresh_source",
+    "reset_source_client",
+    "reset_source_guard",
+    "source_cache",
+    "source_flight",
+]
@@ -0,0 +1,340 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from api.sources.errors import SourceFetchError
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of an upstream and stops requests from being
+    made to it while it is known to be failing.
+
+    The breaker starts closed, allowing every request. Once
+    `failure_threshold` consecutive requests have failed it opens and rejects
+    every request for `reset_timeout` seconds. After that it is half-open: a
+    single probe request is allowed through, which closes the breaker if it
+    succeeds or opens it again if it fails. If the probe never reports back,
+    another probe is allowed after a further `reset_timeout` seconds.
+
+    Attributes:
+    - failure_threshold (int): Consecutive failures that open the breaker.
+    - reset_timeout (float): Seconds that the breaker stays open for.
+    - failures (int): Number of consecutive failures.
+    - opened (int): Number of times the breaker has opened.
+    - rejected (int): Number of requests rejected by the breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitBreaker.CLOSED
+        self._opened_at = None
+        self._probe_at = None
+
+    @property
+    def state(self):
+        """
+        Current state of the breaker.
+        """
+
+        with self._lock:
+            if self._state == CircuitBreaker.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return CircuitBreaker.HALF_OPEN
+            return self._state
+
+    @property
+    def retry_after(self):
+        """
+        Seconds until the breaker will allow a request through, or `0` if it
+        would allow one now.
+        """
+
+        with self._lock:
+            if self._state != CircuitBreaker.OPEN:
+                return 0
+            return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self):
+        """
+        Checks if a request may be made, reserving the probe request if the
+        breaker is half-open.
+        """
+
+        with self._lock:
+            now = self._clock()
+            if self._state == CircuitBreaker.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = CircuitBreaker.HALF_OPEN
+                self._probe_at = None
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.HALF_OPEN and (self._probe_at is None or now - self._probe_at >= self.reset_timeout):
+                self._probe_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """
+        Gives back the probe request reserved by `allow`, for when the request
+        was not made after all, so that another request can probe the upstream
+        straight away.
+        """
+
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                self._probe_at = None
+
+    def record_success(self):
+        """
+        Records that a request succeeded, closing the breaker.
+        """
+
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self.failures = 0
+            self._probe_at = None
+
+    def record_failure(self):
+        """
+        Records that a request failed, opening the breaker if it was half-open
+        or has reached its failure threshold.
+        """
+
+        with self._lock:
+            self.failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != CircuitBreaker.OPEN:
+                    self.opened += 1
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self):
+        """
+        Gets the state and counters of the breaker.
+        """
+
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened': self.opened,
+            'rejected': self.rejected,
+        }
+
+class BreakerGroup:
+    """
+    Thread-safe collection of circuit breakers, created on demand for each key.
+
+    Breakers that are closed and have not been used for `idle_timeout` seconds
+    are discarded, so that keys that are no longer
+    fetched do not hold on to their breakers forever.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, idle_timeout=600, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._breakers = {}
+        self._used_at = {}
+        self._pruned_at = clock()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Gets the breaker for a key, creating it if it does not exist.
+        """
+
+        with self._lock:
+            now = self._clock()
+            if now - self._pruned_at >= self.idle_timeout:
+                self._prune(now)
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self._clock)
+            self._used_at[key] = now
+            return breaker
+
+    def _prune(self, now):
+        """
+        Discards the breakers that are closed and have not been used for
+        `idle_timeout` seconds. The lock must be held.
+        """
+
+        for key in [key for key, used_at in self._used_at.items() if now - used_at >= self.idle_timeout and self._breakers[key].state == CircuitBreaker.CLOSED]:
+            del self._breakers[key]
+            del self._used_at[key]
+        self._pruned_at = now
+
+    def __len__(self):
+        with self._lock:
+            return len(self._breakers)
+
+    def stats(self):
+        """
+        Gets the state and counters of every breaker, keyed by breaker key.
+        """
+
+        with self._lock:
+            breakers = dict(self._breakers)
+        return { key: breaker.stats() for key, breaker in breakers.items() }
+
+class SourceGuard:
+    """
+    Protects the fetch path from upstreams that are failing.
+
+    Every location has its own circuit breaker, as does every host, so a host
+    that is down is detected even if each of its locations has only failed
+    once. Failures are also remembered for a short time in a negative cache so
+    that a burst of requests for a location that has just failed does not wait
+    on the upstream again. Expired failures are discarded as new ones are
+    recorded.
+
+    Only failures that indicate the upstream is unavailable (connection errors,
+    timeouts and 5xx responses) are counted. An upstream that answers, even
+    with an error, is healthy as far as the guard is concerned.
+
+    Attributes:
+    - hosts (BreakerGroup): Circuit breakers keyed by host.
+    - locations (BreakerGroup): Circuit breakers keyed by location.
+    - negative_ttl (float): Seconds that a failure is remembered for.
+    """
+
+    def __init__(self, host_threshold, location_threshold, reset_timeout, negative_ttl, idle_timeout=600, clock=time.monotonic):
+        self.hosts = BreakerGroup(host_threshold, reset_timeout, idle_timeout, clock)
+        self.locations = BreakerGroup(location_threshold, reset_timeout, idle_timeout, clock)
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._failures = {}
+        self._pruned_at = clock()
+        self._lock = threading.Lock()
+
+    def check(self, location):
+        """
+        Checks that a location may be fetched.
+
+        Throws:
+        - SourceFetchError: Thrown if the location failed recently, or if the
+          breaker for the location or its host is open.
+        """
+
+        with self._lock:
+            failure = self._failures.get(location)
+            if failure is not None:
+                error, expires_at = failure
+                if self._clock() < expires_at:
+                    raise SourceFetchError(error.message, error.status, unavailable=True)
+                del self._failures[location]
+
+        # The host is checked first, since a host that is down rejects every
+        # location on it. A probe reserved by a breaker is given back if a
+        # later breaker rejects the request, so that it is not used up by a
+        # request that was never made:
+        allowed = []
+        for key, breaker in ((_host(location), self.hosts.get(_host(location))), (location, self.locations.get(location))):
+            if not breaker.allow():
+                for allowed_breaker in allowed:
+                    allowed_breaker.release()
+                raise SourceFetchError(
+                    f'Cannot read `{location}` because `{key}` is failing, retrying in {int(breaker.retry_after) + 1}s.',
+                    503,
+                    unavailable=True
+                )
+            allowed.append(breaker)
+
+    def record_success(self, location):
+        """
+        Records that the upstream of a location answered.
+        """
+
+        self.locations.get(location).record_success()
+        self.hosts.get(_host(location)).record_success()
+
+    def record_failure(self, location, error):
+        """
+        Records that the upstream of a location is unavailable.
+        """
+
+        self.locations.get(location).record_failure()
+        self.hosts.get(_host(location)).record_failure()
+        if self.negative_ttl > 0:
+            with self._lock:
+                now = self._clock()
+                if now - self._pruned_at >= self.negative_ttl:
+                    self._failures = { key: failure for key, failure in self._failures.items() if now < failure[1] }
+                    self._pruned_at = now
+                self._failures[location] = (error, now + self.negative_ttl)
+
+    def stats(self):
+        """
+        Gets the state and counters of every breaker.
+        """
+
+        with self._lock:
+            now = self._clock()
+            failing = sum(1 for _, expires_at in self._failures.values() if now < expires_at)
+        return {
+            'hosts': self.hosts.stats(),
+            'locations': self.locations.stats(),
+            'negative_cache': failing,
+        }
+
+def _host(location):
+    """
+    Gets the host (and port) that a location is fetched from.
+    """
+
+    return urlparse(location).netloc.lower()
+
+_guard = None
+_guard_lock = threading.Lock()
+
+def get_source_guard():
+    """
+    Gets the process-wide source guard, creating it from the project settings
+    the first time it is requested, or `None` if the guard is disabled.
+    """
+
+    global _guard
+    from django.conf import settings
+    if not settings.SOURCE_BREAKER_ENABLED:
+        return None
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = SourceGuard(
+                    host_threshold=settings.SOURCE_BREAKER_HOST_THRESHOLD,
+                    location_threshold=settings.SOURCE_BREAKER_LOCATION_THRESHOLD,
+                    reset_timeout=settings.SOURCE_BREAKER_RESET_TIMEOUT,
+                    negative_ttl=settings.SOURCE_NEGATIVE_TTL,
+                    idle_timeout=settings.SOURCE_BREAKER_IDLE_TIMEOUT
+                )
+    return _guard
+
+def reset_source_guard():
+    """
+    Discards the process-wide source guard, along with every breaker and
+    remembered failure. The next call to `get_source_guard` will build a new
+    guard from the current settings.
+    """
+
+    global _guard
+    with _guard_lock:
+        _guard = None
+
+def breaker_stats():
+    """
+    Gets the state and counters of every breaker, or `None` if the guard is
+    disabled.
+    """
+
+    guard = get_source_guard()
+    return guard.stats() if guard is not None else None
@@ -0,0 +1,400 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from api.sources.table import ParsedSource
+
+class SourceSnapshot:
+    """
+    A sanitised copy of a source as it was last fetched from its location.
+
+    Attributes:
+    - location (str): Location the snapshot was fetched from.
+    - table (ParsedSource): Sanitised rows of the source, stored by column.
+    - etag (str): `ETag` validator returned by the upstream, if any. For
+      `file://` sources this is built from the modification time and size of
+      the file.
+    - last_modified (str): `Last-Modified` validator returned by the upstream,
+      if any.
+    - fetched_at (float): Time (seconds since the epoch) that the upstream last
+      confirmed the content was current.
+    - offset (int): Byte offset just past the last complete line of the source,
+      if it was recorded so that the source can be resumed.
+    - tail_hash (str): Hash of the `tail_size` bytes that end at `offset`.
+    - tail_size (int): Number of bytes hashed by `tail_hash`.
+    - complete_rows (int): Number of rows that end before `offset`.
+    - lineage (str): Identifier shared by a snapshot and every snapshot that
+      was made by appending rows to it. A snapshot that was downloaded in full
+      starts a new lineage, so clients that have rows of an older lineage must
+      start again.
+    """
+
+    def __init__(self, location, table, etag=None, last_modified=None, fetched_at=None, offset=None, tail_hash=None, tail_size=0, complete_rows=None, lineage=None):
+        """
+        Arguments:
+        - location (str): Location the snapshot was fetched from.
+        - table (ParsedSource or list): Sanitised rows of the source, either as
+          a table or as a list of rows.
+        - lineage (str, optional): Lineage of the snapshot that this snapshot
+          appended rows to. A new lineage is started if not provided.
+        """
+
+        self.location = location
+        self.table = table if isinstance(table, ParsedSource) else ParsedSource.from_rows(table)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.offset = offset
+        self.tail_hash = tail_hash
+        self.tail_size = tail_size
+        self.complete_rows = complete_rows
+        self.lineage = lineage if lineage is not None else uuid.uuid4().hex
+        self._version = None
+
+    @property
+    def rows(self):
+        """
+        Sanitised rows of the source, each a list of strings. This builds a new
+        list each time, views should read columns from `table` instead.
+        """
+
+        return self.table.rows()
+
+    @property
+    def age(self):
+        """
+        Seconds since the upstream last confirmed the content was current.
+        """
+
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def version(self):
+        """
+        Hash of the content of the snapshot, used to build the `ETag` of the
+        responses that are built from it. This is computed the first time it
+        is needed; the table of a snapshot is not changed once it is cached.
+        """
+
+        if self._version is None:
+            self._version = self.table.digest()
+        return self._version
+
+    @property
+    def stable_rows(self):
+        """
+        Number of leading rows that stay the same for as long as the lineage
+        of the snapshot lasts. This only grows within a lineage. A final row
+        without a line ending may still be completed by a later append, so it
+        is not counted.
+        """
+
+        return self.complete_rows if self.complete_rows is not None else self.table.row_count
+
+    @property
+    def has_validators(self):
+        """
+        Indicates if the upstream returned a validator that can be used to make
+        a conditional request for the source.
+        """
+
+        return self.etag is not None or self.last_modified is not None
+
+    @property
+    def can_resume(self):
+        """
+        Indicates if the snapshot recorded where the source ended, so that only
+        the bytes appended since can be requested.
+        """
+
+        return self.offset is not None and self.tail_hash is not None and self.complete_rows is not None
+
+    def conditional_headers(self):
+        """
+        Gets the request headers used to ask the upstream if the source has
+        changed since this snapshot was fetched.
+        """
+
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def as_dict(self):
+        """
+        Gets the snapshot as a JSON serialisable dictionary.
+        """
+
+        return {
+            'location': self.location,
+            'table': self.table.as_dict(),
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'fetched_at': self.fetched_at,
+            'offset': self.offset,
+            'tail_hash': self.tail_hash,
+            'tail_size': self.tail_size,
+            'complete_rows': self.complete_rows,
+            'lineage': self.lineage,
+        }
+
+class SourceCache:
+    """
+    Thread-safe, process-wide cache of source snapshots keyed by location.
+
+    Each location holds the newest version of its source that was fetched, so
+    caching a new version replaces (and frees) the old one. The cache is
+    bounded by the estimated memory used by the parsed tables rather than by
+    the number of entries: when it is over budget, the least recently used
+    snapshots are evicted.
+
+    Attributes:
+    - max_bytes (int): Memory budget in bytes. If this is `None`, the
+      `SOURCE_CACHE_MAX_BYTES` setting is used.
+    - hits (int): Number of lookups that found a snapshot.
+    - misses (int): Number of lookups that did not find a snapshot.
+    - evictions (int): Number of snapshots evicted to stay within the budget.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._snapshots = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def budget(self):
+        """
+        Memory budget of the cache in bytes.
+        """
+
+        if self.max_bytes is not None:
+            return self.max_bytes
+        from django.conf import settings
+        return settings.SOURCE_CACHE_MAX_BYTES
+
+    def get(self, location):
+        """
+        Gets the cached snapshot for a location, or `None` if there is not one.
+        """
+
+        with self._lock:
+            entry = self._snapshots.get(location)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._snapshots.move_to_end(location)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, snapshot):
+        """
+        Caches a snapshot, replacing any existing snapshot for its location.
+
+        Least recently used snapshots are evicted until the cache is within its
+        budget. A snapshot that is larger than the whole budget is not cached.
+        """
+
+        size = snapshot.table.estimate_size()
+        budget = self.budget
+        with self._lock:
+            self._remove(snapshot.location)
+            if size > budget:
+                return
+            self._snapshots[snapshot.location] = (snapshot, size)
+            self._size += size
+            while self._size > budget:
+                _, (_, evicted_size) = self._snapshots.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def delete(self, location):
+        """
+        Removes the cached snapshot for a location, if there is one.
+        """
+
+        with self._lock:
+            self._remove(location)
+
+    def clear(self):
+        """
+        Removes every cached snapshot.
+        """
+
+        with self._lock:
+            self._snapshots.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Gets the size of the cache and its lookup and eviction counters.
+        """
+
+        budget = self.budget
+        with self._lock:
+            return {
+                'entries': len(self._snapshots),
+                'bytes': self._size,
+                'max_bytes': budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, location):
+        """
+        Removes the snapshot for a location. The lock must be held.
+        """
+
+        entry = self._snapshots.pop(location, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._snapshots)
+
+class SnapshotStore:
+    """
+    Stores source snapshots as files so that they can be shared between
+    processes.
+
+    Each location is stored in its own file, named after a hash of the
+    location. Files are replaced atomically, so a reader never sees a partially
+    written snapshot.
+
+    If `keep_loaded` is set, the last snapshot read or written for each
+    location is kept in memory along with the identity (inode, modification
+    time and size) of its file. Reading the location again returns the same
+    snapshot until the file is replaced, so it is not parsed (or hashed for its
+    `version`) on every read.
+
+    Attributes:
+    - directory (str): Directory that the snapshot files are stored in.
+    - keep_loaded (bool): Indicates if loaded snapshots are kept in memory.
+    """
+
+    def __init__(self, directory, keep_loaded=False):
+        self.directory = directory
+        self.keep_loaded = keep_loaded
+        self._loaded = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, location, extension='json'):
+        """
+        Gets the path of a file that belongs to a location.
+        """
+
+        name = hashlib.sha256(location.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.{extension}')
+
+    def get(self, location):
+        """
+        Reads the snapshot stored for a location.
+
+        Returns:
+        This function returns a tuple of two values:
+        1. Snapshot: The stored snapshot, or `None` if there is not one.
+        2. Expiry: Time (seconds since the epoch) after which the snapshot
+           should no longer be served, or `None` if it does not expire.
+        """
+
+        path = self.path(location)
+        try:
+            if self.keep_loaded:
+                identity = _file_identity(os.stat(path))
+                with self._lock:
+                    loaded = self._loaded.get(location)
+                if loaded is not None and loaded[0] == identity:
+                    return loaded[1], loaded[2]
+
+            with open(path, 'r', encoding='utf-8') as file:
+                # The identity of the open file, which may since have been
+                # replaced at the path:
+                identity = _file_identity(os.fstat(file.fileno()))
+                record = json.load(file)
+            expires_at = record.pop('expires_at', None)
+            record['table'] = ParsedSource.from_dict(record['table'])
+            snapshot = SourceSnapshot(**record)
+        except (OSError, ValueError, TypeError, KeyError):
+            self._forget(location)
+            return None, None
+
+        self._keep(location, identity, snapshot, expires_at)
+        return snapshot, expires_at
+
+    def set(self, snapshot, expires_at=None):
+        """
+        Stores a snapshot, replacing any snapshot already stored for its
+        location.
+
+        Arguments:
+        - snapshot (SourceSnapshot): Snapshot to store.
+        - expires_at (float, optional): Time (seconds since the epoch) after
+          which the snapshot should no longer be served.
+        """
+
+        path = self.path(snapshot.location)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({ **snapshot.as_dict(), 'expires_at': expires_at }, file)
+            file.flush()
+            # Renaming the file keeps its identity:
+            identity = _file_identity(os.fstat(file.fileno()))
+        os.replace(temp_path, path)
+        self._keep(snapshot.location, identity, snapshot, expires_at)
+
+    def _keep(self, location, identity, snapshot, expires_at):
+        """
+        Keeps a snapshot in memory, if `keep_loaded` is set.
+        """
+
+        if self.keep_loaded:
+            with self._lock:
+                self._loaded[location] = (identity, snapshot, expires_at)
+
+    def _forget(self, location):
+        """
+        Removes the snapshot kept in memory for a location, if there is one.
+        """
+
+        with self._lock:
+            self._loaded.pop(location, None)
+
+def _file_identity(stat):
+    """
+    Gets the values of a file's status that change whenever it is replaced.
+    """
+
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+source_cache = SourceCache()
+
+_prefetch_store = None
+_prefetch_store_lock = threading.Lock()
+
+def get_prefetch_store():
+    """
+    Gets the store that `refresh_sources` writes prefetched snapshots to, or
+    `None` if prefetching is not configured.
+    """
+
+    global _prefetch_store
+    from django.conf import settings
+    directory = settings.SOURCE_PREFETCH_DIR
+    if not directory:
+        return None
+    with _prefetch_store_lock:
+        if _prefetch_store is None or _prefetch_store.directory != directory:
+            _prefetch_store = SnapshotStore(directory, keep_loaded=True)
+        return _prefetch_store
@@ -0,0 +1,121 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class SourceClient:
+    """
+    Pooled, keep-alive HTTP client used to fetch CSV sources.
+
+    Every client owns a single `HTTPAdapter`, which in turn owns one urllib3
+    connection pool per upstream host. Connections are returned to the pool
+    after each request and re-used by the next request to the same host, so
+    repeated polls of a source avoid a fresh TCP/TLS handshake.
+
+    `requests.Session` objects are not safe to share between threads (cookie
+    and header state is mutated during a request), so each thread is given its
+    own session. Every session mounts the same adapter, which means that the
+    connection pools themselves are shared by every thread in the process.
+
+    Attributes:
+    - timeout (float): Seconds to wait for an upstream source to respond.
+    - keep_alive (bool): If `False`, connections are closed after each request.
+    """
+
+    def __init__(self, pool_connections=16, pool_maxsize=16, pool_block=False, keep_alive=True, max_retries=0, timeout=10):
+        """
+        Arguments:
+        - pool_connections (int): Number of per-host connection pools to cache.
+        - pool_maxsize (int): Maximum number of connections kept per host.
+        - pool_block (bool): Wait for a free connection once a host's pool is
+          exhausted instead of opening a connection that is not pooled.
+        - keep_alive (bool): Re-use connections between requests.
+        - max_retries (int): Number of times a failed connection is retried.
+        - timeout (float): Seconds to wait for an upstream source to respond.
+        """
+
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=max_retries
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """
+        Gets the session that belongs to the calling thread, creating it if
+        required.
+        """
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self._local.session = session
+        return session
+
+    def get(self, location, headers=None, stream=False):
+        """
+        Sends a `GET` request to the given location through the connection pool.
+
+        Arguments:
+        - location (str): URL to fetch.
+        - headers (dict, optional): Additional request headers.
+        - stream (bool, optional): If `True`, the response body is not
+          downloaded until it is read.
+
+        Throws:
+        - requests.exceptions.RequestException: Thrown if the request fails.
+        """
+
+        return self.session.get(location, headers=headers, timeout=self.timeout, stream=stream)
+
+    def close(self):
+        """
+        Closes every pooled connection owned by the client.
+        """
+
+        self._adapter.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_source_client():
+    """
+    Gets the process-wide source client, creating it from the project settings
+    the first time it is requested.
+    """
+
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from django.conf import settings
+                _client = SourceClient(
+                    pool_connections=settings.SOURCE_HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.SOURCE_HTTP_POOL_MAXSIZE,
+                    pool_block=settings.SOURCE_HTTP_POOL_BLOCK,
+                    keep_alive=settings.SOURCE_HTTP_KEEP_ALIVE,
+                    max_retries=settings.SOURCE_HTTP_MAX_RETRIES,
+                    timeout=settings.SOURCE_HTTP_TIMEOUT
+                )
+    return _client
+
+def reset_source_client():
+    """
+    Closes and discards the process-wide source client. The next call to
+    `get_source_client` will build a new client from the current settings.
+    """
+
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -0,0 +1,240 @@
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover - Only available on Unix platforms.
+    fcntl = None
+
+from api.sources.cache import SnapshotStore
+
+# Seconds between checks of a lock held by another process:
+_POLL_INTERVAL = 0.05
+
+class _Call:
+    """
+    A call that is in flight for a single key.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key within a process.
+
+    The first caller for a key (the leader) runs the call. Any caller that
+    arrives for the same key while the leader is running waits for it to
+    finish and shares its result (or its exception) instead of making the call
+    again.
+
+    Attributes:
+    - executed (int): Number of calls that were run.
+    - coalesced (int): Number of calls that shared the result of another call.
+    """
+
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Runs `function()` for the key, or waits for the call that is already in
+        flight for the key.
+
+        Returns:
+        The value returned by the call.
+
+        Throws:
+        Any exception raised by the call.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """
+        Gets the call counters.
+        """
+
+        return { 'executed': self.executed, 'coalesced': self.coalesced }
+
+class FileSingleFlight:
+    """
+    Coalesces source fetches across processes that share a lock directory.
+
+    Each location has a lock file in the directory. The first process to lock
+    it fetches the source. A process that finds the lock already held marks
+    itself as waiting, by holding a shared lock on the waiting file of the
+    location, and polls the lock until it is released or `timeout` seconds
+    have passed. The fetching process only writes its snapshot next to the
+    lock when some process is waiting, and the waiting processes read it once
+    the lock is released. If no fresh snapshot was written, or the wait timed
+    out, the waiting process fetches the source itself.
+
+    Attributes:
+    - directory (str): Directory containing the lock and snapshot files.
+    - timeout (float): Most seconds to wait for another process to fetch a
+      location.
+    - executed (int): Number of fetches made by this process.
+    - coalesced (int): Number of fetches this process avoided by reading a
+      snapshot written by another process.
+    """
+
+    def __init__(self, directory, timeout=10):
+        self.directory = directory
+        self.timeout = timeout
+        self.executed = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._store = SnapshotStore(directory)
+
+    def do(self, location, function):
+        """
+        Runs `function()` to fetch the location, or re-uses the snapshot fetched
+        by another process that is already fetching it.
+
+        Returns:
+        SourceSnapshot: Snapshot of the source.
+
+        Throws:
+        Any exception raised by `function`.
+        """
+
+        started = time.time()
+        with open(self._store.path(location, 'lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is fetching the location; wait for it:
+                if not self._wait(location, lock_file):
+                    # It took too long, so the location is fetched without the
+                    # lock (and without sharing the snapshot):
+                    return self._fetch(function)
+                snapshot, _ = self._store.get(location)
+                if snapshot is not None and snapshot.fetched_at >= started:
+                    with self._lock:
+                        self.coalesced += 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    return snapshot
+
+            # This process holds the lock and must fetch the location:
+            try:
+                snapshot = self._fetch(function)
+                if self._has_waiters(location):
+                    self._store.set(snapshot)
+                return snapshot
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _wait(self, location, lock_file):
+        """
+        Polls the lock of a location that another process holds, for up to
+        `timeout` seconds, while marked as waiting for the location.
+
+        Returns:
+        bool: Indicates if the lock was taken.
+        """
+
+        deadline = time.monotonic() + self.timeout
+        with open(self._store.path(location, 'waiting'), 'a') as waiting_file:
+            fcntl.flock(waiting_file, fcntl.LOCK_SH)
+            while True:
+                time.sleep(_POLL_INTERVAL)
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        return False
+
+    def _has_waiters(self, location):
+        """
+        Indicates if any process is waiting for the location to be fetched.
+        """
+
+        with open(self._store.path(location, 'waiting'), 'a') as waiting_file:
+            try:
+                fcntl.flock(waiting_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(waiting_file, fcntl.LOCK_UN)
+            return False
+
+    def _fetch(self, function):
+        """
+        Fetches a location in this process.
+        """
+
+        with self._lock:
+            self.executed += 1
+        return function()
+
+    def stats(self):
+        """
+        Gets the fetch counters.
+        """
+
+        return { 'executed': self.executed, 'coalesced': self.coalesced }
+
+source_flight = SingleFlight()
+
+_file_flight = None
+_file_flight_lock = threading.Lock()
+
+def get_file_flight():
+    """
+    Gets the cross-process single-flight group, or `None` if cross-process
+    coalescing is not configured (or not supported by the platform).
+    """
+
+    global _file_flight
+    from django.conf import settings
+    directory = settings.SOURCE_COALESCE_LOCK_DIR
+    if not directory or fcntl is None:
+        return None
+    # A fetch takes at most this long, so there is no use waiting any longer:
+    timeout = settings.SOURCE_HTTP_TIMEOUT * (settings.SOURCE_HTTP_MAX_RETRIES + 1)
+    with _file_flight_lock:
+        if _file_flight is None or _file_flight.directory != directory or _file_flight.timeout != timeout:
+            _file_flight = FileSingleFlight(directory, timeout)
+        return _file_flight
+
+def coalesce_stats():
+    """
+    Gets the in-process and cross-process coalescing counters.
+    """
+
+    file_flight = get_file_flight()
+    return {
+        'process': source_flight.stats(),
+        'file': file_flight.stats() if file_flight is not None else None,
+    }
@@ -0,0 +1,303 @@
+import array
+import bisect
+import datetime
+import math
+import re
+import sys
+
+from api.sources.window import parse_iso_datetime
+
+# Types that a column of a source can be inferred to have:
+COLUMN_TYPES = ('int', 'float', 'timestamp', 'string')
+
+# Policies for the cells of a numeric column that are not numbers. Either the
+# cell is read as `null`, or its original text is kept:
+NON_NUMERIC_POLICIES = ('null', 'string')
+
+# A column is numeric if at least this fraction of its non-empty cells (other
+# than the first, which may be a header) are numbers:
+_NUMERIC_RATIO = 0.9
+
+# Numbers are written without leading zeros, so identifiers such as `007` keep
+# their text:
+_INT = r'[+-]?(?:0|[1-9][0-9]*)'
+_FLOAT = r'[+-]?(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?'
+_INT_VALUE = re.compile(_INT)
+_FLOAT_VALUE = re.compile(_FLOAT)
+_INT_VALUES = re.compile(f'(?:{_INT}\n)*')
+_FLOAT_VALUES = re.compile(f'(?:{_FLOAT}\n)*')
+
+# Number of cells that are converted to numbers at a time:
+_CHUNK_SIZE = 1024
+
+# Timestamps must at least have a date in ISO 8601 form:
+_TIMESTAMP_VALUES = re.compile(r'(?:[0-9]{4}-[0-9]{2}-[0-9]{2}[^\n]*\n)*')
+
+def _convert(kind, text):
+    """
+    Converts the text of a cell to a number of the given kind, or returns
+    `None` if it is not one.
+    """
+
+    if kind == 'int':
+        if _INT_VALUE.fullmatch(text) is None:
+            return None
+        number = int(text)
+        return number if -2 ** 63 <= number < 2 ** 63 else None
+    if _FLOAT_VALUE.fullmatch(text) is None:
+        return None
+    number = float(text)
+    return number if math.isfinite(number) else None
+
+def _convert_all(kind, values):
+    """
+    Converts every value to an array of the given kind, or returns `None` if
+    any of them is not a number of that kind.
+    """
+
+    pattern = _INT_VALUES if kind == 'int' else _FLOAT_VALUES
+    try:
+        text = '\n'.join(values) + '\n' if values else ''
+    except TypeError:
+        # A value is `None`:
+        return None
+    if pattern.fullmatch(text) is None:
+        return None
+    try:
+        numbers = array.array('q' if kind == 'int' else 'd', map(int if kind == 'int' else float, values))
+    except (OverflowError, ValueError):
+        # A value is out of range, or has a line break in it:
+        return None
+    if kind == 'float' and (math.inf in numbers or -math.inf in numbers):
+        return None
+    return numbers
+
+def _is_numeric(kind, values):
+    """
+    Indicates if at least `_NUMERIC_RATIO` of the values are numbers of the
+    given kind.
+
+    Values are checked in chunks. A chunk where every value is a number is
+    matched at once; other chunks are checked value by value, stopping as soon
+    as too many values are not numbers.
+    """
+
+    value_pattern, values_pattern = (_INT_VALUE, _INT_VALUES) if kind == 'int' else (_FLOAT_VALUE, _FLOAT_VALUES)
+    required = len(values) * _NUMERIC_RATIO
+    failures = 0
+    for start in range(0, len(values), _CHUNK_SIZE):
+        chunk = values[start:start + _CHUNK_SIZE]
+        if values_pattern.fullmatch('\n'.join(chunk) + '\n') is not None:
+            continue
+        failures += len(chunk) - sum(map(bool, map(value_pattern.fullmatch, chunk)))
+        if len(values) - failures < required:
+            return False
+    return True
+
+def _all_timestamps(values):
+    """
+    Indicates if every value is an ISO 8601 date or timestamp.
+    """
+
+    if _TIMESTAMP_VALUES.fullmatch('\n'.join(values) + '\n') is None:
+        return False
+    try:
+        for _ in map(datetime.datetime.fromisoformat, values):
+            pass
+        return True
+    except ValueError:
+        pass
+    # Only some versions of Python accept every timestamp that
+    # `parse_iso_datetime` does, so they are checked again with it:
+    try:
+        for _ in map(parse_iso_datetime, values):
+            pass
+        return True
+    except ValueError:
+        return False
+
+def infer_column_type(values):
+    """
+    Infers the type of a column from the text of its cells.
+
+    Empty cells and cells that are `None` are ignored. A column with no other
+    cells has no type yet.
+
+    Arguments:
+    - values (list): Text of the cells of the column, without any header.
+
+    Returns:
+    str: One of `COLUMN_TYPES`, or `None` if the column has no values.
+    """
+
+    values = list(filter(None, values))
+    if not values:
+        return None
+    for kind in ('int', 'float'):
+        if _is_numeric(kind, values):
+            return kind
+    if _all_timestamps(values):
+        return 'timestamp'
+    return 'string'
+
+class TypedColumn:
+    """
+    Column of numbers stored in a compact `array`.
+
+    Cells that are not numbers are kept separately as exceptions: `None` for a
+    row that is too short to have a value, or the original text of the cell.
+    The first cell is always kept as text if it is not a number, as it may be a
+    header.
+
+    The column can be read like a list: indexing and slicing return Python
+    numbers, the exceptions, and `None` for cells that are not numbers when the
+    policy is `null`.
+
+    Attributes:
+    - kind (str): Either `int` or `float`.
+    - non_numeric (str): Policy for cells that are not numbers, one of
+      `NON_NUMERIC_POLICIES`.
+    - numbers (array): Numbers of every cell. Cells that are exceptions are
+      `0`.
+    - exceptions (dict): Maps the index of each cell that is not a number to
+      its value.
+    """
+
+    def __init__(self, kind, non_numeric='string', numbers=None, exceptions=None):
+        self.kind = kind
+        self.non_numeric = non_numeric
+        self.numbers = numbers if numbers is not None else array.array('q' if kind == 'int' else 'd')
+        self.exceptions = exceptions if exceptions is not None else {}
+        # Indices of the exceptions in order, so that a slice only visits the
+        # exceptions inside it:
+        self._exception_indices = sorted(self.exceptions)
+
+    @classmethod
+    def from_values(cls, kind, values, non_numeric='string'):
+        """
+        Builds a column from the text of its cells.
+        """
+
+        column = cls(kind, non_numeric)
+        column.extend(values)
+        return column
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a column from the dictionary returned by `as_dict`.
+        """
+
+        numbers = array.array('q' if data['kind'] == 'int' else 'd', data['numbers'])
+        exceptions = { index: value for index, value in data['exceptions'] }
+        return cls(data['kind'], data['non_numeric'], numbers, exceptions)
+
+    def extend(self, values):
+        """
+        Appends the text of cells to the column.
+
+        Cells are converted in chunks. Chunks where every cell is a number are
+        converted at once; other chunks are appended cell by cell.
+        """
+
+        values = list(values)
+        for start in range(0, len(values), _CHUNK_SIZE):
+            chunk = values[start:start + _CHUNK_SIZE]
+            numbers = _convert_all(self.kind, chunk)
+            if numbers is None:
+                for value in chunk:
+                    self.append(value)
+            else:
+                self.numbers.extend(numbers)
+
+    def append(self, value):
+        """
+        Appends the text of a single cell to the column.
+
+        An integer column that is given a number with a fraction becomes a
+        float column.
+        """
+
+        if value is None:
+            number = None
+        else:
+            number = _convert(self.kind, value)
+            if number is None and self.kind == 'int' and _convert('float', value) is not None:
+                self.kind = 'float'
+                self.numbers = array.array('d', self.numbers)
+                number = _convert('float', value)
+        if number is None:
+            self.exceptions[len(self.numbers)] = value
+            self._exception_indices.append(len(self.numbers))
+            number = 0
+        self.numbers.append(number)
+
+    def has_value(self, index):
+        """
+        Indicates if the row at `index` was long enough to have a cell in the
+        column.
+        """
+
+        return self.exceptions.get(index, '') is not None
+
+    def head(self, row_count):
+        """
+        Gets a new column made up of the first `row_count` cells.
+        """
+
+        exceptions = { index: value for index, value in self.exceptions.items() if index < row_count }
+        return TypedColumn(self.kind, self.non_numeric, self.numbers[:row_count], exceptions)
+
+    def estimate_size(self):
+        """
+        Estimates the number of bytes of memory used by the column.
+        """
+
+        size = sys.getsizeof(self.numbers) + sys.getsizeof(self.exceptions)
+        return size + sum(sys.getsizeof(value) for value in self.exceptions.values() if value is not None)
+
+    def as_dict(self):
+        """
+        Gets the column as a JSON serialisable dictionary.
+        """
+
+        return {
+            'kind': self.kind,
+            'non_numeric': self.non_numeric,
+            'numbers': self.numbers.tolist(),
+            'exceptions': list(self.exceptions.items()),
+        }
+
+    def _value(self, index, number):
+        """
+        Gets the value of the cell at `index`, given its number.
+        """
+
+        if index not in self.exceptions:
+            return number
+        value = self.exceptions[index]
+        if value is not None and self.non_numeric == 'null' and index > 0:
+            return None
+        return value
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self.numbers))
+            numbers = self.numbers[key].tolist()
+            if step < 0:
+                return [self[index] for index in range(start, stop, step)]
+            first = bisect.bisect_left(self._exception_indices, start)
+            last = bisect.bisect_left(self._exception_indices, stop, lo=first)
+            for index in self._exception_indices[first:last]:
+                if (index - start) % step == 0:
+                    numbers[(index - start) // step] = self._value(index, None)
+            return numbers
+        if key < 0:
+            key += len(self.numbers)
+        return self._value(key, self.numbers[key])
+
+    def __iter__(self):
+        return iter(self[:])
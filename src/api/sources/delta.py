@@ -0,0 +1,59 @@
+import hashlib
+
+def data_version(config, snapshots):
+    """
+    Builds the version of the data built from some sources, which clients
+    send back as `since` to only get the rows appended since.
+
+    The version is made up of a hash of `config`, followed by the lineage and
+    number of stable rows of each source, in order of location.
+
+    Arguments:
+    - config (tuple): Everything other than the sources that the data is built
+      from, such as the datasets and query parameters. Hashed by its `repr`.
+    - snapshots (dict): Maps each location to its `SourceSnapshot`.
+
+    Returns:
+    str: The version.
+    """
+
+    digest = hashlib.blake2b(repr(config).encode('utf-8'), digest_size=8).hexdigest()
+    return '.'.join([digest] + [
+        f'{snapshots[location].lineage}-{snapshots[location].stable_rows}'
+        for location in sorted(snapshots)
+    ])
+
+def appended_since(version, config, snapshots):
+    """
+    Finds how many rows of each source a client already has, given the version
+    of the data that it last received.
+
+    Rows can only be appended if the data is built the same way (`config` has
+    not changed), and each source is the same lineage as it was and has at
+    least as many stable rows.
+
+    Arguments:
+    - version (str): Version returned by `data_version` with the data that the
+      client has.
+    - config (tuple): See `data_version`.
+    - snapshots (dict): Maps each location to its `SourceSnapshot`.
+
+    Returns:
+    dict: Maps each location to the number of its rows that the client has, or
+    `None` if the client must be sent all of the data again.
+    """
+
+    parts = version.split('.')
+    current = data_version(config, snapshots).split('.')
+    if len(parts) != len(current) or parts[0] != current[0]:
+        return None
+
+    rows = {}
+    for location, part in zip(sorted(snapshots), parts[1:]):
+        lineage, _, row_count = part.rpartition('-')
+        if lineage != snapshots[location].lineage or not row_count.isdigit():
+            return None
+        if int(row_count) > snapshots[location].stable_rows:
+            return None
+        rows[location] = int(row_count)
+    return rows
@@ -0,0 +1,165 @@
+import math
+
+# Methods that a series can be downsampled with:
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+# Fewest points that a series can be downsampled to. The first and last points
+# are always kept:
+MIN_POINTS = 3
+
+def _number(value):
+    """
+    Gets a value as a float, or `None` if it is not a finite number.
+    """
+
+    if isinstance(value, bool) or value is None:
+        return None
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+    return float(value) if math.isfinite(value) else None
+
+def lttb(values, max_points):
+    """
+    Selects the points of a series to keep with Largest-Triangle-Three-Buckets.
+
+    The series is split into `max_points - 2` buckets between its first and
+    last points. From each bucket, the point that forms the largest triangle
+    with the point selected from the previous bucket and the average of the
+    next bucket is kept. The x value of each point is its index, as the labels
+    of a chart are evenly spaced. Values that are not numbers are never
+    selected unless a bucket has no numbers at all.
+
+    This runs in linear time.
+
+    Arguments:
+    - values (list): Values of the series.
+    - max_points (int): Number of points to keep, at least `MIN_POINTS`.
+
+    Returns:
+    list: Indices of the points to keep, in order.
+    """
+
+    count = len(values)
+    if count <= max_points:
+        return list(range(count))
+
+    numbers = [_number(value) for value in values]
+    every = (count - 2) / (max_points - 2)
+    selected = 0
+    indices = [0]
+    for bucket in range(max_points - 2):
+        # Average of the next bucket (the last point for the final bucket):
+        average_start = int((bucket + 1) * every) + 1
+        average_end = min(int((bucket + 2) * every) + 1, count)
+        next_numbers = [number for number in numbers[average_start:average_end] if number is not None]
+        average_x = (average_start + average_end - 1) / 2
+        average_y = sum(next_numbers) / len(next_numbers) if next_numbers else None
+
+        selected_y = numbers[selected]
+        if selected_y is None:
+            selected_y = average_y if average_y is not None else 0.0
+        if average_y is None:
+            average_y = selected_y
+
+        # Point of this bucket with the largest triangle:
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        chosen = start
+        largest = -1.0
+        for index in range(start, end):
+            y = numbers[index]
+            if y is None:
+                continue
+            area = abs((selected - average_x) * (y - selected_y) - (selected - index) * (average_y - selected_y))
+            if area > largest:
+                largest = area
+                chosen = index
+        indices.append(chosen)
+        selected = chosen
+
+    indices.append(count - 1)
+    return indices
+
+def min_max(values, max_points):
+    """
+    Selects the points of a series to keep with min/max bucketing.
+
+    The series is split into `max_points // 2` buckets and the smallest and
+    largest points of each bucket are kept, so spikes are never lost. The first
+    and last points are always kept too. Buckets that have no numbers keep their
+    first point.
+
+    This runs in linear time.
+
+    Arguments:
+    - values (list): Values of the series.
+    - max_points (int): Most points to keep, at least `MIN_POINTS`.
+
+    Returns:
+    list: Indices of the points to keep, in order.
+    """
+
+    count = len(values)
+    if count <= max_points:
+        return list(range(count))
+
+    numbers = [_number(value) for value in values]
+    # Leave room for the first and last points:
+    buckets = (max_points - 2) // 2 or 1
+    every = count / buckets
+    indices = {0, count - 1}
+    for bucket in range(buckets):
+        start = int(bucket * every)
+        end = min(int((bucket + 1) * every), count)
+        lowest = highest = None
+        for index in range(start, end):
+            y = numbers[index]
+            if y is None:
+                continue
+            if lowest is None or y < numbers[lowest]:
+                lowest = index
+            if highest is None or y > numbers[highest]:
+                highest = index
+        if lowest is None:
+            indices.add(start)
+        else:
+            indices.add(lowest)
+            indices.add(highest)
+    return sorted(indices)
+
+def downsample_indices(series, length, max_points, method='lttb'):
+    """
+    Selects the rows to keep so that several series that share the same labels
+    can be downsampled together and stay aligned with the labels.
+
+    Each series is given an equal share of `max_points` (but at least
+    `MIN_POINTS`), and the rows selected for any series are kept for all of
+    them. If there are no series, evenly spaced rows are kept.
+
+    Arguments:
+    - series (list): Values of each series. Series that are shorter than
+      `length` are treated as having no numbers past their end.
+    - length (int): Number of rows.
+    - max_points (int): Most rows to keep, at least `MIN_POINTS`.
+    - method (str): One of `DOWNSAMPLE_METHODS`.
+
+    Returns:
+    list: Indices of the rows to keep, in order.
+    """
+
+    if length <= max_points:
+        return list(range(length))
+    if not series:
+        every = (length - 1) / (max_points - 1)
+        return sorted({ round(point * every) for point in range(max_points) })
+
+    select = lttb if method == 'lttb' else min_max
+    share = max(MIN_POINTS, max_points // len(series))
+    indices = set()
+    for values in series:
+        values = values[:length] + [None] * (length - len(values))
+        indices.update(select(values, share))
+    return sorted(indices)
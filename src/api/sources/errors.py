@@ -0,0 +1,17 @@
+class SourceFetchError(Exception):
+    """
+    Raised when a source cannot be fetched.
+
+    Attributes:
+    - message (str): Human-readable description of the failure.
+    - status (int): HTTP response code that should be returned to the client.
+    - unavailable (bool): Indicates that the upstream could not be reached,
+      timed out, or answered with a server error, rather than returning data
+      that could not be used.
+    """
+
+    def __init__(self, message, status=400, unavailable=False):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.unavailable = unavailable
@@ -0,0 +1,476 @@
+import logging
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from django.conf import settings
+
+from api.sources.breaker import get_source_guard
+from api.sources.cache import SourceSnapshot, get_prefetch_store, source_cache
+from api.sources.client import get_source_client
+from api.sources.coalesce import get_file_flight, source_flight
+from api.sources.errors import SourceFetchError
+from api.sources.local import read_file_source, resolve_file_location
+from api.sources.stream import CsvStreamReader, hash_tail, read_csv_stream, split_prefix
+
+logger = logging.getLogger(__name__)
+
+def fetch_source(location, append_only=False):
+    """
+    Fetches and sanitises the CSV source at the given location.
+
+    If the `refresh_sources` command has prefetched the location and its copy
+    has not expired, the prefetched copy is returned without making a request.
+
+    If `SOURCE_SWR_ENABLED` is set, the last good copy of the location is
+    returned without making a request while it is younger than
+    `SOURCE_SWR_FRESH_TTL`. Once it is older, it is still returned immediately
+    while a refresh runs in the background for the next caller, up until it is
+    older than `SOURCE_SWR_MAX_STALE`; after that the caller waits for a fresh
+    copy.
+
+    Concurrent fetches of the same location are coalesced so that only one of
+    them reaches the upstream; the others share its snapshot. If
+    `SOURCE_COALESCE_LOCK_DIR` is configured, fetches are also coalesced with
+    other processes that share the directory.
+
+    While the upstream of a location is failing, fetches fail fast rather than
+    waiting on the upstream. See `_fetch`.
+
+    Arguments:
+    - location (str): Location of the source.
+    - append_only (bool, optional): Indicates that the source is only ever
+      appended to, so only the bytes added since it was last fetched need to
+      be downloaded.
+
+    Returns:
+    SourceSnapshot: Snapshot of the source.
+
+    Throws:
+    - SourceFetchError: Thrown if the source cannot be fetched.
+    """
+
+    validate_location(location)
+
+    prefetch_store = get_prefetch_store()
+    if prefetch_store is not None:
+        snapshot, expires_at = prefetch_store.get(location)
+        if snapshot is not None and (expires_at is None or time.time() < expires_at):
+            return snapshot
+
+    if settings.SOURCE_SWR_ENABLED and settings.SOURCE_CACHE_ENABLED:
+        cached = source_cache.get(location)
+        if cached is not None:
+            age = cached.age
+            if age <= settings.SOURCE_SWR_FRESH_TTL:
+                return cached
+            if age <= settings.SOURCE_SWR_MAX_STALE:
+                _revalidate_in_background(location, append_only)
+                return cached
+
+    return _fetch(location, append_only)
+
+def refresh_source(location, expires_in, append_only=False):
+    """
+    Fetches a source from its upstream and stores it in the prefetch store so
+    that it can be served by `fetch_source` in any process.
+
+    Arguments:
+    - location (str): Location of the source.
+    - expires_in (float): Seconds that the stored copy may be served for.
+    - append_only (bool, optional): Indicates that the source is only ever
+      appended to.
+
+    Returns:
+    SourceSnapshot: Snapshot of the source.
+
+    Throws:
+    - SourceFetchError: Thrown if the source cannot be fetched.
+    """
+
+    validate_location(location)
+    snapshot = _fetch(location, append_only)
+    prefetch_store = get_prefetch_store()
+    if prefetch_store is not None:
+        prefetch_store.set(snapshot, expires_at=snapshot.fetched_at + expires_in)
+    return snapshot
+
+def validate_location(location):
+    """
+    Validates that a location can be fetched.
+
+    `file://` locations are only allowed if they are inside of
+    `SOURCE_FILE_ROOT`.
+
+    Throws:
+    - SourceFetchError: Thrown if the location cannot be parsed or uses an
+      unsupported scheme.
+    """
+
+    # Parse the URL for the source:
+    try:
+        url = urlparse(location)
+    except ValueError:
+        raise SourceFetchError(f'Cannot parse location: `{location}`.')
+
+    if url.scheme == 'file':
+        resolve_file_location(location, settings.SOURCE_FILE_ROOT)
+    elif url.scheme not in ('http', 'https'):
+        raise SourceFetchError(f'Cannot open location because `{url.scheme}` is not a supported URL scheme.')
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+def _revalidate_in_background(location, append_only=False):
+    """
+    Starts fetching a location on the fetch pool, unless it is already being
+    revalidated. The result replaces the cached copy of the location.
+    """
+
+    with _revalidating_lock:
+        if location in _revalidating:
+            return
+        _revalidating.add(location)
+
+    def revalidate():
+        try:
+            _fetch(location, append_only)
+        except SourceFetchError as error:
+            logger.warning(f'Failed to revalidate source `{location}`: {error.message}')
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(location)
+
+    get_fetch_executor().submit(revalidate)
+
+def _fetch(location, append_only=False):
+    """
+    Fetches a source from its upstream, coalescing with any fetch of the same
+    location that is already in flight.
+
+    If the location failed within the last `SOURCE_NEGATIVE_TTL` seconds, or
+    the circuit breaker for the location or its host is open, the fetch fails
+    immediately without contacting the upstream. If `SOURCE_STALE_IF_ERROR` is
+    set, the last good copy of the location is returned instead of failing
+    whenever the upstream is unavailable.
+    """
+
+    try:
+        guard = get_source_guard()
+        if guard is not None:
+            guard.check(location)
+        if not settings.SOURCE_COALESCE_ENABLED:
+            return _download_guarded(location, append_only)
+        return source_flight.do(location, lambda: _download_shared(location, append_only))
+    except SourceFetchError as error:
+        last_good = _last_good(location) if error.unavailable else None
+        if last_good is None:
+            raise
+        logger.warning(f'Serving last good copy of source `{location}`: {error.message}')
+        return last_good
+
+def _last_good(location):
+    """
+    Gets the last good copy of a location that can be served while its
+    upstream is unavailable, or `None` if there is not one.
+    """
+
+    if not settings.SOURCE_STALE_IF_ERROR:
+        return None
+    snapshot = source_cache.get(location) if settings.SOURCE_CACHE_ENABLED else None
+    if snapshot is None:
+        # A prefetched copy may still be available, even if it has expired:
+        prefetch_store = get_prefetch_store()
+        if prefetch_store is not None:
+            snapshot, _ = prefetch_store.get(location)
+    return snapshot
+
+def _download_shared(location, append_only=False):
+    """
+    Downloads a source, coalescing with other processes when cross-process
+    coalescing is configured.
+    """
+
+    file_flight = get_file_flight()
+    if file_flight is None:
+        return _download_guarded(location, append_only)
+
+    snapshot = file_flight.do(location, lambda: _download_guarded(location, append_only))
+    if settings.SOURCE_CACHE_ENABLED and (snapshot.has_validators or snapshot.can_resume):
+        # The snapshot may have been fetched by another process; keep it so
+        # that the next fetch from this process can be conditional:
+        source_cache.set(snapshot)
+    return snapshot
+
+def _download_guarded(location, append_only=False):
+    """
+    Downloads a source, recording the outcome with the source guard.
+    """
+
+    guard = get_source_guard()
+    if guard is None:
+        return _download(location, append_only)
+
+    try:
+        snapshot = _download(location, append_only)
+    except SourceFetchError as error:
+        if error.unavailable:
+            guard.record_failure(location, error)
+        else:
+            # The upstream answered, even though its answer was not usable:
+            guard.record_success(location)
+        raise
+    guard.record_success(location)
+    return snapshot
+
+def _download(location, append_only=False):
+    """
+    Downloads and sanitises a source.
+
+    The body is streamed and parsed as it arrives. The download is abandoned as
+    soon as the source exceeds `SOURCE_MAX_BYTES` or `SOURCE_MAX_ROWS`.
+
+    If a previous download of the location returned an `ETag` or
+    `Last-Modified` validator, the request is made conditional. When the
+    upstream answers `304 Not Modified` the cached snapshot is returned without
+    downloading or sanitising the content again.
+
+    If the source is append-only and a previous download recorded where the
+    source ended, only the bytes from that point onwards are requested. See
+    `_download_appended`.
+
+    `file://` locations are read directly from the filesystem, without going
+    through the HTTP client.
+    """
+
+    cached = source_cache.get(location) if settings.SOURCE_CACHE_ENABLED else None
+
+    snapshot = None
+    if location.startswith('file:'):
+        snapshot = read_file_source(
+            location,
+            settings.SOURCE_FILE_ROOT,
+            max_bytes=settings.SOURCE_MAX_BYTES,
+            max_rows=settings.SOURCE_MAX_ROWS,
+            cached=cached,
+            append_only=append_only
+        )
+    elif append_only and cached is not None and cached.can_resume:
+        snapshot = _download_appended(location, cached)
+    if snapshot is None:
+        snapshot = _download_full(location, cached, append_only)
+
+    # Infer the type of any column that has not been inferred yet. Columns of a
+    # snapshot that was re-used or resumed keep the types they already have:
+    if settings.SOURCE_INFER_TYPES:
+        snapshot.table.infer_types(settings.SOURCE_NON_NUMERIC)
+
+    # Only sources that can be revalidated, resumed or served while stale are
+    # worth keeping:
+    if settings.SOURCE_CACHE_ENABLED:
+        if snapshot.has_validators or snapshot.can_resume or settings.SOURCE_SWR_ENABLED or settings.SOURCE_STALE_IF_ERROR:
+            source_cache.set(snapshot)
+        elif cached is not None:
+            source_cache.delete(location)
+    return snapshot
+
+def _download_full(location, cached, append_only):
+    """
+    Downloads and sanitises the whole of a source.
+
+    When the source is append-only, where the source ended is recorded on the
+    snapshot so that the next download can resume from it.
+    """
+
+    # Stream the CSV data from the source:
+    try:
+        response = get_source_client().get(location, headers=cached.conditional_headers() if cached else None, stream=True)
+        try:
+            if cached is not None and response.status_code == 304:
+                # The source has not changed, the cached copy is still current:
+                cached.fetched_at = time.time()
+                return cached
+            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+            _check_content_type(response)
+            reader = CsvStreamReader(response.encoding or 'utf-8', settings.SOURCE_MAX_BYTES, settings.SOURCE_MAX_ROWS)
+            table = read_csv_stream(
+                response,
+                max_bytes=settings.SOURCE_MAX_BYTES,
+                max_rows=settings.SOURCE_MAX_ROWS,
+                chunk_size=settings.SOURCE_STREAM_CHUNK_SIZE,
+                reader=reader
+            )
+        finally:
+            # Closing the response releases the connection back to the pool, or
+            # drops it if the body was abandoned part way through:
+            response.close()
+    except requests.exceptions.RequestException as exception:
+        raise _request_error(location, exception)
+
+    snapshot = SourceSnapshot(
+        location,
+        table,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified')
+    )
+    if append_only:
+        snapshot.offset = reader.offset
+        snapshot.tail_hash = reader.tail_hash
+        snapshot.tail_size = len(reader.tail)
+        snapshot.complete_rows = reader.complete_rows
+    return snapshot
+
+def _download_appended(location, cached):
+    """
+    Downloads only the bytes that have been appended to a source since the
+    cached snapshot was taken.
+
+    The request asks for a `Range` that starts `tail_size` bytes before where
+    the snapshot ended. The overlapping bytes are hashed and compared with the
+    snapshot to make sure that the source has only been appended to, then the
+    remaining bytes are parsed and their rows added to the rows of the
+    snapshot. A final row without a line ending is always read again, since it
+    may not have been completely written the last time.
+
+    Returns:
+    SourceSnapshot: Snapshot of the source, or `None` if the upstream does not
+    support ranges or the source has been rewritten, in which case the whole
+    source should be downloaded instead.
+    """
+
+    start = cached.offset - cached.tail_size
+    headers = { **cached.conditional_headers(), 'Range': f'bytes={start}-' }
+    try:
+        response = get_source_client().get(location, headers=headers, stream=True)
+        try:
+            if response.status_code == 304:
+                # Nothing has been appended, the cached copy is still current:
+                cached.fetched_at = time.time()
+                return cached
+            if response.status_code != 206 or not response.headers.get('Content-Range', '').startswith(f'bytes {start}-'):
+                # The upstream ignored the range, or the source is now shorter
+                # than it was (416 Range Not Satisfiable):
+                return None
+            _check_content_type(response)
+            chunks = response.iter_content(chunk_size=settings.SOURCE_STREAM_CHUNK_SIZE)
+            tail, chunks = split_prefix(chunks, cached.tail_size)
+            if hash_tail(tail) != cached.tail_hash:
+                # The bytes before the new data have changed, so the source has
+                # been rewritten:
+                return None
+            # The cached table is copied rather than extended since other
+            # requests may still be reading it:
+            reader = CsvStreamReader(
+                response.encoding or 'utf-8',
+                settings.SOURCE_MAX_BYTES,
+                settings.SOURCE_MAX_ROWS,
+                offset=cached.offset,
+                tail=tail,
+                table=cached.table.head(cached.complete_rows)
+            )
+            table = reader.read(chunks)
+        finally:
+            response.close()
+    except requests.exceptions.RequestException as exception:
+        raise _request_error(location, exception)
+
+    return SourceSnapshot(
+        location,
+        table,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified'),
+        offset=reader.offset,
+        tail_hash=reader.tail_hash,
+        tail_size=len(reader.tail),
+        complete_rows=reader.complete_rows,
+        lineage=cached.lineage
+    )
+
+def _request_error(location, exception):
+    """
+    Converts an exception raised while requesting a source into a fetch
+    error. Connection errors, timeouts and server errors are marked as the
+    upstream being unavailable.
+    """
+
+    response = getattr(exception, 'response', None)
+    unavailable = isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) or (
+        response is not None and (response.status_code >= 500 or response.status_code == 429)
+    )
+    return SourceFetchError(f'Failed to read CSV data from location `{location}`: {exception}.', unavailable=unavailable)
+
+def _check_content_type(response):
+    """
+    Throws:
+    - SourceFetchError: Thrown if the response is not a CSV file.
+    """
+
+    if 'text/csv' not in response.headers.get('Content-Type', ''):
+        raise SourceFetchError('The provided URL does not return a valid CSV file.')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_fetch_executor():
+    """
+    Gets the process-wide thread pool used to fetch sources concurrently,
+    creating it the first time it is requested.
+
+    The pool size (`SOURCE_FETCH_WORKERS`) bounds the number of fetches that
+    can be in flight across every request handled by the process.
+    """
+
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SOURCE_FETCH_WORKERS,
+                    thread_name_prefix='source-fetch'
+                )
+    return _executor
+
+def fetch_sources(locations, append_only=()):
+    """
+    Fetches many sources concurrently.
+
+    Each distinct location is fetched once. No more than
+    `SOURCE_FETCH_MAX_PARALLEL` fetches are in flight for a single call, which
+    stops one large graph from occupying the entire fetch pool.
+
+    Arguments:
+    - locations (iterable of str): Locations to fetch.
+    - append_only (collection of str, optional): Locations that are only ever
+      appended to.
+
+    Returns:
+    dict: Maps each location to either its `SourceSnapshot`, or the
+    `SourceFetchError` raised while fetching it. Locations appear in the order
+    they were first given.
+    """
+
+    locations = list(dict.fromkeys(locations))
+    if len(locations) <= 1:
+        # There is nothing to fetch in parallel, avoid handing off to the pool:
+        return { location: _fetch_or_error(location, location in append_only) for location in locations }
+
+    executor = get_fetch_executor()
+    slots = threading.BoundedSemaphore(max(1, settings.SOURCE_FETCH_MAX_PARALLEL))
+    futures = {}
+    for location in locations:
+        slots.acquire()
+        future = executor.submit(_fetch_or_error, location, location in append_only)
+        future.add_done_callback(lambda _: slots.release())
+        futures[location] = future
+    return { location: future.result() for location, future in futures.items() }
+
+def _fetch_or_error(location, append_only=False):
+    """
+    Fetches a source, returning the fetch error instead of raising it.
+    """
+
+    try:
+        return fetch_source(location, append_only)
+    except SourceFetchError as error:
+        return error
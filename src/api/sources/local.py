@@ -0,0 +1,149 @@
+import os
+import time
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+from api.sources.cache import SourceSnapshot
+from api.sources.errors import SourceFetchError
+from api.sources.stream import CsvStreamReader, hash_tail
+
+def resolve_file_location(location, root):
+    """
+    Gets the path of the file that a `file://` location refers to.
+
+    Arguments:
+    - location (str): A `file://` location.
+    - root (str): Directory that every file source must be inside of, or
+      `None` if file sources are not allowed.
+
+    Returns:
+    str: Real path of the file, with every symbolic link resolved.
+
+    Throws:
+    - SourceFetchError: Thrown if file sources are not allowed, or if the file
+      is outside of `root`.
+    """
+
+    if not root:
+        raise SourceFetchError('Cannot open location because file sources are not enabled.')
+
+    url = urlparse(location)
+    if url.netloc not in ('', 'localhost'):
+        raise SourceFetchError(f'Cannot open location because `{url.netloc}` is not a local host.')
+
+    # Resolve symbolic links and `..` before checking the file is inside of the
+    # root, so that neither can be used to escape it:
+    root = os.path.realpath(root)
+    path = os.path.realpath(url2pathname(unquote(url.path)))
+    if os.path.commonpath([root, path]) != root:
+        raise SourceFetchError('Cannot open location because it is outside of the source directory.')
+    return path
+
+def file_validator(stat_result):
+    """
+    Gets a validator that changes whenever a file is modified, built from its
+    modification time and size.
+    """
+
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def read_file_source(location, root, max_bytes, max_rows, cached=None, append_only=False, chunk_size=65536):
+    """
+    Reads and sanitises a CSV source from the local filesystem.
+
+    The file is read and parsed in chunks, so it is never copied into memory as
+    a whole. The modification time and size of the file are used as its
+    validator: if they match `cached`, the cached snapshot is returned without
+    reading the file.
+
+    Only the bytes that were in the file when it was opened are read, so rows
+    appended while it is being read are left for the next read. A file that is
+    rewritten in place may still be read part way through being written, so
+    files that are not only appended to should be replaced atomically (written
+    to a temporary file that is then renamed over the source).
+
+    If the source is append-only and the bytes before where `cached` ended are
+    unchanged, only the bytes after that point are read.
+
+    Arguments:
+    - location (str): A `file://` location.
+    - root (str): Directory that every file source must be inside of.
+    - max_bytes (int): Maximum size of the file in bytes.
+    - max_rows (int): Maximum number of rows in the file.
+    - cached (SourceSnapshot, optional): Snapshot from the last read.
+    - append_only (bool, optional): Indicates that the file is only ever
+      appended to.
+    - chunk_size (int, optional): Number of bytes read at a time.
+
+    Returns:
+    SourceSnapshot: Snapshot of the source.
+
+    Throws:
+    - SourceFetchError: Thrown if the file cannot be read, exceeds either
+      limit, or is truncated while it is being read.
+    """
+
+    path = resolve_file_location(location, root)
+    try:
+        with open(path, 'rb') as file:
+            stat_result = os.fstat(file.fileno())
+            validator = file_validator(stat_result)
+            if cached is not None and cached.etag == validator:
+                # The file has not changed, the cached copy is still current:
+                cached.fetched_at = time.time()
+                return cached
+            if stat_result.st_size > max_bytes:
+                raise SourceFetchError(f'Source is larger than the maximum of {max_bytes} bytes.')
+
+            tail = _resume_tail(file, stat_result.st_size, cached) if append_only else None
+            resumed = tail is not None
+            if resumed:
+                # Only parse the rows that have been appended:
+                reader = CsvStreamReader('utf-8', max_bytes, max_rows, offset=cached.offset, tail=tail, table=cached.table.head(cached.complete_rows))
+            else:
+                reader = CsvStreamReader('utf-8', max_bytes, max_rows)
+            file.seek(reader.offset)
+            table = reader.read(_read_chunks(file, stat_result.st_size - reader.offset, chunk_size))
+    except OSError as error:
+        raise SourceFetchError(f'Failed to read CSV data from location `{location}`: {error.strerror}.')
+
+    # Rows that were appended to the cached snapshot continue its lineage:
+    snapshot = SourceSnapshot(location, table, etag=validator, lineage=cached.lineage if resumed else None)
+    if append_only:
+        snapshot.offset = reader.offset
+        snapshot.tail_hash = reader.tail_hash
+        snapshot.tail_size = len(reader.tail)
+        snapshot.complete_rows = reader.complete_rows
+    return snapshot
+
+def _resume_tail(file, size, cached):
+    """
+    Reads the bytes before where a snapshot ended, if the snapshot can be
+    resumed and they are unchanged.
+
+    Returns:
+    bytes: The bytes before where the snapshot ended, or `None` if the file
+    must be read in full.
+    """
+
+    if cached is None or not cached.can_resume or cached.offset > size:
+        return None
+    file.seek(cached.offset - cached.tail_size)
+    tail = file.read(cached.tail_size)
+    return tail if hash_tail(tail) == cached.tail_hash else None
+
+def _read_chunks(file, size, chunk_size):
+    """
+    Reads the next `size` bytes of a file in chunks.
+
+    Throws:
+    - SourceFetchError: Thrown if the file ends before `size` bytes are read.
+    """
+
+    remaining = size
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            raise SourceFetchError('Source was truncated while it was being read.')
+        remaining -= len(chunk)
+        yield chunk
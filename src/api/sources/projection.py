@@ -0,0 +1,66 @@
+class ColumnProjection:
+    """
+    Plan of the columns of each source that a graph needs.
+
+    Every `(location, column)` pair that is referenced is collected first, and
+    then each distinct pair is extracted exactly once, so datasets that
+    reference the same column share one extracted list and columns that no
+    dataset references are never copied.
+    """
+
+    def __init__(self):
+        self._columns = {}
+
+    def add(self, location, column, start=0):
+        """
+        Adds a column of a source to the plan.
+
+        Arguments:
+        - location (str): The location of the source.
+        - column (int): The index of the column.
+        - start (int): The index of the first row to extract, so that a header
+          can be skipped.
+
+        Returns:
+        tuple: The key of the extracted column in the result of `extract`.
+        """
+
+        key = (location, column, start)
+        self._columns.setdefault(location, set()).add(key)
+        return key
+
+    def locations(self):
+        """
+        Gets every location that has at least one column in the plan.
+        """
+
+        return list(self._columns)
+
+    def extract(self, tables, first=0, last=None):
+        """
+        Extracts every column in the plan.
+
+        Values of rows that are too short to have a value for a column are
+        `None`, except at the end of the column, where they are removed.
+
+        Arguments:
+        - tables (dict): Maps each location to its `ParsedSource`.
+        - first (int): Index of the first row to extract, counted from the
+          `start` of each column.
+        - last (int, optional): Index just past the last row to extract,
+          counted from the `start` of each column.
+
+        Returns:
+        dict: Maps the key returned by `add` to the values of the column.
+        """
+
+        columns = {}
+        for location, keys in self._columns.items():
+            table = tables[location]
+            for key in keys:
+                _, column, start = key
+                values = table.column(column, start + first, None if last is None else start + last)
+                while values and values[-1] is None:
+                    values.pop()
+                columns[key] = values
+        return columns
@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.sources.fetch import SourceFetchError, refresh_source
+
+logger = logging.getLogger(__name__)
+
+class RefreshScheduler:
+    """
+    Refreshes sources in the background, each on its own schedule.
+
+    Every location is refreshed once per refresh interval. A random jitter is
+    added to each delay so that sources with the same interval do not all
+    refresh at the same moment. When a refresh fails, the delay before the next
+    attempt doubles with each consecutive failure (up to `max_backoff`) so that
+    an upstream that is down is not hammered.
+
+    Attributes:
+    - jitter (float): Maximum jitter, as a fraction of the delay.
+    - max_backoff (float): Maximum delay (in seconds) after a failure.
+    - grace (float): Multiple of the refresh interval that a prefetched copy
+      may be served for. This keeps a copy available if a refresh fails.
+    """
+
+    def __init__(self, workers=4, jitter=0.1, max_backoff=3600, grace=2, clock=time.time):
+        """
+        Arguments:
+        - workers (int): Number of sources that may be refreshed at once.
+        - jitter (float): Maximum jitter, as a fraction of the delay.
+        - max_backoff (float): Maximum delay (in seconds) after a failure.
+        - grace (float): Multiple of the refresh interval that a prefetched
+          copy may be served for.
+        - clock (callable): Returns the current time in seconds.
+        """
+
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.grace = grace
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='source-refresh')
+        self._lock = threading.Lock()
+        self._intervals = {}
+        self._append_only = frozenset()
+        self._due = {}
+        self._failures = {}
+        self._in_flight = {}
+
+    def load(self, intervals, append_only=()):
+        """
+        Updates the sources that are refreshed.
+
+        New locations are due immediately, locations that are no longer present
+        are dropped, and the interval of existing locations is updated from
+        their next refresh onwards.
+
+        Arguments:
+        - intervals (dict): Maps each location to its refresh interval in
+          seconds.
+        - append_only (collection of str, optional): Locations that are only
+          ever appended to.
+        """
+
+        now = self._clock()
+        with self._lock:
+            for location in set(self._intervals) - set(intervals):
+                del self._intervals[location]
+                self._due.pop(location, None)
+                self._failures.pop(location, None)
+            for location, interval in intervals.items():
+                if location not in self._intervals:
+                    self._due[location] = now
+                self._intervals[location] = interval
+            self._append_only = frozenset(append_only)
+
+    def dispatch(self):
+        """
+        Starts a refresh of every location that is due and is not already being
+        refreshed.
+
+        Returns:
+        float: Seconds until the next location is due, or `None` if there are
+        no locations to refresh.
+        """
+
+        now = self._clock()
+        with self._lock:
+            for location, due in self._due.items():
+                if due <= now and location not in self._in_flight:
+                    self._in_flight[location] = self._executor.submit(self._refresh, location, self._intervals[location])
+            pending = [due for location, due in self._due.items() if location not in self._in_flight]
+        if not pending:
+            return None
+        return max(0, min(pending) - now)
+
+    def wait(self):
+        """
+        Waits for every refresh that is in flight to finish.
+        """
+
+        with self._lock:
+            futures = list(self._in_flight.values())
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        """
+        Waits for every refresh that is in flight to finish and stops the
+        worker pool.
+        """
+
+        self._executor.shutdown(wait=True)
+
+    def delay(self, interval, failures):
+        """
+        Gets the delay before the next refresh of a location.
+
+        Arguments:
+        - interval (float): Refresh interval of the location.
+        - failures (int): Number of consecutive failed refreshes.
+        """
+
+        delay = interval if failures == 0 else min(interval * 2 ** failures, self.max_backoff)
+        return delay + random.uniform(0, delay * self.jitter)
+
+    def _refresh(self, location, interval):
+        """
+        Refreshes a location and schedules its next refresh.
+        """
+
+        try:
+            refresh_source(location, interval * self.grace, append_only=location in self._append_only)
+            failures = 0
+        except SourceFetchError as error:
+            logger.warning(f'Failed to refresh source `{location}`: {error.message}')
+            failures = self._failures.get(location, 0) + 1
+        except Exception:
+            logger.exception(f'Unexpected error while refreshing source `{location}`.')
+            failures = self._failures.get(location, 0) + 1
+
+        with self._lock:
+            self._in_flight.pop(location, None)
+            if location in self._intervals:
+                self._failures[location] = failures
+                self._due[location] = self._clock() + self.delay(self._intervals[location], failures)
@@ -0,0 +1,110 @@
+import html
+import re
+
+# Characters that are allowed in a cleaned CSV value. Any other character is
+# removed by `clean_value`:
+ALLOWED_CSV_CHARSET='abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-./\\({)}[]+<>,!?£$%^&* '
+
+# Characters that must be escaped before text can be embedded in HTML. A
+# non-breaking space is escaped too, matching how `nh3` serialises it, and null
+# characters are dropped, as the HTML parser does:
+_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '\xa0': '&nbsp;',
+    '\x00': None,
+})
+
+# Text that contains none of these characters is already clean:
+_NEEDS_CLEANING = re.compile('[&<>\r\x00\xa0\ufeff]')
+
+# Values made up only of these characters, without leading or trailing spaces,
+# are already clean:
+_SAFE_CHARSET = re.escape(ALLOWED_CSV_CHARSET.translate(str.maketrans('', '', '&<> ')))
+_CLEAN_VALUE = re.compile(f'(?:[{_SAFE_CHARSET}](?:[{_SAFE_CHARSET} ]*[{_SAFE_CHARSET}])?)?')
+
+_DISALLOWED = re.compile(f'[^{re.escape(ALLOWED_CSV_CHARSET)}]+')
+
+# Matches a character reference, as `html.unescape` does:
+_REFERENCE = re.compile(r'&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)')
+
+def _decode_reference(match):
+    """
+    Decodes a single character reference.
+
+    Unlike `html.unescape`, numeric references to control characters and
+    non-characters are decoded rather than dropped, which is what the HTML
+    parser does.
+    """
+
+    reference = match.group(1)
+    if reference[0] == '#':
+        number = int(reference[2:].rstrip(';'), 16) if reference[1] in 'xX' else int(reference[1:].rstrip(';'))
+        if 0 < number < 0x80 or 0x9F < number < 0xD800 or 0xDFFF < number <= 0x10FFFF:
+            return chr(number)
+    return html.unescape(match.group(0))
+
+def _unescape(text):
+    """
+    Decodes every character reference in text.
+    """
+
+    return _REFERENCE.sub(_decode_reference, text)
+
+def clean_text(text):
+    """
+    Cleans text so that it can be safely embedded in HTML.
+
+    Character references are decoded and the result is escaped, so text that
+    was already escaped is not escaped twice. Carriage returns are normalised
+    to line feeds (before references are decoded, as the HTML parser does) and
+    null characters and a leading byte order mark are removed. For text that
+    contains no markup, the output is identical to `nh3.clean`; markup itself
+    is escaped rather than filtered, so no tags are ever passed through.
+
+    Text that does not need cleaning is returned as it is.
+
+    Arguments:
+    - text (str): The text to clean.
+
+    Returns:
+    str: The cleaned text.
+    """
+
+    if _NEEDS_CLEANING.search(text) is None:
+        return text
+
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if '&' in text:
+        text = _unescape(text)
+    return text.translate(_ESCAPE_TABLE)
+
+def clean_value(value):
+    """
+    Cleans a CSV value by retaining only allowed characters and trimming any
+    leading or trailing whitespace. The result is safe to embed in HTML.
+
+    This is equivalent to filtering the value through `ALLOWED_CSV_CHARSET`,
+    stripping it, and then cleaning it with `clean_text`, but is done in a
+    single pass. Values that are already clean are returned as they are.
+
+    Arguments:
+    - value (any): The value to clean.
+
+    Returns:
+    str: The cleaned value as a string.
+    """
+
+    if value is None:
+        return ''
+    value = str(value)
+    if _CLEAN_VALUE.fullmatch(value) is not None:
+        return value
+
+    value = _DISALLOWED.sub('', value).strip()
+    if '&' in value:
+        value = _unescape(value)
+    return value.translate(_ESCAPE_TABLE)
@@ -0,0 +1,200 @@
+import csv
+import hashlib
+import itertools
+
+from api.sources.errors import SourceFetchError
+from api.sources.sanitise import clean_text
+from api.sources.table import ParsedSource
+
+# Number of bytes at the end of a source that are hashed to detect if the
+# source has been rewritten rather than appended to:
+TAIL_SIZE = 256
+
+class CsvStreamReader:
+    """
+    Incrementally reads and sanitises the rows of a CSV source from a stream of
+    byte chunks into a `ParsedSource`.
+
+    The stream is split into lines on `\\n` before each line is decoded,
+    sanitised and handed to `csv.reader`, so no complete copy of the body is
+    ever held in memory. Lines keep their line ending, which matches how a file
+    opened on the whole body is iterated, so quoted fields that span several
+    lines are parsed correctly.
+
+    The reader also tracks where the last complete line ends. This allows a
+    later read to resume from that point when the source is only ever appended
+    to.
+
+    Attributes:
+    - table (ParsedSource): Table that rows are read into.
+    - offset (int): Byte offset just past the last complete line read.
+    - complete_rows (int): Number of rows in `table` that end on a complete
+      line. A final row without a line ending is not counted since it may
+      still be being written.
+    - tail (bytes): Up to `TAIL_SIZE` bytes that end at `offset`.
+    """
+
+    def __init__(self, encoding, max_bytes, max_rows, offset=0, tail=b'', table=None):
+        """
+        Arguments:
+        - encoding (str): Character encoding of the source.
+        - max_bytes (int): Maximum size of the source in bytes.
+        - max_rows (int): Maximum number of rows in the source.
+        - offset (int, optional): Byte offset that the stream starts at.
+        - tail (bytes, optional): Bytes that immediately precede `offset`.
+        - table (ParsedSource, optional): Rows that precede `offset`, which
+          the rows read are appended to.
+        """
+
+        self.encoding = encoding
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.offset = offset
+        self.tail = tail
+        self.table = table if table is not None else ParsedSource()
+        self.complete_rows = self.table.row_count
+        self._row_count = self.table.row_count
+        self._partial = False
+
+    @property
+    def tail_hash(self):
+        """
+        Hash of `tail`.
+        """
+
+        return hash_tail(self.tail)
+
+    def _lines(self, chunks):
+        """
+        Splits the chunks into decoded, sanitised lines.
+        """
+
+        received = self.offset
+        pending = b''
+        for chunk in chunks:
+            received += len(chunk)
+            if received > self.max_bytes:
+                raise SourceFetchError(f'Source is larger than the maximum of {self.max_bytes} bytes.')
+            lines = (pending + chunk).split(b'\n')
+            # The final line may be incomplete, keep it until the next chunk:
+            pending = lines.pop()
+            for line in lines:
+                line += b'\n'
+                self.offset += len(line)
+                self.tail = (self.tail + line)[-TAIL_SIZE:]
+                yield clean_text(line.decode(self.encoding, errors='replace'))
+        if pending:
+            self._partial = True
+            yield clean_text(pending.decode(self.encoding, errors='replace'))
+
+    def read(self, chunks):
+        """
+        Reads every row from the chunks.
+
+        Arguments:
+        - chunks (iterable of bytes): Raw body of the source.
+
+        Returns:
+        ParsedSource: The table that the rows were read into.
+
+        Throws:
+        - SourceFetchError: Thrown if the source exceeds either limit.
+        """
+
+        return self._read(self._lines(chunks))
+
+    def _read(self, lines):
+        """
+        Parses the rows from sanitised lines.
+        """
+
+        self.table.extend(self._rows(lines))
+        return self.table
+
+    def _rows(self, lines):
+        """
+        Parses the rows from sanitised lines, enforcing `max_rows`.
+        """
+
+        reader = csv.reader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                raise SourceFetchError(f'Source is not valid CSV on line {reader.line_num}: {error}.')
+            if self._row_count >= self.max_rows:
+                raise SourceFetchError(f'Source has more than the maximum of {self.max_rows} rows.')
+            self._row_count += 1
+            if not self._partial:
+                self.complete_rows += 1
+            yield row
+
+def hash_tail(tail):
+    """
+    Hashes the trailing bytes of a source.
+    """
+
+    return hashlib.sha256(tail).hexdigest()
+
+def split_prefix(chunks, size):
+    """
+    Splits the first `size` bytes from a stream of byte chunks.
+
+    Returns:
+    This function returns a tuple of two values:
+    1. Prefix: The first `size` bytes, or fewer if the stream is shorter.
+    2. Chunks: Iterator over the rest of the stream.
+    """
+
+    chunks = iter(chunks)
+    prefix = b''
+    while len(prefix) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        prefix += chunk
+    rest = prefix[size:]
+    return prefix[:size], itertools.chain([rest] if rest else [], chunks)
+
+def check_content_length(response, max_bytes):
+    """
+    Rejects a response whose declared length is larger than `max_bytes` before
+    any of its body is read.
+
+    Throws:
+    - SourceFetchError: Thrown if the response is too large.
+    """
+
+    content_length = response.headers.get('Content-Length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise SourceFetchError(f'Source is larger than the maximum of {max_bytes} bytes.')
+
+def read_csv_stream(response, max_bytes, max_rows, chunk_size=65536, reader=None):
+    """
+    Reads and sanitises the rows of a CSV source from a streamed response.
+
+    The body is decoded, sanitised and parsed incrementally as it arrives.
+    Reading stops (and the caller should close the response) as soon as either
+    limit is exceeded.
+
+    Arguments:
+    - response (requests.Response): Response opened with `stream=True`.
+    - max_bytes (int): Maximum size of the body in bytes.
+    - max_rows (int): Maximum number of rows, including any header.
+    - chunk_size (int, optional): Number of bytes to read at a time.
+    - reader (CsvStreamReader, optional): Reader to parse the body with, so
+      that the caller can inspect where the body ended.
+
+    Returns:
+    ParsedSource: The rows that were read.
+
+    Throws:
+    - SourceFetchError: Thrown if the source exceeds either limit.
+    """
+
+    check_content_length(response, max_bytes)
+    if reader is None:
+        reader = CsvStreamReader(response.encoding or 'utf-8', max_bytes, max_rows)
+    return reader.read(response.iter_content(chunk_size=chunk_size))
@@ -0,0 +1,278 @@
+import hashlib
+import itertools
+import sys
+
+from api.sources.columns import TypedColumn, infer_column_type
+
+# Number of rows that are transposed into columns at a time:
+_CHUNK_SIZE = 4096
+
+# Number of values of each column that are measured to estimate its size:
+_SAMPLE_SIZE = 256
+
+class ParsedSource:
+    """
+    Columnar table of the rows of a source, parsed once per fetched body and
+    shared by every view that reads the source.
+
+    Values are stored column by column, so reading a column is a slice of a
+    single list rather than a walk over every row. Rows may have different
+    lengths: a value that is missing because its row is too short is `None`.
+
+    Once the rows have been read, `infer_types` infers the type of each
+    column. Numeric columns are then stored as a `TypedColumn`, which reads
+    like a list of numbers.
+
+    Attributes:
+    - columns (list): Values of each column, each a list of `row_count`
+      strings (or `None`), or a `TypedColumn`.
+    - row_count (int): Number of rows, including any header.
+    - ragged (bool): Indicates that some rows have a different number of
+      values to others, so some values are `None`.
+    - types (list): Inferred type of each column, or `None` for columns that
+      have not been inferred.
+    """
+
+    def __init__(self, columns=None, row_count=0, ragged=None, types=None):
+        self.columns = columns if columns is not None else []
+        self.row_count = row_count
+        self.ragged = ragged if ragged is not None else any(None in column for column in self.columns)
+        self.types = types if types is not None else [None] * len(self.columns)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a table from rows, each a list of strings.
+        """
+
+        table = cls()
+        table.extend(rows)
+        return table
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a table from the dictionary returned by `as_dict`.
+        """
+
+        columns = [TypedColumn.from_dict(column) if isinstance(column, dict) else column for column in data['columns']]
+        return cls(columns, data['row_count'], data['ragged'], data['types'])
+
+    @property
+    def column_count(self):
+        """
+        Number of columns in the longest row.
+        """
+
+        return len(self.columns)
+
+    def extend(self, rows):
+        """
+        Appends rows to the table.
+
+        Rows are transposed in chunks. Chunks where every row is as wide as the
+        table are transposed with `zip`; other chunks are appended row by row.
+        """
+
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, _CHUNK_SIZE))
+            if not chunk:
+                return
+            width = len(self.columns)
+            if all(len(row) == width for row in chunk) and width > 0:
+                for column, values in zip(self.columns, zip(*chunk)):
+                    column.extend(values)
+                self.row_count += len(chunk)
+            else:
+                for row in chunk:
+                    self.append(row)
+
+    def append(self, row):
+        """
+        Appends a single row to the table.
+        """
+
+        if len(row) != len(self.columns) and self.row_count > 0:
+            self.ragged = True
+
+        for _ in range(len(row) - len(self.columns)):
+            self.columns.append([None] * self.row_count)
+            self.types.append(None)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        for column in self.columns[len(row):]:
+            column.append(None)
+        self.row_count += 1
+
+    def row_length(self, index):
+        """
+        Gets the number of values in a row.
+        """
+
+        for column_index in range(len(self.columns) - 1, -1, -1):
+            if _has_value(self.columns[column_index], index):
+                return column_index + 1
+        return 0
+
+    def column_type(self, index):
+        """
+        Gets the inferred type of a column, which is `string` for columns that
+        have not been inferred.
+        """
+
+        column = self.columns[index]
+        if isinstance(column, TypedColumn):
+            return column.kind
+        return self.types[index] or 'string'
+
+    def infer_types(self, non_numeric='string'):
+        """
+        Infers the type of every column that has not been inferred yet, and
+        stores numeric columns as a `TypedColumn`.
+
+        The first row is left out of the inference, as it may be a header.
+        Columns that only have empty values are left to be inferred once they
+        have some. Columns that have been inferred are not inferred again, so
+        this is cheap to call after rows have been appended.
+
+        Arguments:
+        - non_numeric (str): Policy for the cells of a numeric column that are
+          not numbers, either `null` or `string`.
+        """
+
+        for index, column in enumerate(self.columns):
+            if self.types[index] is not None:
+                continue
+            column_type = infer_column_type(column[1:])
+            if column_type in ('int', 'float'):
+                self.columns[index] = TypedColumn.from_values(column_type, column, non_numeric)
+            self.types[index] = column_type
+
+    def row(self, index):
+        """
+        Gets the values of a row.
+        """
+
+        return [column[index] for column in self.columns[:self.row_length(index)]]
+
+    def column(self, index, start=0, stop=None):
+        """
+        Gets the values of a column from the row at `start` onwards, up to (but
+        not including) the row at `stop`. Rows that are too short to have a
+        value are `None`.
+        """
+
+        return self.columns[index][start:stop]
+
+    def values(self, index, start=0, stop=None):
+        """
+        Gets the values of a column from the row at `start` onwards, up to (but
+        not including) the row at `stop`, skipping rows that are too short to
+        have a value. Cells that are `None` because they are not numbers are
+        kept, so the values stay aligned with those of the other columns.
+        """
+
+        column = self.columns[index]
+        if not self.ragged:
+            return column[start:stop]
+        if not isinstance(column, TypedColumn):
+            return [value for value in column[start:stop] if value is not None]
+        # Only the exceptions of a typed column tell a row that is too short
+        # apart from a cell that is not a number:
+        rows = range(len(column))[start:stop]
+        return [value for row, value in zip(rows, column[start:stop]) if column.has_value(row)]
+
+    def iter_values(self, index, start=0, stop=None):
+        """
+        Gets the same values as `values`, but reads them from the column
+        `_CHUNK_SIZE` rows at a time as they are iterated, so only one chunk of
+        the column is ever copied at once.
+        """
+
+        stop = len(self.columns[index]) if stop is None else min(stop, len(self.columns[index]))
+        for chunk_start in range(start, stop, _CHUNK_SIZE):
+            yield from self.values(index, chunk_start, min(chunk_start + _CHUNK_SIZE, stop))
+
+    def rows(self):
+        """
+        Gets every row of the table, as lists of strings.
+        """
+
+        return [self.row(index) for index in range(self.row_count)]
+
+    def head(self, row_count):
+        """
+        Gets a new table made up of the first `row_count` rows.
+        """
+
+        columns = [column.head(row_count) if isinstance(column, TypedColumn) else column[:row_count] for column in self.columns]
+        # Drop columns that only later rows were wide enough to have:
+        while columns and not any(_has_value(columns[-1], index) for index in range(len(columns[-1]))):
+            columns.pop()
+        return ParsedSource(columns, min(row_count, self.row_count), self.ragged, self.types[:len(columns)])
+
+    def estimate_size(self):
+        """
+        Estimates the number of bytes of memory used by the table.
+
+        The lists that hold each column are measured exactly. The strings are
+        estimated from an evenly spaced sample of each column, so this does not
+        walk every value.
+        """
+
+        size = sys.getsizeof(self.columns)
+        for column in self.columns:
+            if isinstance(column, TypedColumn):
+                size += column.estimate_size()
+                continue
+            size += sys.getsizeof(column)
+            if not column:
+                continue
+            sample = column[::max(1, len(column) // _SAMPLE_SIZE)]
+            # `None` is shared, so only the strings use memory of their own:
+            sample_size = sum(sys.getsizeof(value) for value in sample if value is not None)
+            size += sample_size * len(column) // len(sample)
+        return size
+
+    def digest(self):
+        """
+        Gets a hash of every value of the table, which changes whenever any
+        value (or the type that a column is stored as) changes.
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{self.row_count}:{len(self.columns)}'.encode('utf-8'))
+        for column in self.columns:
+            if isinstance(column, TypedColumn):
+                digest.update(f'\x1e{column.kind}:{column.non_numeric}:{sorted(column.exceptions.items())!r}'.encode('utf-8'))
+                digest.update(column.numbers.tobytes())
+                continue
+            digest.update(b'\x1e')
+            for start in range(0, len(column), _CHUNK_SIZE):
+                chunk = column[start:start + _CHUNK_SIZE]
+                digest.update('\x1f'.join('\x00' if value is None else str(value) for value in chunk).encode('utf-8', 'surrogatepass'))
+                digest.update(b'\x1f')
+        return digest.hexdigest()
+
+    def as_dict(self):
+        """
+        Gets the table as a JSON serialisable dictionary.
+        """
+
+        return {
+            'columns': [column.as_dict() if isinstance(column, TypedColumn) else column for column in self.columns],
+            'row_count': self.row_count,
+            'ragged': self.ragged,
+            'types': self.types,
+        }
+
+def _has_value(column, index):
+    """
+    Indicates if the row at `index` was long enough to have a value in the
+    column.
+    """
+
+    if isinstance(column, TypedColumn):
+        return column.has_value(index)
+    return column[index] is not None
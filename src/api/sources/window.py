@@ -0,0 +1,130 @@
+import datetime
+
+def parse_iso_datetime(text):
+    """
+    Parses an ISO 8601 date or timestamp as `datetime.fromisoformat` does, but
+    also accepts a trailing `Z` for UTC, which `fromisoformat` only accepts
+    from Python 3.11.
+
+    Throws:
+    - ValueError: The text is not an ISO 8601 date or timestamp.
+    """
+
+    if text[-1:] in ('Z', 'z'):
+        text = text[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(text)
+
+def parse_timestamp(text):
+    """
+    Parses an ISO 8601 timestamp. Timestamps without a timezone are taken to
+    be in UTC, so that they can be compared with ones that have a timezone.
+
+    Throws:
+    - ValueError: The text is not an ISO 8601 timestamp.
+    """
+
+    timestamp = parse_iso_datetime(text)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+def _timestamp_key(value):
+    """
+    Gets the key that a cell of a timestamp column is ordered by. Cells that
+    are not timestamps are ordered first.
+    """
+
+    try:
+        return (1, parse_timestamp(value))
+    except (TypeError, ValueError):
+        return (0, None)
+
+def _bisect_timestamps(timestamps, timestamp, lo, hi, right=False):
+    """
+    Finds where a timestamp belongs in part of a timestamp column, in the same
+    way as `bisect.bisect_left` (or `bisect.bisect_right`) with a key of
+    `_timestamp_key`. `bisect` only accepts a key from Python 3.10, and only
+    the cells that are compared are parsed.
+    """
+
+    target = (1, timestamp)
+    while lo < hi:
+        middle = (lo + hi) // 2
+        key = _timestamp_key(timestamps[middle])
+        if key < target or (right and key == target):
+            lo = middle + 1
+        else:
+            hi = middle
+    return lo
+
+class RowWindow:
+    """
+    Window of the data rows of a source that a request asks for.
+
+    Windows are applied to the parsed table by slicing its columns, so only
+    the rows inside the window are ever copied into a response.
+
+    Attributes:
+    - tail (int): Number of rows to keep from the end, if any.
+    - offset (int): Number of rows to skip from the start.
+    - limit (int): Most rows to keep after `offset`, if any.
+    - start_time (datetime): Earliest timestamp to keep, if any.
+    - end_time (datetime): Latest timestamp to keep, if any.
+    """
+
+    def __init__(self, tail=None, offset=0, limit=None, start_time=None, end_time=None):
+        self.tail = tail
+        self.offset = offset
+        self.limit = limit
+        self.start_time = start_time
+        self.end_time = end_time
+
+    @property
+    def is_empty(self):
+        """
+        Indicates that the window keeps every row.
+        """
+
+        return self.tail is None and self.offset == 0 and self.limit is None and not self.has_time_range
+
+    @property
+    def has_time_range(self):
+        """
+        Indicates that the window is bounded by a timestamp column.
+        """
+
+        return self.start_time is not None or self.end_time is not None
+
+    def bounds(self, length, timestamps=None, start=0):
+        """
+        Gets the rows inside the window.
+
+        The time range is applied first, then `offset` and `limit`, and then
+        `tail`. The time range is found with a binary search, so the timestamp
+        column must be in ascending order.
+
+        Arguments:
+        - length (int): Number of data rows.
+        - timestamps (list, optional): Timestamp column, required if the window
+          has a time range.
+        - start (int): Index of the first data row in `timestamps`.
+
+        Returns:
+        This function returns a tuple of two values:
+        1. First: Index of the first data row inside the window.
+        2. Last: Index just past the last data row inside the window.
+        """
+
+        first, last = 0, length
+        if self.has_time_range:
+            hi = min(start + length, len(timestamps))
+            if self.start_time is not None:
+                first = _bisect_timestamps(timestamps, self.start_time, start, hi) - start
+            if self.end_time is not None:
+                last = _bisect_timestamps(timestamps, self.end_time, start + first, hi, right=True) - start
+        first = min(first + self.offset, last)
+        if self.limit is not None:
+            last = min(last, first + self.limit)
+        if self.tail is not None:
+            first = max(first, last - self.tail)
+        return first, last
@@ -0,0 +1,106 @@
+import gzip
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api import middleware
+from api.middleware import accepted_encoding
+from api.models import Source
+from api.sources import SourceSnapshot
+
+class AcceptedEncodingTests(TestCase):
+    def test_accepted_encoding(self):
+        self.assertIsNone(accepted_encoding(''))
+        self.assertIsNone(accepted_encoding('identity'))
+        self.assertEqual(accepted_encoding('gzip'), 'gzip')
+        self.assertEqual(accepted_encoding('GZIP;q=0.5, deflate'), 'gzip')
+        self.assertIsNone(accepted_encoding('gzip;q=0, br;q=0'))
+
+    @skipUnless(middleware.brotli, 'brotli is not installed.')
+    def test_accepted_encoding_brotli(self):
+        self.assertEqual(accepted_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(accepted_encoding('*'), 'br')
+        self.assertEqual(accepted_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+
+    @patch('api.middleware.brotli', None)
+    def test_accepted_encoding_without_brotli(self):
+        self.assertEqual(accepted_encoding('gzip, deflate, br'), 'gzip')
+        self.assertIsNone(accepted_encoding('br'))
+
+@override_settings(API_COMPRESSION_MIN_SIZE=200)
+class ApiCompressionMiddlewareTests(TestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create_user(username='permuser', password='password')
+        content_type = ContentType.objects.get(app_label='api', model='source')
+        self.user.user_permissions.add(Permission.objects.get(codename='view_source', content_type=content_type))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        for index in range(10):
+            Source.objects.create(name=f'Source {index}', location=f'http://example.com/{index}.csv', has_header=True)
+
+    def test_compressed(self):
+        response = self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['data']), 10)
+
+        # The ETag of the compressed body is weak, but still matches:
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_compressed(self):
+        # The client does not accept a compressed body:
+        response = self.client.get('/api/source/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.json()['data']), 10)
+
+        # The body is too small to be worth compressing:
+        with override_settings(API_COMPRESSION_MIN_SIZE=1024 * 1024):
+            response = self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        with override_settings(API_COMPRESSION_ENABLED=False):
+            response = self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @patch('api.views.source.read_source_at')
+    def test_streaming_compressed(self, mock_read_source_at):
+        source = Source.objects.first()
+        mock_read_source_at.return_value = (True, SourceSnapshot(source.location, [['A', 'B']] + [[str(index), str(index * 2)] for index in range(1000)]))
+
+        with override_settings(SOURCE_STREAMING_THRESHOLD=1):
+            response = self.client.get(f'/api/source/{source.id}/data/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        body = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(body['data'][1]['data'][:3], ['0', '2', '4'])
+
+    @patch('api.views.source.read_source_at')
+    def test_level_of_view(self, mock_read_source_at):
+        source = Source.objects.first()
+        mock_read_source_at.return_value = (True, SourceSnapshot(source.location, [['A', 'B']] + [[str(index), str(index * 2)] for index in range(1000)]))
+
+        with patch('api.middleware._Compressor', wraps=middleware._Compressor) as mock_compressor:
+            self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip')
+            self.client.get(f'/api/source/{source.id}/data/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual([call.args for call in mock_compressor.call_args_list], [('gzip', 6), ('gzip', 4)])
+
+    @skipUnless(middleware.brotli, 'brotli is not installed.')
+    def test_brotli_compressed(self):
+        response = self.client.get('/api/source/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(middleware.brotli.decompress(response.content))['data']), 10)
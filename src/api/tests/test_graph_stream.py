@@ -0,0 +1,310 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User, Permission
+from django.urls import reverse
+from django.test import AsyncClient, TestCase, SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+from unittest.mock import patch
+from api.models import Source, Graph, GraphDataset
+from api.sources import SourceSnapshot
+from api.views.stream import Broadcaster, PollError, Subscription, format_event
+
+class FormatEventTests(SimpleTestCase):
+    def test_format_event(self):
+        self.assertEqual(format_event(b'{"a": 1}', event='update'), b'event: update\ndata: {"a": 1}\n\n')
+        self.assertEqual(format_event(retry=5000), b'retry: 5000\n\n')
+        self.assertEqual(format_event(comment='heartbeat'), b': heartbeat\n\n')
+
+class BroadcasterTests(SimpleTestCase):
+    def setUp(self):
+        # Channels are polled by the tests rather than their threads:
+        self.broadcaster = Broadcaster(3600, 7200)
+
+    def test_fan_out(self):
+        polls = []
+        def poll(state):
+            polls.append(state)
+            state = (state or 0) + 1
+            return state, state if state != 2 else None
+
+        first = self.broadcaster.subscribe({ 'key': poll })
+        second = self.broadcaster.subscribe({ 'key': lambda state: self.fail('Only the first poll function is used.') })
+        other = self.broadcaster.subscribe({ 'other': lambda state: (state, 'other') })
+        self.assertEqual(self.broadcaster.channel_count(), 2)
+
+        # Each poll is shared by every subscription to the channel:
+        self.assertTrue(self.broadcaster.poll('key'))
+        self.assertEqual((first.get(0), second.get(0)), (('key', 1), ('key', 1)))
+
+        # Nothing is sent if the poll found no change:
+        self.assertTrue(self.broadcaster.poll('key'))
+        self.assertEqual((first.get(0), second.get(0)), (None, None))
+        self.assertEqual(polls, [None, 1])
+        self.assertIsNone(other.get(0))
+
+        # The channel stops once every subscription has closed:
+        first.close()
+        second.close()
+        self.assertEqual(self.broadcaster.channel_count(), 1)
+        other.close()
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_many_channels(self):
+        subscription = self.broadcaster.subscribe({ 'first': lambda state: (state, 'first'), 'second': lambda state: (state, 'second') })
+        other = self.broadcaster.subscribe({ 'second': None })
+        self.broadcaster.poll('second')
+        self.broadcaster.poll('first')
+        self.assertEqual([subscription.get(0), subscription.get(0), subscription.get(0)], [('second', 'second'), ('first', 'first'), None])
+        self.assertEqual(other.get(0), ('second', 'second'))
+
+        # Each channel stops once it has no subscriptions:
+        subscription.close()
+        self.assertEqual(self.broadcaster.channel_count(), 1)
+        other.close()
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_failure(self):
+        def poll(state):
+            raise PollError('Failed.', 502)
+
+        subscription = self.broadcaster.subscribe({ 'key': poll })
+        subscription.seed('key', 'seeded')
+        self.assertFalse(self.broadcaster.poll('key'))
+        key, error = subscription.get(0)
+        self.assertIsInstance(error, PollError)
+        self.assertEqual((key, str(error), error.status), ('key', 'Failed.', 502))
+        subscription.close()
+
+    def test_seed(self):
+        subscription = self.broadcaster.subscribe({ 'key': lambda state: (state, state) })
+        subscription.seed('key', 'first')
+        subscription.seed('key', 'second')
+        self.broadcaster.poll('key')
+        self.assertEqual(subscription.get(0), ('key', 'first'))
+        subscription.close()
+
+    def test_delay(self):
+        broadcaster = Broadcaster(5, 60)
+        self.assertEqual([broadcaster.delay(failures) for failures in range(6)], [5, 10, 20, 40, 60, 60])
+
+class SubscriptionTests(SimpleTestCase):
+    def test_newest_message_of_channel_kept(self):
+        subscription = Subscription(Broadcaster(3600, 3600), ['first', 'second'])
+        subscription.put('first', 1)
+        subscription.put('second', 2)
+        subscription.put('first', 3)
+        self.assertEqual([subscription.get(0), subscription.get(0), subscription.get(0)], [('second', 2), ('first', 3), None])
+
+    def test_get_async(self):
+        subscription = Subscription(Broadcaster(3600, 3600), ['key'])
+
+        async def get():
+            self.assertIsNone(await subscription.get_async(0.01))
+            asyncio.get_running_loop().call_later(0.01, subscription.put, 'key', 'message')
+            return await subscription.get_async(5)
+
+        self.assertEqual(asyncio.run(get()), ('key', 'message'))
+
+@override_settings(GRAPH_STREAM_ENABLED=True, GRAPH_STREAM_HEARTBEAT=0.01, GRAPH_STREAM_MAX_AGE=60)
+class GraphStreamViewTests(TestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user_with_perms = User.objects.create_user(username="permuser", password="password")
+        self.user_with_perms.user_permissions.add(Permission.objects.get(codename='view_graph'))
+        self.client.login(username="permuser", password="password")
+
+        self.graph = Graph.objects.create(name="Graph 1", description="Test Graph 1")
+        self.source = Source.objects.create(name="Source", location="http://example.com/data.csv", has_header=True)
+        GraphDataset.objects.create(graph=self.graph, label="Time", plot_type="none", is_axis=True, source=self.source, column=0)
+        GraphDataset.objects.create(graph=self.graph, label="Value", plot_type="line", source=self.source, column=1)
+
+        self.snapshots = { self.source.location: SourceSnapshot(self.source.location, [['Time', 'Value'], ['1', '4'], ['2', '5']]) }
+        patcher = patch('api.sources.fetch.fetch_source', side_effect=lambda location, append_only=False: self.snapshots[location])
+        self.mock_fetch_source = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Channels are polled by the tests rather than their threads:
+        self.broadcaster = Broadcaster(3600, 3600)
+        patcher = patch('api.views.stream._broadcaster', self.broadcaster)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def append(self, *rows):
+        snapshot = self.snapshots[self.source.location]
+        self.snapshots[self.source.location] = SourceSnapshot(self.source.location, snapshot.rows + list(rows), lineage=snapshot.lineage)
+
+    def open_stream(self, query=None):
+        # Clients of an event stream only accept events:
+        response = self.client.get(reverse('api:graph_stream'), { 'ids': self.graph.id, **(query or {}) }, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b'retry: 5000\n\n')
+        return response, events
+
+    def read_update(self, events, graph=None):
+        event = next(events)
+        self.assertTrue(event.startswith(b'event: update\ndata: '), event)
+        body = json.loads(event[len(b'event: update\ndata: '):])
+        self.assertEqual(body.pop('graph'), (graph or self.graph).id)
+        return body
+
+    def test_stream(self):
+        response, events = self.open_stream()
+        body = self.read_update(events)
+        self.assertEqual(body['data']['data']['labels'], ['1', '2'])
+        self.assertNotIn('start', body)
+
+        # The update has the same body as the data endpoint returns, other
+        # than the age, which may have moved on:
+        data = self.client.get(reverse('api:graph_data', args=[self.graph.id])).json()
+        self.assertEqual({ **body, 'age': None }, { **data, 'age': None })
+
+        # Nothing is sent but heartbeats until a source changes:
+        self.broadcaster.poll((self.graph.id, ''))
+        self.assertEqual(next(events), b': heartbeat\n\n')
+
+        # Only the appended rows are sent:
+        self.append(['3', '6'])
+        self.broadcaster.poll((self.graph.id, ''))
+        update = self.read_update(events)
+        self.assertEqual(update['start'], 2)
+        self.assertEqual(update['data']['data']['labels'], ['3'])
+        self.assertNotEqual(update['version'], body['version'])
+
+        # The channel stops once the client has gone:
+        response.close()
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_stream_since(self):
+        version = self.client.get(reverse('api:graph_data', args=[self.graph.id])).json()['version']
+
+        # A client that already has the data is only sent the rows appended
+        # since:
+        self.append(['3', '6'])
+        response, events = self.open_stream({ 'since': f'{self.graph.id}:{version}' })
+        update = self.read_update(events)
+        self.assertEqual(update['start'], 2)
+        self.assertEqual(update['data']['data']['labels'], ['3'])
+
+        # Which it shares a channel with other clients for:
+        other_response, other_events = self.open_stream()
+        self.assertEqual(self.read_update(other_events)['data']['data']['labels'], ['1', '2', '3'])
+        self.assertEqual(self.broadcaster.channel_count(), 1)
+        response.close()
+        other_response.close()
+
+    def test_stream_fan_out(self):
+        first_response, first = self.open_stream()
+        self.read_update(first)
+
+        # The second client joins after a row was appended, but before the
+        # channel has seen it:
+        self.append(['3', '6'])
+        second_response, second = self.open_stream()
+        self.assertEqual(self.read_update(second)['data']['data']['labels'], ['1', '2', '3'])
+        self.append(['4', '7'])
+        self.assertEqual(self.broadcaster.channel_count(), 1)
+
+        # One poll is shared by both clients. The second client has a newer
+        # version than the update applies to, so it catches up on its own:
+        fetches = self.mock_fetch_source.call_count
+        self.broadcaster.poll((self.graph.id, ''))
+        self.assertEqual(self.read_update(first)['data']['data']['labels'], ['3', '4'])
+        self.assertEqual(self.read_update(second)['data']['data']['labels'], ['4'])
+        self.assertEqual(self.mock_fetch_source.call_count, fetches + 2)
+
+        first_response.close()
+        second_response.close()
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    @override_settings(GRAPH_STREAM_MAX_AGE=0.1)
+    async def test_stream_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user_with_perms)
+        response = await client.get(reverse('api:graph_stream'), { 'ids': self.graph.id })
+        self.assertEqual(response.status_code, 200)
+
+        # The events are sent from the event loop until the stream is closed:
+        self.assertTrue(response.is_async)
+        events = [event async for event in response.streaming_content]
+        self.assertEqual(events[0], b'retry: 5000\n\n')
+        self.assertTrue(events[1].startswith(b'event: update\n'))
+        self.assertGreater(len(events), 2)
+        self.assertEqual(set(events[2:]), { b': heartbeat\n\n' })
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_stream_failure(self):
+        response, events = self.open_stream()
+        self.read_update(events)
+
+        GraphDataset.objects.filter(graph=self.graph, is_axis=False).update(column=5)
+        self.broadcaster.poll((self.graph.id, ''))
+        event = next(events)
+        self.assertTrue(event.startswith(b'event: failure\ndata: '), event)
+        failure = json.loads(event[len(b'event: failure\ndata: '):])
+        self.assertEqual(failure['graph'], self.graph.id)
+        self.assertIn('out of bounds', failure['message'])
+        response.close()
+
+    def test_stream_max_age(self):
+        with override_settings(GRAPH_STREAM_MAX_AGE=0):
+            response, events = self.open_stream()
+            self.read_update(events)
+            self.assertEqual(list(events), [])
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_stream_many_graphs(self):
+        other_graph = Graph.objects.create(name="Graph 2", description="Test Graph 2")
+        GraphDataset.objects.create(graph=other_graph, label="Value", plot_type="bar", source=self.source, column=1)
+        broken_graph = Graph.objects.create(name="Graph 3", description="Test Graph 3")
+        GraphDataset.objects.create(graph=broken_graph, label="Value", plot_type="bar", source=self.source, column=5)
+
+        # Every graph is streamed over one connection, and a graph that fails
+        # does not stop the others:
+        response = self.client.get(reverse('api:graph_stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b'retry: 5000\n\n')
+        self.assertEqual(self.read_update(events)['data']['data']['labels'], ['1', '2'])
+        self.assertEqual(self.read_update(events, other_graph)['data']['data']['datasets'][0]['data'], ['4', '5'])
+        event = next(events)
+        self.assertTrue(event.startswith(b'event: failure\ndata: '), event)
+        self.assertEqual(json.loads(event[len(b'event: failure\ndata: '):])['graph'], broken_graph.id)
+        self.assertEqual(self.broadcaster.channel_count(), 3)
+
+        # Each graph is polled on its own, and only the graphs that changed
+        # are sent:
+        self.append(['3', '6'])
+        self.broadcaster.poll((other_graph.id, ''))
+        self.assertEqual(self.read_update(events, other_graph)['data']['data']['datasets'][0]['data'], ['6'])
+        response.close()
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    @override_settings(GRAPH_STREAM_ENABLED=False)
+    def test_stream_disabled(self):
+        response = self.client.get(reverse('api:graph_stream'), { 'ids': self.graph.id }, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+
+    def test_stream_errors(self):
+        response = self.client.get(reverse('api:graph_stream'), { 'ids': f'{self.graph.id},{self.graph.id + 1}' })
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.broadcaster.channel_count(), 0)
+        for query in [{ 'ids': 'one' }, { 'since': f'{self.graph.id}' }, { 'since': 'one:version' }, { 'max_points': 1 }]:
+            response = self.client.get(reverse('api:graph_stream'), query, HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response['Content-Type'], 'application/json')
+
+        self.client.logout()
+        response = self.client.get(reverse('api:graph_stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        User.objects.create_user(username="testuser", password="password")
+        self.client.login(username="testuser", password="password")
+        response = self.client.get(reverse('api:graph_stream'))
+        self.assertEqual(response.status_code, 403)
@@ -1,9 +1,11 @@
 from django.core.cache import cache
 from django.contrib.auth.models import User, Group, Permission
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
+from unittest.mock import patch
 from api.models import Source, Graph, GraphDataset
+from api.sources import SourceFetchError, SourceSnapshot
 import json
 
 class GraphListViewTests(TestCase):
@@ -35,6 +37,20 @@ class GraphListViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()['data']), 2)
 
+    def test_get_graphs_not_modified(self):
+        response = self.client.get(reverse('api:graph_list'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.client.get(reverse('api:graph_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # The ETag changes with the graphs:
+        Graph.objects.create(name="Graph 3", description="Test Graph 3")
+        response = self.client.get(reverse('api:graph_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 3)
+
     def test_get_graphs_no_permission(self):
         self.client.logout()
         self.client.login(username="testuser", password="password")
@@ -101,6 +117,18 @@ class GraphDetailViewTests(TestCase):
         self.assertEqual(self.graph.name, "Updated Graph")
         self.assertEqual(self.graph.description, "This has been updated")
 
+    def test_update_graph_max_points(self):
+        for max_points, status in [(500, 200), (2, 400), (True, 400), (None, 200)]:
+            response = self.client.put(
+                f'/api/graph/{self.graph.id}/',
+                data=json.dumps({ "name": "Graph 1", "description": "Test Graph 1", "max_points": max_points }),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, status)
+            if status == 200:
+                self.graph.refresh_from_db()
+                self.assertEqual(self.graph.max_points, max_points)
+
     def test_delete_graph_success(self):
         response = self.client.delete(f'/api/graph/{self.graph.id}/')
         self.assertEqual(response.status_code, 200)
@@ -181,3 +209,325 @@ class GraphDatasetDetailViewTests(TestCase):
         response = self.client.delete(reverse('api:graph_dataset_detail', args=[self.graph.id, self.dataset.id]))
         self.assertEqual(response.status_code, 200)
         self.assertFalse(GraphDataset.objects.filter(id=self.dataset.id).exists())
+
+
+class GraphDataViewTests(TestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user_with_perms = User.objects.create_user(username="permuser", password="password")
+        self.user_with_perms.user_permissions.add(Permission.objects.get(codename='view_graph'))
+        self.client.login(username="permuser", password="password")
+
+        # Create test data
+        self.graph = Graph.objects.create(name="Graph 1", description="Test Graph 1")
+        self.time_source = Source.objects.create(name="Time Source", location="http://example.com/time.csv", has_header=True)
+        self.value_source = Source.objects.create(name="Value Source", location="http://example.com/value.csv", has_header=True)
+        GraphDataset.objects.create(graph=self.graph, label="Time", plot_type="none", is_axis=True, source=self.time_source, column=0)
+        GraphDataset.objects.create(graph=self.graph, label="Value", plot_type="line", source=self.value_source, column=1)
+        GraphDataset.objects.create(graph=self.graph, label="Other", plot_type="bar", source=self.value_source, column=0)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_success(self, mock_fetch_source):
+        contents = {
+            self.time_source.location: [['Time'], ['1'], ['2'], ['3']],
+            self.value_source.location: [['A', 'B'], ['4', '7'], ['5', '8'], ['6', '9']],
+        }
+        mock_fetch_source.side_effect = lambda location, append_only=False: SourceSnapshot(location, contents[location])
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        self.assertEqual(response.status_code, 200)
+
+        # Each distinct source is only fetched once:
+        self.assertEqual(mock_fetch_source.call_count, 2)
+
+        data = response.json()['data']['data']
+        self.assertEqual(data['labels'], ['1', '2', '3'])
+        self.assertEqual(data['datasets'][0]['data'], ['7', '8', '9'])
+        self.assertEqual(data['datasets'][1]['data'], ['4', '5', '6'])
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_not_modified(self, mock_fetch_source):
+        contents = {
+            self.time_source.location: [['Time'], ['1'], ['2'], ['3']],
+            self.value_source.location: [['A', 'B'], ['4', '7'], ['5', '8'], ['6', '9']],
+        }
+        mock_fetch_source.side_effect = lambda location, append_only=False: SourceSnapshot(location, contents[location])
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        # The data is not built again if the client already has it:
+        with patch('api.views.graph.ColumnProjection.extract') as mock_extract:
+            response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Age', response)
+        mock_extract.assert_not_called()
+
+        # The ETag changes with the query, the datasets and the content of the
+        # sources:
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'tail': 2 }, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        GraphDataset.objects.filter(label="Other").update(label="Renamed")
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        contents[self.value_source.location] = [['A', 'B'], ['4', '7'], ['5', '8'], ['6', '10']]
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['data']['datasets'][0]['data'], ['7', '8', '10'])
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_since(self, mock_fetch_source):
+        snapshots = {
+            self.time_source.location: SourceSnapshot(self.time_source.location, [['Time'], ['1'], ['2'], ['3']]),
+            self.value_source.location: SourceSnapshot(self.value_source.location, [['A', 'B'], ['4', '7'], ['5', '8'], ['6', '9']]),
+        }
+        mock_fetch_source.side_effect = lambda location, append_only=False: snapshots[location]
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        version = response.json()['version']
+        self.assertNotIn('start', response.json())
+
+        # Nothing has been appended yet:
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'since': version })
+        body = response.json()
+        self.assertEqual((body['start'], body['version']), (3, version))
+        self.assertEqual(body['data']['data']['labels'], [])
+
+        # Only the appended rows are returned:
+        for location, rows in [(self.time_source.location, [['4'], ['5']]), (self.value_source.location, [['10', '11']])]:
+            snapshot = snapshots[location]
+            snapshots[location] = SourceSnapshot(location, snapshot.rows + rows, lineage=snapshot.lineage)
+        body = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'since': version }).json()
+        self.assertEqual(body['start'], 3)
+        self.assertEqual(body['data']['data']['labels'], ['4', '5'])
+        self.assertEqual(body['data']['data']['datasets'][0]['data'], ['11'])
+        self.assertNotEqual(body['version'], version)
+        version = body['version']
+
+        # A rewritten source returns all of the data again:
+        snapshots[self.value_source.location] = SourceSnapshot(self.value_source.location, [['A', 'B'], ['0', '1']])
+        body = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'since': version }).json()
+        self.assertNotIn('start', body)
+        self.assertEqual(body['data']['data']['labels'], ['1', '2', '3', '4', '5'])
+
+        # As do windows and downsampling:
+        version = body['version']
+        for query in [{ 'tail': 2 }, { 'max_points': 3 }]:
+            body = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { **query, 'since': version }).json()
+            self.assertNotIn('start', body)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_streamed(self, mock_fetch_source):
+        contents = {
+            self.time_source.location: [['Time'], ['1'], ['2'], ['3']],
+            self.value_source.location: [['A', 'B'], ['4', '7'], ['5', '8'], ['6', '9']],
+        }
+        # The same snapshots are returned each time, so the version is too:
+        snapshots = { location: SourceSnapshot(location, rows) for location, rows in contents.items() }
+        mock_fetch_source.side_effect = lambda location, append_only=False: snapshots[location]
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        self.assertFalse(response.streaming)
+
+        # Graphs with at least as many points as the threshold are streamed,
+        # with the same body:
+        with override_settings(SOURCE_STREAMING_THRESHOLD=9):
+            streamed_response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        self.assertTrue(streamed_response.streaming)
+        self.assertEqual(streamed_response.status_code, 200)
+        self.assertEqual(b''.join(streamed_response.streaming_content), response.content)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_downsampled(self, mock_fetch_source):
+        contents = {
+            self.time_source.location: [['Time']] + [[str(index)] for index in range(100)],
+            self.value_source.location: [['A', 'B']] + [[index, 1000 if index == 37 else index % 5] for index in range(100)],
+        }
+        mock_fetch_source.side_effect = lambda location, append_only=False: SourceSnapshot(location, contents[location])
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'max_points': 10 })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']['data']
+        self.assertLessEqual(len(data['labels']), 10)
+        # The labels and datasets stay aligned, and the spike is kept:
+        self.assertEqual(data['datasets'][1]['data'], [int(label) for label in data['labels']])
+        self.assertIn(1000, data['datasets'][0]['data'])
+        self.assertEqual(data['labels'][data['datasets'][0]['data'].index(1000)], '37')
+
+        # The default of the graph is used without the query parameter:
+        self.graph.max_points = 20
+        self.graph.save()
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), { 'downsample': 'minmax' })
+        self.assertLessEqual(len(response.json()['data']['data']['labels']), 20)
+
+        for query in [{ 'max_points': 2 }, { 'max_points': 'x' }, { 'downsample': 'average' }]:
+            response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), query)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_window(self, mock_fetch_source):
+        def fetch(location, append_only=False):
+            if location == self.time_source.location:
+                snapshot = SourceSnapshot(location, [['Time']] + [[f'2024-01-01T{hour:02}:00:00'] for hour in range(24)])
+            else:
+                snapshot = SourceSnapshot(location, [['A', 'B']] + [[str(hour), str(-hour)] for hour in range(24)])
+            snapshot.table.infer_types()
+            return snapshot
+        mock_fetch_source.side_effect = fetch
+
+        def get(query):
+            response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), query)
+            self.assertEqual(response.status_code, 200)
+            return response.json()['data']['data']
+
+        data = get({ 'tail': 2 })
+        self.assertEqual(data['labels'], ['2024-01-01T22:00:00', '2024-01-01T23:00:00'])
+        self.assertEqual(data['datasets'][1]['data'], [22, 23])
+        data = get({ 'offset': 1, 'limit': 2 })
+        self.assertEqual(data['datasets'][0]['data'], [-1, -2])
+        data = get({ 'from': '2024-01-01T05:00:00', 'to': '2024-01-01T06:30:00' })
+        self.assertEqual(data['datasets'][1]['data'], [5, 6])
+
+        for query in [{ 'tail': -1 }, { 'tail': 1, 'limit': 1 }, { 'from': 'yesterday' }]:
+            response = self.client.get(reverse('api:graph_data', args=[self.graph.id]), query)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_out_of_bounds_column(self, mock_fetch_source):
+        GraphDataset.objects.create(graph=self.graph, label="Missing", plot_type="line", source=self.value_source, column=2)
+        mock_fetch_source.side_effect = lambda location, append_only=False: SourceSnapshot(location, [['A', 'B'], ['1', '2']])
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Column is out of bounds', response.json()['message'])
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_graph_data_read_failure(self, mock_fetch_source):
+        def fetch(location, append_only=False):
+            if location == self.value_source.location:
+                raise SourceFetchError('Failed to read source.', 400)
+            return SourceSnapshot(location, [['Time'], ['1']])
+        mock_fetch_source.side_effect = fetch
+
+        response = self.client.get(reverse('api:graph_data', args=[self.graph.id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Failed to read source.')
+
+class GraphBatchDataViewTests(TestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user_with_perms = User.objects.create_user(username="permuser", password="password")
+        self.user_with_perms.user_permissions.add(Permission.objects.get(codename='view_graph'))
+        self.client.login(username="permuser", password="password")
+
+        # Create test data. Both graphs plot the shared source:
+        self.shared_source = Source.objects.create(name="Shared Source", location="http://example.com/shared.csv", has_header=True)
+        self.other_source = Source.objects.create(name="Other Source", location="http://example.com/other.csv", has_header=True)
+        self.graph = Graph.objects.create(name="Graph 1", description="Test Graph 1")
+        GraphDataset.objects.create(graph=self.graph, label="Time", plot_type="none", is_axis=True, source=self.shared_source, column=0)
+        GraphDataset.objects.create(graph=self.graph, label="Value", plot_type="line", source=self.shared_source, column=1)
+        self.other_graph = Graph.objects.create(name="Graph 2", description="Test Graph 2")
+        GraphDataset.objects.create(graph=self.other_graph, label="Value", plot_type="line", source=self.shared_source, column=1)
+        GraphDataset.objects.create(graph=self.other_graph, label="Other", plot_type="bar", source=self.other_source, column=0)
+
+        self.contents = {
+            self.shared_source.location: [['Time', 'Value'], ['1', '4'], ['2', '5']],
+            self.other_source.location: [['A'], ['7'], ['8']],
+        }
+        self.snapshots = {}
+
+    def fetch(self, location, append_only=False):
+        if isinstance(self.contents[location], SourceFetchError):
+            raise self.contents[location]
+        # The same snapshot is returned until the content changes, as it
+        # would be from the source cache:
+        snapshot = self.snapshots.get(location)
+        if snapshot is None or snapshot.rows != self.contents[location]:
+            snapshot = self.snapshots[location] = SourceSnapshot(location, self.contents[location])
+        return snapshot
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_batch_data_success(self, mock_fetch_source):
+        mock_fetch_source.side_effect = self.fetch
+
+        with self.assertNumQueries(2, using='graph'):
+            response = self.client.get(reverse('api:graph_batch_data'))
+        self.assertEqual(response.status_code, 200)
+
+        # Each distinct source is only fetched once across all of the graphs:
+        self.assertEqual(mock_fetch_source.call_count, 2)
+
+        data = response.json()['data']
+        self.assertEqual(list(data), [str(self.graph.id), str(self.other_graph.id)])
+        self.assertEqual(data[str(self.graph.id)]['result'], 'success')
+        self.assertEqual(data[str(self.graph.id)]['data']['data']['labels'], ['1', '2'])
+        self.assertEqual(data[str(self.other_graph.id)]['data']['data']['datasets'][1]['data'], ['7', '8'])
+
+        # The data of each graph is the same as its data endpoint returns,
+        # including its version:
+        single = self.client.get(reverse('api:graph_data', args=[self.graph.id])).json()
+        self.assertEqual(data[str(self.graph.id)]['data'], single['data'])
+        self.assertEqual(data[str(self.graph.id)]['version'], single['version'])
+        self.assertIsInstance(data[str(self.graph.id)]['age'], int)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_batch_data_ids(self, mock_fetch_source):
+        mock_fetch_source.side_effect = self.fetch
+
+        response = self.client.get(reverse('api:graph_batch_data'), { 'ids': f'{self.other_graph.id},{self.other_graph.id + 100}', 'max_points': 3 })
+        data = response.json()['data']
+        self.assertEqual(list(data), [str(self.other_graph.id), str(self.other_graph.id + 100)])
+        self.assertEqual(data[str(self.other_graph.id)]['result'], 'success')
+        self.assertEqual(data[str(self.other_graph.id + 100)], { 'result': 'error', 'message': f'Graph `{self.other_graph.id + 100}` does not exist.' })
+
+        for query in [{ 'ids': 'one' }, { 'ids': '' }, { 'max_points': 1 }, { 'tail': -1 }]:
+            response = self.client.get(reverse('api:graph_batch_data'), query)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_batch_data_errors_are_isolated(self, mock_fetch_source):
+        mock_fetch_source.side_effect = self.fetch
+        self.contents[self.other_source.location] = SourceFetchError('Failed to read source.', 502)
+
+        response = self.client.get(reverse('api:graph_batch_data'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data[str(self.graph.id)]['result'], 'success')
+        self.assertEqual(data[str(self.other_graph.id)], { 'result': 'error', 'message': 'Failed to read source.' })
+
+        # As are errors building the data of a graph:
+        self.contents[self.other_source.location] = [['A'], ['7'], ['8']]
+        GraphDataset.objects.filter(graph=self.graph, is_axis=False).update(column=5)
+        data = self.client.get(reverse('api:graph_batch_data')).json()['data']
+        self.assertEqual(data[str(self.graph.id)]['result'], 'error')
+        self.assertIn('Column is out of bounds', data[str(self.graph.id)]['message'])
+        self.assertEqual(data[str(self.other_graph.id)]['result'], 'success')
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_get_batch_data_not_modified(self, mock_fetch_source):
+        mock_fetch_source.side_effect = self.fetch
+
+        response = self.client.get(reverse('api:graph_batch_data'))
+        etag = response['ETag']
+        response = self.client.get(reverse('api:graph_batch_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # The ETag changes with the data of any of the graphs:
+        self.contents[self.other_source.location] = [['A'], ['7'], ['9']]
+        response = self.client.get(reverse('api:graph_batch_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_batch_data_no_permission(self):
+        User.objects.create_user(username="testuser", password="password")
+        self.client.login(username="testuser", password="password")
+        response = self.client.get(reverse('api:graph_batch_data'))
+        self.assertEqual(response.status_code, 403)
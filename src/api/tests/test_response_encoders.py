@@ -0,0 +1,54 @@
+import datetime
+import decimal
+import json
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from unittest.mock import patch
+from api.views import success_response, streaming_success_response
+from api.views.encoders import OrjsonEncoder, StandardJSONEncoder, get_json_encoder
+
+class JSONEncoderTests(TestCase):
+    payload = {
+        'labels': ['2024-01-01T00:00:00', '2024-01-01T00:01:00', None],
+        'datasets': [{ 'type': 'line', 'label': 'Dataset 1', 'data': [1, 2.5, 'x', True] }],
+        'time': datetime.datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'amount': decimal.Decimal('1.50'),
+        'name': gettext_lazy('Name'),
+        1: 'Non-string key',
+    }
+
+    def test_encoders_are_equivalent(self):
+        expected = StandardJSONEncoder().encode(self.payload)
+        self.assertEqual(json.loads(expected)['time'], '2024-01-01T12:30:15.123Z')
+        self.assertEqual(json.loads(OrjsonEncoder().encode(self.payload)), json.loads(expected))
+
+    def test_orjson_encoder_unsupported_value(self):
+        # Integers that do not fit in 64 bits are encoded by the standard
+        # library encoder:
+        self.assertEqual(json.loads(OrjsonEncoder().encode({ 'value': 2 ** 70 })), { 'value': 2 ** 70 })
+
+    def test_get_json_encoder(self):
+        self.assertIsInstance(get_json_encoder('json'), StandardJSONEncoder)
+        self.assertIsInstance(get_json_encoder('orjson'), OrjsonEncoder)
+        self.assertIsInstance(get_json_encoder('auto'), OrjsonEncoder)
+        with override_settings(API_JSON_ENCODER='json'):
+            self.assertIsInstance(get_json_encoder(), StandardJSONEncoder)
+        with self.assertRaises(ImproperlyConfigured):
+            get_json_encoder('yaml')
+
+    @patch('api.views.encoders._instances', {})
+    @patch('api.views.encoders.orjson', None)
+    def test_get_json_encoder_without_orjson(self):
+        self.assertIsInstance(get_json_encoder('auto'), StandardJSONEncoder)
+        with self.assertLogs('api.views.encoders', level='WARNING'):
+            self.assertIsInstance(get_json_encoder('orjson'), StandardJSONEncoder)
+
+    def test_responses_with_each_encoder(self):
+        for name in ['json', 'orjson']:
+            with override_settings(API_JSON_ENCODER=name):
+                response = success_response(self.payload['datasets'], 200, age=3)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(json.loads(response.content)['data'], self.payload['datasets'])
+                streamed_response = streaming_success_response(self.payload['datasets'], 200, age=3)
+                self.assertEqual(b''.join(streamed_response.streaming_content), response.content)
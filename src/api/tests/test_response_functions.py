@@ -1,6 +1,8 @@
 import json
 from django.test import TestCase
 from api.views import (
+    success_response,
+    streaming_success_response,
     error_response_no_perms,
     error_response_invalid_json_body,
     error_response_expected_field,
@@ -44,4 +46,24 @@ class ResponseFunctionsTests(TestCase):
     def test_error_response_graph_dataset_not_found(self):
         response = error_response_graph_dataset_not_found(1)
         self.assertEqual(response.status_code, 404)
-        self.assertEqual(json.loads(response.content.decode('utf-8'))["message"], "Graph dataset `1` does not exist.")
\ No newline at end of file
+        self.assertEqual(json.loads(response.content.decode('utf-8'))["message"], "Graph dataset `1` does not exist.")
+
+    def test_streaming_success_response(self):
+        data = [{ 'name': 'A', 'data': list(range(10000)) }, { 'name': None, 'data': ['x', 1.5, None, True, { 'y': [] }] }]
+        response = streaming_success_response(data, 200, message='Done.', age=12.7, meta={ 'total_rows': 10000 })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Age'], '12')
+        # The body is the same as the one of the non-streaming response:
+        expected = success_response(data, 200, message='Done.', age=12.7, meta={ 'total_rows': 10000 })
+        self.assertEqual(b''.join(response.streaming_content), expected.content)
+
+    def test_streaming_success_response_generators(self):
+        response = streaming_success_response({ 'data': (index * 2 for index in range(5000)) }, 200)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 0)
+        body = json.loads(b''.join(chunks).decode('utf-8'))
+        self.assertEqual(body['result'], 'success')
+        self.assertEqual(body['data']['data'], [index * 2 for index in range(5000)])
+        self.assertNotIn('Age', response)
@@ -0,0 +1,181 @@
+import requests
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APITestCase
+from unittest.mock import patch, Mock
+from api.sources import CircuitBreaker, SourceFetchError, SourceGuard, fetch_source, reset_source_guard, source_cache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def mock_response(status_code, text=''):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = { 'Content-Type': 'text/csv' }
+    response.encoding = 'utf-8'
+    response.iter_content.return_value = [text.encode('utf-8')]
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(f'{status_code} Error', response=response)
+    return response
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats(), { 'state': 'open', 'failures': 2, 'opened': 1, 'rejected': 1 })
+
+    def test_half_open_allows_a_single_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 10
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        # A failed probe opens the breaker again:
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        # A successful probe closes it:
+        self.clock.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_host_breaker_opens_across_locations(self):
+        guard = SourceGuard(host_threshold=2, location_threshold=5, reset_timeout=10, negative_ttl=0, clock=self.clock)
+        error = SourceFetchError('Failed.', unavailable=True)
+        guard.record_failure('http://example.com/1.csv', error)
+        guard.record_failure('http://example.com/2.csv', error)
+        with self.assertRaises(SourceFetchError) as context:
+            guard.check('http://example.com/3.csv')
+        self.assertEqual(context.exception.status, 503)
+        guard.check('http://other.com/1.csv')
+
+    def test_rejected_check_keeps_probe(self):
+        guard = SourceGuard(host_threshold=2, location_threshold=1, reset_timeout=10, negative_ttl=0, clock=self.clock)
+        error = SourceFetchError('Failed.', unavailable=True)
+        guard.record_failure('http://example.com/1.csv', error)
+        self.clock.now += 5
+        guard.record_failure('http://example.com/2.csv', error)
+
+        # The location breaker is half-open but the host breaker is still
+        # open, so the check is rejected without using up the probe of the
+        # location:
+        self.clock.now += 5
+        with self.assertRaises(SourceFetchError):
+            guard.check('http://example.com/1.csv')
+        self.assertTrue(guard.locations.get('http://example.com/1.csv').allow())
+
+        # A probe that was reserved can be given back:
+        self.assertFalse(guard.locations.get('http://example.com/1.csv').allow())
+        guard.locations.get('http://example.com/1.csv').release()
+        self.assertTrue(guard.locations.get('http://example.com/1.csv').allow())
+
+    def test_idle_entries_are_discarded(self):
+        guard = SourceGuard(host_threshold=5, location_threshold=1, reset_timeout=10, negative_ttl=5, idle_timeout=60, clock=self.clock)
+        error = SourceFetchError('Failed.', unavailable=True)
+        for index in range(3):
+            guard.check(f'http://example.com/{index}.csv')
+        guard.record_failure('http://example.com/0.csv', error)
+        self.assertEqual(len(guard._failures), 1)
+
+        # Closed breakers that have not been used since the last minute are
+        # discarded, open breakers are kept:
+        self.clock.now += 60
+        guard.check('http://example.com/3.csv')
+        self.assertEqual(set(guard.locations.stats()), { 'http://example.com/0.csv', 'http://example.com/3.csv' })
+        self.assertEqual(len(guard.hosts), 1)
+
+        # As are expired failures:
+        guard.record_failure('http://example.com/3.csv', error)
+        self.assertEqual(list(guard._failures), ['http://example.com/3.csv'])
+
+@override_settings(SOURCE_BREAKER_ENABLED=True, SOURCE_BREAKER_LOCATION_THRESHOLD=2, SOURCE_NEGATIVE_TTL=0, SOURCE_COALESCE_ENABLED=False)
+class SourceGuardFetchTests(TestCase):
+    def setUp(self):
+        reset_source_guard()
+        source_cache.clear()
+        self.location = 'http://example.com/source.csv'
+
+    def tearDown(self):
+        reset_source_guard()
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_open_breaker_fails_fast(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ConnectTimeout('Timed out.')
+        for _ in range(2):
+            with self.assertRaises(SourceFetchError):
+                fetch_source(self.location)
+        with self.assertRaises(SourceFetchError) as context:
+            fetch_source(self.location)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(context.exception.status, 503)
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_client_errors_are_not_counted(self, mock_get):
+        mock_get.return_value = mock_response(404)
+        for _ in range(3):
+            with self.assertRaises(SourceFetchError):
+                fetch_source(self.location)
+        self.assertEqual(mock_get.call_count, 3)
+
+    @override_settings(SOURCE_NEGATIVE_TTL=5)
+    @patch('api.sources.client.SourceClient.get')
+    def test_failures_are_negatively_cached(self, mock_get):
+        mock_get.return_value = mock_response(503)
+        for _ in range(2):
+            with self.assertRaises(SourceFetchError) as context:
+                fetch_source(self.location)
+            self.assertIn('503', context.exception.message)
+        mock_get.assert_called_once()
+
+    @override_settings(SOURCE_STALE_IF_ERROR=True, SOURCE_CACHE_ENABLED=True)
+    @patch('api.sources.client.SourceClient.get')
+    def test_last_good_copy_is_served(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1\n')
+        snapshot = fetch_source(self.location)
+
+        mock_get.side_effect = requests.exceptions.ConnectionError('Refused.')
+        for _ in range(3):
+            self.assertIs(fetch_source(self.location), snapshot)
+        self.assertEqual(mock_get.call_count, 3)
+
+class SourceMetricsViewTests(APITestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        reset_source_guard()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.user_with_perms = User.objects.create_user(username='permuser', password='password')
+        content_type = ContentType.objects.get(app_label='api', model='source')
+        self.user_with_perms.user_permissions.add(Permission.objects.get(codename='view_source', content_type=content_type))
+        self.client = APIClient()
+
+    def test_get_metrics(self):
+        self.client.force_authenticate(user=self.user_with_perms)
+        response = self.client.get('/api/source/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hosts', response.json()['data']['breakers'])
+        self.assertIn('process', response.json()['data']['coalesce'])
+        self.assertIn('evictions', response.json()['data']['cache'])
+
+    def test_get_metrics_no_permission(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/source/metrics/')
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,144 @@
+from django.test import TestCase, override_settings
+from unittest.mock import patch, Mock
+from api.sources import SourceCache, SourceSnapshot, fetch_source, source_cache
+
+def mock_response(status_code, text='', headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = { 'Content-Type': 'text/csv', **(headers or {}) }
+    response.encoding = 'utf-8'
+    response.iter_content.return_value = [text.encode('utf-8')]
+    return response
+
+class SourceCacheTests(TestCase):
+    def setUp(self):
+        source_cache.clear()
+        self.location = 'http://example.com/source.csv'
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_not_modified_reuses_snapshot(self, mock_get):
+        mock_get.return_value = mock_response(200, 'col1,col2\nval1,val2', { 'ETag': '"v1"', 'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT' })
+        snapshot = fetch_source(self.location)
+
+        # The first fetch is unconditional:
+        self.assertIsNone(mock_get.call_args.kwargs['headers'])
+
+        mock_get.return_value = mock_response(304)
+        with patch('api.sources.stream.clean_text') as mock_clean:
+            revalidated = fetch_source(self.location)
+            mock_clean.assert_not_called()
+
+        # The second fetch sends both validators and re-uses the snapshot:
+        self.assertEqual(mock_get.call_args.kwargs['headers'], {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Wed, 01 Jan 2025 00:00:00 GMT'
+        })
+        self.assertIs(revalidated, snapshot)
+        self.assertEqual(revalidated.rows, [['col1', 'col2'], ['val1', 'val2']])
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_modified_replaces_snapshot(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1', { 'ETag': '"v1"' })
+        fetch_source(self.location)
+        mock_get.return_value = mock_response(200, 'a\n2', { 'ETag': '"v2"' })
+        snapshot = fetch_source(self.location)
+
+        self.assertEqual(snapshot.rows, [['a'], [2]])
+        self.assertIs(source_cache.get(self.location), snapshot)
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_source_without_validators_is_not_cached(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1')
+        fetch_source(self.location)
+        self.assertIsNone(source_cache.get(self.location))
+
+    @override_settings(SOURCE_CACHE_ENABLED=False)
+    @patch('api.sources.client.SourceClient.get')
+    def test_cache_disabled(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1', { 'ETag': '"v1"' })
+        fetch_source(self.location)
+        fetch_source(self.location)
+        self.assertIsNone(mock_get.call_args.kwargs['headers'])
+        self.assertIsNone(source_cache.get(self.location))
+
+class SourceCacheBudgetTests(TestCase):
+    def snapshot(self, location, rows=100):
+        return SourceSnapshot(location, [[f'{location}-{index}', str(index)] for index in range(rows)])
+
+    def test_least_recently_used_is_evicted(self):
+        first, second, third = self.snapshot('a'), self.snapshot('b'), self.snapshot('c')
+        size = first.table.estimate_size()
+        cache = SourceCache(max_bytes=size * 2 + size // 2)
+        cache.set(first)
+        cache.set(second)
+        self.assertIs(cache.get('a'), first)
+        cache.set(third)
+
+        # `b` was used least recently:
+        self.assertIsNone(cache.get('b'))
+        self.assertIs(cache.get('a'), first)
+        self.assertIs(cache.get('c'), third)
+        self.assertEqual(cache.stats(), {
+            'entries': 2,
+            'bytes': first.table.estimate_size() + third.table.estimate_size(),
+            'max_bytes': size * 2 + size // 2,
+            'hits': 3,
+            'misses': 1,
+            'evictions': 1,
+        })
+
+    def test_new_version_replaces_old(self):
+        cache = SourceCache(max_bytes=10 ** 9)
+        cache.set(self.snapshot('a', rows=1000))
+        replacement = self.snapshot('a', rows=10)
+        cache.set(replacement)
+        self.assertIs(cache.get('a'), replacement)
+        self.assertEqual(cache.stats()['bytes'], replacement.table.estimate_size())
+
+    def test_oversized_snapshot_is_not_cached(self):
+        cache = SourceCache(max_bytes=1000)
+        cache.set(self.snapshot('a', rows=10000))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    @override_settings(SOURCE_CACHE_MAX_BYTES=1234)
+    def test_budget_defaults_to_setting(self):
+        self.assertEqual(SourceCache().budget, 1234)
+
+@override_settings(SOURCE_SWR_ENABLED=True, SOURCE_SWR_FRESH_TTL=20, SOURCE_SWR_MAX_STALE=300)
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        source_cache.clear()
+        self.location = 'http://example.com/source.csv'
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_fresh_copy_is_served_without_request(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1')
+        snapshot = fetch_source(self.location)
+        self.assertIs(fetch_source(self.location), snapshot)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('api.sources.fetch.get_fetch_executor')
+    @patch('api.sources.client.SourceClient.get')
+    def test_stale_copy_is_served_while_revalidating(self, mock_get, mock_get_fetch_executor):
+        # Run background refreshes immediately so that they can be observed:
+        mock_get_fetch_executor.return_value.submit.side_effect = lambda function: function()
+
+        mock_get.return_value = mock_response(200, 'a\n1')
+        stale = fetch_source(self.location)
+        stale.fetched_at -= 60
+
+        mock_get.return_value = mock_response(200, 'a\n2')
+        self.assertIs(fetch_source(self.location), stale)
+        self.assertEqual(mock_get.call_count, 2)
+
+        # The next caller gets the revalidated copy:
+        self.assertEqual(fetch_source(self.location).rows, [['a'], [2]])
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_copy_older_than_max_stale_blocks(self, mock_get):
+        mock_get.return_value = mock_response(200, 'a\n1')
+        fetch_source(self.location).fetched_at -= 1000
+
+        mock_get.return_value = mock_response(200, 'a\n2')
+        self.assertEqual(fetch_source(self.location).rows, [['a'], [2]])
@@ -0,0 +1,42 @@
+import threading
+from django.test import TestCase, override_settings
+from api.sources.client import SourceClient, get_source_client, reset_source_client
+
+class SourceClientTests(TestCase):
+    def tearDown(self):
+        reset_source_client()
+
+    def test_session_is_per_thread(self):
+        client = SourceClient()
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(client.session))
+        thread.start()
+        thread.join()
+
+        # Each thread gets its own session:
+        self.assertIsNot(client.session, sessions[0])
+        # The calling thread re-uses its session:
+        self.assertIs(client.session, client.session)
+
+    def test_sessions_share_connection_pool(self):
+        client = SourceClient()
+        adapters = []
+        thread = threading.Thread(target=lambda: adapters.append(client.session.get_adapter('https://example.com/')))
+        thread.start()
+        thread.join()
+
+        self.assertIs(client.session.get_adapter('https://example.com/'), adapters[0])
+        self.assertIs(client.session.get_adapter('http://example.com/'), adapters[0])
+
+    def test_keep_alive_disabled(self):
+        client = SourceClient(keep_alive=False)
+        self.assertEqual(client.session.headers['Connection'], 'close')
+
+    @override_settings(SOURCE_HTTP_POOL_MAXSIZE=3, SOURCE_HTTP_TIMEOUT=2.5)
+    def test_get_source_client_uses_settings(self):
+        reset_source_client()
+        client = get_source_client()
+
+        self.assertIs(client, get_source_client())
+        self.assertEqual(client.timeout, 2.5)
+        self.assertEqual(client.session.get_adapter('https://example.com/')._pool_maxsize, 3)
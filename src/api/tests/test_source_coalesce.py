@@ -0,0 +1,137 @@
+import os
+import tempfile
+import threading
+import time
+from django.test import TestCase
+from unittest.mock import patch
+from api.sources import FileSingleFlight, SingleFlight, SourceSnapshot, fetch_source
+
+def run_in_threads(count, target):
+    results = [None] * count
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as error:
+            results[index] = error
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        def function():
+            calls.append(None)
+            release.wait()
+            return 'result'
+
+        threads, results = run_in_threads(10, lambda: flight.do('key', function))
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 10)
+        self.assertEqual(flight.stats(), { 'executed': 1, 'coalesced': 9 })
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        def function():
+            release.wait()
+            raise ValueError('failed')
+
+        threads, results = run_in_threads(3, lambda: flight.do('key', function))
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+        flight.do('key', lambda: 1)
+        flight.do('key', lambda: 2)
+        self.assertEqual(flight.stats(), { 'executed': 2, 'coalesced': 0 })
+
+    @patch('api.sources.fetch._download')
+    def test_fetch_source_is_coalesced(self, mock_download):
+        def download(location, append_only=False):
+            time.sleep(0.2)
+            return SourceSnapshot(location, [['a'], ['1']])
+        mock_download.side_effect = download
+
+        threads, results = run_in_threads(5, lambda: fetch_source('http://example.com/source.csv'))
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+class FileSingleFlightTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = 'http://example.com/source.csv'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_waiting_process_reads_snapshot(self):
+        # Each instance opens its own lock file, so they contend in the same way
+        # that separate processes do:
+        leader = FileSingleFlight(self.directory.name)
+        follower = FileSingleFlight(self.directory.name)
+        release = threading.Event()
+        def fetch():
+            release.wait()
+            return SourceSnapshot(self.location, [['a'], ['1']], etag='"v1"')
+
+        threads, results = run_in_threads(1, lambda: leader.do(self.location, fetch))
+        time.sleep(0.1)
+        follower_threads, follower_results = run_in_threads(1, lambda: follower.do(self.location, lambda: self.fail('Fetched twice.')))
+        time.sleep(0.1)
+        release.set()
+        for thread in threads + follower_threads:
+            thread.join()
+
+        self.assertEqual(follower_results[0].rows, [['a'], ['1']])
+        self.assertEqual(follower_results[0].etag, '"v1"')
+        self.assertEqual(leader.stats(), { 'executed': 1, 'coalesced': 0 })
+        self.assertEqual(follower.stats(), { 'executed': 0, 'coalesced': 1 })
+
+    def test_snapshot_only_written_for_waiting_processes(self):
+        flight = FileSingleFlight(self.directory.name)
+        flight.do(self.location, lambda: SourceSnapshot(self.location, [['a'], ['1']]))
+
+        self.assertFalse(os.path.exists(flight._store.path(self.location)))
+
+    def test_waiting_process_times_out(self):
+        leader = FileSingleFlight(self.directory.name)
+        follower = FileSingleFlight(self.directory.name, timeout=0.1)
+        release = threading.Event()
+        def fetch():
+            release.wait()
+            return SourceSnapshot(self.location, [['a'], ['1']])
+
+        threads, results = run_in_threads(1, lambda: leader.do(self.location, fetch))
+        time.sleep(0.1)
+        snapshot = follower.do(self.location, lambda: SourceSnapshot(self.location, [['a'], ['2']]))
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(snapshot.rows, [['a'], ['2']])
+        self.assertEqual(follower.stats(), { 'executed': 1, 'coalesced': 0 })
+
+    def test_stale_snapshot_is_not_reused(self):
+        flight = FileSingleFlight(self.directory.name)
+        flight.do(self.location, lambda: SourceSnapshot(self.location, [['a'], ['1']]))
+        snapshot = flight.do(self.location, lambda: SourceSnapshot(self.location, [['a'], ['2']]))
+
+        self.assertEqual(snapshot.rows, [['a'], ['2']])
+        self.assertEqual(flight.stats(), { 'executed': 2, 'coalesced': 0 })
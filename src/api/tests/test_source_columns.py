@@ -0,0 +1,84 @@
+from django.test import TestCase
+from api.sources import ParsedSource
+from api.sources.columns import TypedColumn, infer_column_type
+
+class InferColumnTypeTests(TestCase):
+    def test_infer_column_type(self):
+        self.assertEqual(infer_column_type(['1', '-2', '', None]), 'int')
+        self.assertEqual(infer_column_type(['1', '2.5', '1e3']), 'float')
+        self.assertEqual(infer_column_type(['2024-01-01', '2024-01-02T03:04:05+00:00']), 'timestamp')
+        self.assertEqual(infer_column_type(['2024-01-01T03:04:05Z', '2024-01-02T03:04:05.123Z']), 'timestamp')
+        self.assertEqual(infer_column_type(['1', 'a']), 'string')
+        self.assertEqual(infer_column_type(['', None]), None)
+
+    def test_numbers_keep_leading_zeros_as_text(self):
+        self.assertEqual(infer_column_type(['007', '008']), 'string')
+
+    def test_mostly_numeric_column(self):
+        self.assertEqual(infer_column_type([str(index) for index in range(9)] + ['n/a']), 'int')
+        self.assertEqual(infer_column_type([str(index) for index in range(8)] + ['n/a', 'n/a']), 'string')
+
+class TypedColumnTests(TestCase):
+    def test_non_numeric_cells(self):
+        column = TypedColumn.from_values('int', ['Value', '1', 'n/a', None, '3'])
+        self.assertEqual(column[:], ['Value', 1, 'n/a', None, 3])
+        self.assertEqual(column[1:], [1, 'n/a', None, 3])
+        self.assertEqual(column[-1], 3)
+        self.assertFalse(column.has_value(3))
+
+        # The header is kept when other non-numeric cells are `null`:
+        column.non_numeric = 'null'
+        self.assertEqual(column[:], ['Value', 1, None, None, 3])
+        self.assertTrue(column.has_value(2))
+
+    def test_slices(self):
+        values = [str(index) if index % 3 else 'x' for index in range(50)]
+        column = TypedColumn.from_values('int', values)
+        column.append('y')
+        values.append('y')
+        expected = [value if value in ('x', 'y') else int(value) for value in values]
+        for key in [slice(None), slice(4, 20), slice(3, 30, 3), slice(1, 50, 7), slice(45, None), slice(None, None, -4)]:
+            self.assertEqual(column[key], expected[key])
+
+    def test_int_column_becomes_float(self):
+        column = TypedColumn.from_values('int', ['1', '2'])
+        column.extend(['2.5', str(2 ** 70)])
+        self.assertEqual(column.kind, 'float')
+        self.assertEqual(column[:], [1.0, 2.0, 2.5, float(2 ** 70)])
+
+    def test_head_and_round_trip(self):
+        column = TypedColumn.from_values('float', ['x', '1.5', '2.5'])
+        head = column.head(2)
+        head.append('3.5')
+        self.assertEqual(head[:], ['x', 1.5, 3.5])
+        self.assertEqual(column[:], ['x', 1.5, 2.5])
+        self.assertEqual(TypedColumn.from_dict(column.as_dict())[:], ['x', 1.5, 2.5])
+
+class ParsedSourceTypesTests(TestCase):
+    def test_infer_types(self):
+        table = ParsedSource.from_rows([['t', 'a', 'b', 'c'], ['2024-01-01', '1', '1.5', 'x'], ['2024-01-02', '2', '', 'y']])
+        table.infer_types()
+        self.assertEqual([table.column_type(index) for index in range(4)], ['timestamp', 'int', 'float', 'string'])
+        self.assertEqual(table.column(1, 1), [1, 2])
+        self.assertEqual(table.column(2, 1), [1.5, ''])
+        self.assertEqual(table.rows()[0], ['t', 'a', 'b', 'c'])
+
+        restored = ParsedSource.from_dict(table.as_dict())
+        self.assertEqual(restored.rows(), table.rows())
+        self.assertEqual(restored.column_type(1), 'int')
+
+    def test_numeric_columns_are_smaller(self):
+        rows = [['a', 'b']] + [[str(index), str(index / 4)] for index in range(1000)]
+        table = ParsedSource.from_rows(rows)
+        size = table.estimate_size()
+        table.infer_types()
+        self.assertLess(table.estimate_size(), size / 4)
+
+    def test_columns_are_only_inferred_once(self):
+        table = ParsedSource.from_rows([['a', 'b'], ['1', '']])
+        table.infer_types()
+        self.assertEqual(table.types, ['int', None])
+        table.extend([['x', '2']])
+        table.infer_types()
+        self.assertEqual(table.column(0), ['a', 1, 'x'])
+        self.assertEqual(table.column(1), ['b', '', 2])
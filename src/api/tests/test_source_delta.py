@@ -0,0 +1,41 @@
+from django.test import TestCase
+from api.sources import SourceSnapshot
+from api.sources.delta import appended_since, data_version
+
+class DeltaTests(TestCase):
+    def setUp(self):
+        self.snapshots = {
+            'a': SourceSnapshot('a', [['x'], ['1'], ['2']]),
+            'b': SourceSnapshot('b', [['3'], ['4,']], complete_rows=1),
+        }
+
+    def test_data_version(self):
+        version = data_version(('config',), self.snapshots)
+        self.assertEqual(version.split('.')[1:], [f'{self.snapshots["a"].lineage}-3', f'{self.snapshots["b"].lineage}-1'])
+        self.assertNotEqual(version.split('.')[0], data_version(('other',), self.snapshots).split('.')[0])
+
+    def test_appended_since(self):
+        version = data_version(('config',), self.snapshots)
+        self.assertEqual(appended_since(version, ('config',), self.snapshots), { 'a': 3, 'b': 1 })
+
+        # Rows appended to the same lineage:
+        snapshots = {
+            'a': SourceSnapshot('a', [['x'], ['1'], ['2'], ['5']], lineage=self.snapshots['a'].lineage),
+            'b': self.snapshots['b'],
+        }
+        self.assertEqual(appended_since(version, ('config',), snapshots), { 'a': 3, 'b': 1 })
+
+    def test_appended_since_reset(self):
+        version = data_version(('config',), self.snapshots)
+        # The data is built differently:
+        self.assertIsNone(appended_since(version, ('other',), self.snapshots))
+        # A source was rewritten:
+        snapshots = { **self.snapshots, 'a': SourceSnapshot('a', [['x'], ['1'], ['2']]) }
+        self.assertIsNone(appended_since(version, ('config',), snapshots))
+        # A source has fewer rows than the client:
+        snapshots = { **self.snapshots, 'a': SourceSnapshot('a', [['x']], lineage=self.snapshots['a'].lineage) }
+        self.assertIsNone(appended_since(version, ('config',), snapshots))
+        # The sources are different, or the version is not valid:
+        self.assertIsNone(appended_since(version, ('config',), { 'a': self.snapshots['a'] }))
+        for invalid in ['', 'x', version + '.x', version.replace('-3', '-x')]:
+            self.assertIsNone(appended_since(invalid, ('config',), self.snapshots))
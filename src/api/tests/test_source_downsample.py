@@ -0,0 +1,41 @@
+import math
+from django.test import TestCase
+from api.sources.downsample import downsample_indices, lttb, min_max
+
+class DownsampleTests(TestCase):
+    def test_short_series_is_kept(self):
+        self.assertEqual(lttb([1, 2, 3], 10), [0, 1, 2])
+        self.assertEqual(min_max([1, 2, 3], 10), [0, 1, 2])
+
+    def test_lttb_keeps_peaks(self):
+        values = [math.sin(index / 10) for index in range(1000)]
+        values[500] = 100
+        indices = lttb(values, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertEqual(indices, sorted(set(indices)))
+        self.assertIn(500, indices)
+
+    def test_min_max_keeps_extremes(self):
+        values = [0] * 1000
+        values[123] = -5
+        values[877] = 5
+        indices = min_max(values, 20)
+        self.assertLessEqual(len(indices), 20)
+        self.assertIn(123, indices)
+        self.assertIn(877, indices)
+
+    def test_values_that_are_not_numbers(self):
+        values = ['n/a', None] + [str(index % 7) for index in range(100)] + ['x']
+        for select in (lttb, min_max):
+            indices = select(values, 10)
+            self.assertLessEqual(len(indices), 10)
+            self.assertEqual((indices[0], indices[-1]), (0, len(values) - 1))
+
+    def test_series_share_indices(self):
+        first = [index % 10 for index in range(1000)]
+        second = [index % 13 for index in range(400)]
+        indices = downsample_indices([first, second], 1000, 100, method='minmax')
+        self.assertLessEqual(len(indices), 100)
+        self.assertEqual(indices, sorted(set(indices)))
+        self.assertEqual(downsample_indices([], 101, 11), list(range(0, 101, 10)))
@@ -0,0 +1,58 @@
+import threading
+import time
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from api.sources import SourceFetchError, SourceSnapshot, fetch_sources
+
+class FetchSourcesTests(TestCase):
+    @patch('api.sources.fetch.fetch_source')
+    def test_fetches_concurrently(self, mock_fetch_source):
+        def slow_fetch(location, append_only=False):
+            time.sleep(0.2)
+            return SourceSnapshot(location, [['a'], ['1']])
+        mock_fetch_source.side_effect = slow_fetch
+
+        start = time.perf_counter()
+        results = fetch_sources([f'http://example.com/{index}.csv' for index in range(5)])
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(results), 5)
+        self.assertLess(elapsed, 0.6)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_fetches_each_location_once(self, mock_fetch_source):
+        mock_fetch_source.side_effect = lambda location, append_only=False: SourceSnapshot(location, [['a'], ['1']])
+        results = fetch_sources(['http://a/1.csv', 'http://a/2.csv', 'http://a/1.csv'])
+
+        self.assertEqual(list(results), ['http://a/1.csv', 'http://a/2.csv'])
+        self.assertEqual(mock_fetch_source.call_count, 2)
+
+    @patch('api.sources.fetch.fetch_source')
+    def test_errors_are_returned(self, mock_fetch_source):
+        def fetch(location, append_only=False):
+            if location.endswith('bad.csv'):
+                raise SourceFetchError('Failed.', 400)
+            return SourceSnapshot(location, [['a'], ['1']])
+        mock_fetch_source.side_effect = fetch
+        results = fetch_sources(['http://a/good.csv', 'http://a/bad.csv'])
+
+        self.assertIsInstance(results['http://a/good.csv'], SourceSnapshot)
+        self.assertIsInstance(results['http://a/bad.csv'], SourceFetchError)
+
+    @override_settings(SOURCE_FETCH_MAX_PARALLEL=2)
+    @patch('api.sources.fetch.fetch_source')
+    def test_parallelism_is_bounded(self, mock_fetch_source):
+        lock = threading.Lock()
+        in_flight = [0, 0] # Current, maximum
+        def fetch(location, append_only=False):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return SourceSnapshot(location, [['a'], ['1']])
+        mock_fetch_source.side_effect = fetch
+        fetch_sources([f'http://example.com/{index}.csv' for index in range(6)])
+
+        self.assertLessEqual(in_flight[1], 2)
@@ -0,0 +1,94 @@
+import os
+import pathlib
+import tempfile
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from api.sources import SourceFetchError, fetch_source, source_cache
+from api.sources.local import resolve_file_location
+
+class LocalSourceTests(TestCase):
+    def setUp(self):
+        source_cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, 'sources')
+        os.mkdir(self.root)
+        self.path = os.path.join(self.root, 'source.csv')
+        self.location = pathlib.Path(self.path).as_uri()
+        self.write(b'a,b\n1,2\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content, mode='wb'):
+        with open(self.path, mode) as file:
+            file.write(content)
+        # Make sure the modification time changes, even on filesystems with a
+        # coarse timestamp resolution:
+        mtime = os.stat(self.path).st_mtime + 1
+        os.utime(self.path, (mtime, mtime))
+
+    def test_file_sources_must_be_enabled(self):
+        with self.assertRaises(SourceFetchError):
+            fetch_source(self.location)
+
+    def test_locations_outside_of_root_are_rejected(self):
+        outside = os.path.join(self.directory.name, 'outside.csv')
+        with open(outside, 'wb') as file:
+            file.write(b'a\n')
+        os.symlink(outside, os.path.join(self.root, 'link.csv'))
+        for location in [pathlib.Path(outside).as_uri(), f'file://{self.root}/../outside.csv', f'file://{self.root}/link.csv', 'file://example.com/source.csv']:
+            with self.assertRaises(SourceFetchError):
+                resolve_file_location(location, self.root)
+        self.assertEqual(resolve_file_location(self.location, self.root), os.path.realpath(self.path))
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        with override_settings(SOURCE_FILE_ROOT=self.root, SOURCE_CACHE_ENABLED=True):
+            snapshot = fetch_source(self.location)
+            self.assertEqual(snapshot.rows, [['a', 'b'], [1, 2]])
+            with patch('api.sources.stream.clean_text') as mock_clean:
+                self.assertIs(fetch_source(self.location), snapshot)
+                mock_clean.assert_not_called()
+
+            self.write(b'a,b\n3,4\n')
+            self.assertEqual(fetch_source(self.location).rows, [['a', 'b'], [3, 4]])
+
+    def test_missing_and_empty_files(self):
+        with override_settings(SOURCE_FILE_ROOT=self.root):
+            with self.assertRaises(SourceFetchError):
+                fetch_source(pathlib.Path(self.root, 'missing.csv').as_uri())
+            self.write(b'')
+            self.assertEqual(fetch_source(self.location).rows, [])
+
+    def test_append_only_file_is_resumed(self):
+        with override_settings(SOURCE_FILE_ROOT=self.root, SOURCE_CACHE_ENABLED=True):
+            self.write(b'a,b\n1,2\n3,')
+            snapshot = fetch_source(self.location, append_only=True)
+            self.assertEqual((snapshot.offset, snapshot.complete_rows), (8, 2))
+            lineage = snapshot.lineage
+
+            self.write(b'4\n5,6\n', mode='ab')
+            with patch('api.sources.stream.clean_text', side_effect=lambda line: line) as mock_clean:
+                snapshot = fetch_source(self.location, append_only=True)
+            self.assertEqual(snapshot.rows, [['a', 'b'], [1, 2], [3, 4], [5, 6]])
+            self.assertEqual(mock_clean.call_count, 2)
+            self.assertEqual(snapshot.lineage, lineage)
+
+    def test_file_changed_while_read(self):
+        fstat = os.fstat
+        def fstat_then_write(content, mode):
+            def wrapper(fd):
+                stat_result = fstat(fd)
+                self.write(content, mode)
+                return stat_result
+            return wrapper
+
+        with override_settings(SOURCE_FILE_ROOT=self.root):
+            # Rows appended after the file was opened are left for the next
+            # read:
+            with patch('api.sources.local.os.fstat', side_effect=fstat_then_write(b'3,4\n', 'ab')):
+                self.assertEqual(fetch_source(self.location).rows, [['a', 'b'], [1, 2]])
+
+            # A file that is truncated while it is read fails to read:
+            with patch('api.sources.local.os.fstat', side_effect=fstat_then_write(b'a\n', 'wb')):
+                with self.assertRaisesMessage(SourceFetchError, 'truncated'):
+                    fetch_source(self.location)
@@ -0,0 +1,32 @@
+from django.test import TestCase
+from unittest.mock import patch
+from api.sources import ColumnProjection, ParsedSource
+
+class ColumnProjectionTests(TestCase):
+    def test_shared_columns_are_extracted_once(self):
+        tables = {
+            'a': ParsedSource.from_rows([['x', 'y', 'z'], ['1', '2', '3'], ['4', '5']]),
+            'b': ParsedSource.from_rows([['7'], ['8']]),
+        }
+        projection = ColumnProjection()
+        first = projection.add('a', 1, start=1)
+        second = projection.add('a', 1, start=1)
+        third = projection.add('a', 2, start=1)
+        fourth = projection.add('b', 0)
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(projection.locations()), ['a', 'b'])
+
+        columns = projection.extract(tables)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns[first], ['2', '5'])
+        # Trailing values of rows that are too short are removed:
+        self.assertEqual(columns[third], ['3'])
+        self.assertEqual(columns[fourth], ['7', '8'])
+
+    def test_unplanned_columns_are_not_read(self):
+        table = ParsedSource.from_rows([['1', '2'], ['3', '4']])
+        projection = ColumnProjection()
+        key = projection.add('a', 0)
+        with patch.object(table, 'column', wraps=table.column) as mock_column:
+            self.assertEqual(projection.extract({ 'a': table })[key], ['1', '3'])
+        mock_column.assert_called_once_with(0, 0, None)
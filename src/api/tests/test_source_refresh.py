@@ -0,0 +1,125 @@
+import os
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from api.models import Source
+from api.sources import SnapshotStore, SourceFetchError, SourceSnapshot, fetch_source, refresh_source
+from api.sources.refresh import RefreshScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class RefreshSchedulerTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = RefreshScheduler(workers=2, jitter=0, max_backoff=100, clock=self.clock)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    @patch('api.sources.refresh.refresh_source')
+    def test_sources_refresh_on_their_own_schedule(self, mock_refresh_source):
+        self.scheduler.load({ 'http://a/1.csv': 10, 'http://a/2.csv': 30 })
+        self.scheduler.dispatch()
+        self.scheduler.wait()
+        self.assertEqual(mock_refresh_source.call_count, 2)
+
+        # Only the source with the shorter interval is due after 10 seconds:
+        self.clock.now += 10
+        self.assertEqual(self.scheduler.dispatch(), 20)
+        self.scheduler.wait()
+        self.assertEqual(mock_refresh_source.call_count, 3)
+        mock_refresh_source.assert_called_with('http://a/1.csv', 20, append_only=False)
+
+    @patch('api.sources.refresh.refresh_source')
+    def test_failures_back_off(self, mock_refresh_source):
+        mock_refresh_source.side_effect = SourceFetchError('Failed.')
+        self.scheduler.load({ 'http://a/1.csv': 10 })
+        self.scheduler.dispatch()
+        self.scheduler.wait()
+        self.assertEqual(self.scheduler.dispatch(), 20)
+
+        self.clock.now += 20
+        self.scheduler.dispatch()
+        self.scheduler.wait()
+        self.assertEqual(self.scheduler.dispatch(), 40)
+
+    def test_delay_is_capped_and_jittered(self):
+        scheduler = RefreshScheduler(jitter=0.5, max_backoff=100)
+        self.assertEqual(scheduler.delay(60, 5) // 100, 1)
+        for _ in range(20):
+            self.assertTrue(10 <= scheduler.delay(10, 0) <= 15)
+        scheduler.shutdown()
+
+    @patch('api.sources.refresh.refresh_source')
+    def test_removed_sources_are_not_refreshed(self, mock_refresh_source):
+        self.scheduler.load({ 'http://a/1.csv': 10 })
+        self.scheduler.load({})
+        self.assertIsNone(self.scheduler.dispatch())
+        mock_refresh_source.assert_not_called()
+
+class PrefetchTests(TestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = 'http://example.com/source.csv'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @patch('api.sources.fetch._download')
+    def test_prefetched_copy_is_served(self, mock_download):
+        mock_download.return_value = SourceSnapshot(self.location, [['a'], ['1']])
+        with override_settings(SOURCE_PREFETCH_DIR=self.directory.name):
+            refresh_source(self.location, 60)
+            mock_download.side_effect = AssertionError('The source should not be fetched.')
+            self.assertEqual(fetch_source(self.location).rows, [['a'], ['1']])
+
+    @patch('api.sources.fetch._download')
+    def test_expired_copy_is_not_served(self, mock_download):
+        mock_download.return_value = SourceSnapshot(self.location, [['a'], ['1']], fetched_at=0)
+        with override_settings(SOURCE_PREFETCH_DIR=self.directory.name):
+            refresh_source(self.location, 60)
+            mock_download.return_value = SourceSnapshot(self.location, [['a'], ['2']])
+            self.assertEqual(fetch_source(self.location).rows, [['a'], ['2']])
+
+    def test_loaded_copy_is_kept(self):
+        store = SnapshotStore(self.directory.name, keep_loaded=True)
+        SnapshotStore(self.directory.name).set(SourceSnapshot(self.location, [['a'], ['1']]))
+        snapshot, _ = store.get(self.location)
+        self.assertEqual(snapshot.rows, [['a'], ['1']])
+
+        # The file is not read again until it is replaced:
+        with patch('api.sources.cache.json.load', side_effect=AssertionError('The file should not be read.')):
+            self.assertIs(store.get(self.location)[0], snapshot)
+        SnapshotStore(self.directory.name).set(SourceSnapshot(self.location, [['a'], ['2']]))
+        self.assertEqual(store.get(self.location)[0].rows, [['a'], ['2']])
+
+        # Nor is a snapshot that this store wrote:
+        written = SourceSnapshot(self.location, [['a'], ['3']])
+        store.set(written)
+        with patch('api.sources.cache.json.load', side_effect=AssertionError('The file should not be read.')):
+            self.assertIs(store.get(self.location)[0], written)
+
+        os.remove(store.path(self.location))
+        self.assertEqual(store.get(self.location), (None, None))
+
+    @patch('api.sources.refresh.refresh_source')
+    def test_refresh_sources_once(self, mock_refresh_source):
+        Source.objects.create(name="Source 1", location=self.location, has_header=True, refresh_interval=30)
+        Source.objects.create(name="Source 2", location=self.location, has_header=True, refresh_interval=10)
+        Source.objects.create(name="Source 3", location="http://example.com/other.csv", has_header=True)
+        with override_settings(SOURCE_PREFETCH_DIR=self.directory.name, SOURCE_PREFETCH_GRACE=2):
+            call_command('refresh_sources', once=True, jitter=0)
+        mock_refresh_source.assert_called_once_with(self.location, 20, append_only=False)
+
+    def test_refresh_sources_requires_prefetch_dir(self):
+        with self.assertRaises(CommandError):
+            call_command('refresh_sources', once=True)
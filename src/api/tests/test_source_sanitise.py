@@ -0,0 +1,57 @@
+import nh3
+import random
+import re
+from django.test import TestCase
+from api.sources.sanitise import ALLOWED_CSV_CHARSET, clean_text, clean_value
+
+def legacy_clean_value(value):
+    """
+    The original `clean_csv_value`, applied after the whole document had been
+    cleaned by `nh3`.
+    """
+
+    if value is None:
+        return ''
+    value = str(value)
+    return nh3.clean(''.join([char for char in value if char in ALLOWED_CSV_CHARSET]).strip())
+
+# Markup is escaped by the sanitiser instead of being filtered by `nh3`, so
+# text that `nh3` would parse as a tag is not compared:
+MARKUP = re.compile('<[A-Za-z/!?]')
+
+FRAGMENTS = list('ab1 ;#&<>x\r\n\x00\xa0\ufeff£€,"\'\t:') + [
+    '&amp;', '&lt;', '&gt;', '&nbsp;', '&#39;', '&#13;', '&#0;', '&copy', '&amp', '&nbsp', '&#x41;', '&pound;',
+    '&notit;', '&#160;', '\r\n', '&#10;', '&#x;', '&#;', '&AElig', '&#1', '&#x80;', '&#xD800;', '&#99999999;',
+]
+
+class SanitiseTests(TestCase):
+    def test_clean_text_matches_nh3(self):
+        cases = ['1.5', 'a,b\r\n', 'x\ry', 'a\x00b', 'a\xa0b', '\ufeffa', 'R&D', '&amp;', '&ampx', '1 < 2', '&#13;', '&#128;', '&notit;']
+        for text in cases:
+            self.assertEqual(clean_text(text), nh3.clean(text), repr(text))
+
+    def test_clean_value_matches_legacy(self):
+        cases = ['1.5', '  padded  ', 'R&D', '&amp;', 'a;b', '&nbsp;', '<>', '£5 & 6%', '`:;"\'@#~=¬|', '\xa0x\xa0', None]
+        for value in cases:
+            self.assertEqual(clean_value(value), legacy_clean_value(value), repr(value))
+            self.assertEqual(clean_value(clean_text(value or '')), legacy_clean_value(nh3.clean(value or '')), repr(value))
+
+    def test_random_text_matches_legacy(self):
+        generator = random.Random(0)
+        for _ in range(20000):
+            text = ''.join(generator.choice(FRAGMENTS) for _ in range(generator.randint(0, 12)))
+            if MARKUP.search(text):
+                continue
+            cleaned = nh3.clean(text)
+            self.assertEqual(clean_text(text), cleaned, repr(text))
+            if not MARKUP.search(''.join(char for char in cleaned if char in ALLOWED_CSV_CHARSET)):
+                self.assertEqual(clean_value(cleaned), legacy_clean_value(cleaned), repr(cleaned))
+
+    def test_markup_is_escaped(self):
+        self.assertEqual(clean_text('<script>alert(1)</script>'), '&lt;script&gt;alert(1)&lt;/script&gt;')
+        self.assertEqual(clean_value('<b>x</b>'), '&lt;b&gt;x&lt;/b&gt;')
+
+    def test_clean_values_are_untouched(self):
+        value = 'already clean'
+        self.assertIs(clean_value(value), value)
+        self.assertIs(clean_text(value), value)
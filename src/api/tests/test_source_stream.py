@@ -0,0 +1,120 @@
+import csv
+from django.test import TestCase, override_settings
+from unittest.mock import patch, Mock
+from api.sources import SourceFetchError, fetch_source, source_cache
+from api.sources.stream import CsvStreamReader, read_csv_stream, split_prefix
+
+def mock_stream(body, chunk_size=4, headers=None, status_code=200):
+    response = Mock()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response.headers = { 'Content-Type': 'text/csv', **(headers or {}) }
+    response.iter_content.return_value = [body[index:index + chunk_size] for index in range(0, len(body), chunk_size)]
+    return response
+
+class StreamTests(TestCase):
+    def test_lines_span_chunks(self):
+        chunks = [b'a,b\r', b'\nc,"d\n', b'e"\n', b'\xc2', b'\xa3']
+        reader = CsvStreamReader('utf-8', 100, 100)
+        self.assertEqual(reader.read(chunks).rows(), [['a', 'b'], ['c', 'd\ne'], ['£']])
+        self.assertEqual(reader.offset, 13)
+        self.assertEqual(reader.complete_rows, 2)
+        self.assertEqual(reader.tail, b'a,b\r\nc,"d\ne"\n')
+
+    def test_split_prefix(self):
+        prefix, rest = split_prefix([b'ab', b'cd', b'ef'], 3)
+        self.assertEqual(prefix, b'abc')
+        self.assertEqual(list(rest), [b'd', b'ef'])
+
+    def test_rows_match_whole_document_parse(self):
+        body = 'h1,h2\r\n1,"multi\nline"\n<b>x</b> & y,3\n'.encode('utf-8')
+        rows = read_csv_stream(mock_stream(body), max_bytes=1000, max_rows=10).rows()
+        # Markup is escaped rather than passed through:
+        self.assertEqual(rows, [['h1', 'h2'], ['1', 'multi\nline'], ['&lt;b&gt;x&lt;/b&gt; &amp; y', '3']])
+
+    def test_max_bytes(self):
+        with self.assertRaises(SourceFetchError):
+            read_csv_stream(mock_stream(b'a\n' * 100), max_bytes=50, max_rows=1000)
+
+    def test_content_length_is_checked_before_reading(self):
+        response = mock_stream(b'a\n', headers={ 'Content-Length': '5000' })
+        with self.assertRaises(SourceFetchError):
+            read_csv_stream(response, max_bytes=1000, max_rows=1000)
+        response.iter_content.assert_not_called()
+
+    def test_max_rows(self):
+        with self.assertRaises(SourceFetchError):
+            read_csv_stream(mock_stream(b'a\n' * 11), max_bytes=1000, max_rows=10)
+        self.assertEqual(read_csv_stream(mock_stream(b'a\n' * 10), max_bytes=1000, max_rows=10).row_count, 10)
+
+    def test_invalid_csv(self):
+        # Errors from the CSV parser are reported like any other bad source:
+        with self.assertRaisesMessage(SourceFetchError, 'line 2'):
+            read_csv_stream(mock_stream(b'a\n' + b'b' * (csv.field_size_limit() + 1) + b'\n'), max_bytes=10 ** 7, max_rows=10).rows()
+
+    @override_settings(SOURCE_MAX_ROWS=2)
+    @patch('api.sources.client.SourceClient.get')
+    def test_fetch_aborts_and_closes_connection(self, mock_get):
+        source_cache.clear()
+        mock_get.return_value = mock_stream(b'a\n1\n2\n3\n')
+        with self.assertRaises(SourceFetchError):
+            fetch_source('http://example.com/source.csv')
+        self.assertTrue(mock_get.call_args.kwargs['stream'])
+        mock_get.return_value.close.assert_called_once()
+
+@override_settings(SOURCE_CACHE_ENABLED=True, SOURCE_COALESCE_ENABLED=False)
+class AppendOnlyTests(TestCase):
+    def setUp(self):
+        source_cache.clear()
+        self.location = 'http://example.com/source.csv'
+
+    def fetch(self, mock_get, response):
+        mock_get.return_value = response
+        return fetch_source(self.location, append_only=True)
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_only_appended_bytes_are_fetched(self, mock_get):
+        body = b'a,b\n1,2\n3,'
+        snapshot = self.fetch(mock_get, mock_stream(body))
+        lineage = snapshot.lineage
+        self.assertEqual(snapshot.rows, [['a', 'b'], [1, 2], [3, '']])
+        self.assertEqual((snapshot.offset, snapshot.complete_rows), (8, 2))
+        self.assertNotIn('Range', mock_get.call_args.kwargs['headers'] or {})
+
+        # The incomplete final row is read again along with the new rows:
+        appended = body + b'4\n5,6\n'
+        response = mock_stream(appended, status_code=206, headers={ 'Content-Range': f'bytes 0-{len(appended) - 1}/{len(appended)}' })
+        snapshot = self.fetch(mock_get, response)
+        self.assertEqual(mock_get.call_args.kwargs['headers']['Range'], 'bytes=0-')
+        self.assertEqual(snapshot.rows, [['a', 'b'], [1, 2], [3, 4], [5, 6]])
+        self.assertEqual((snapshot.offset, snapshot.complete_rows), (len(appended), 4))
+        # Appended rows continue the lineage of the snapshot:
+        self.assertEqual(snapshot.lineage, lineage)
+
+    @patch('api.sources.client.SourceClient.get')
+    @patch('api.sources.stream.TAIL_SIZE', 4)
+    def test_range_starts_before_offset(self, mock_get):
+        self.fetch(mock_get, mock_stream(b'a,b\n1,2\n'))
+        response = mock_stream(b'1,2\n3,4\n', status_code=206, headers={ 'Content-Range': 'bytes 4-11/12' })
+        snapshot = self.fetch(mock_get, response)
+        self.assertEqual(mock_get.call_args.kwargs['headers']['Range'], 'bytes=4-')
+        self.assertEqual(snapshot.rows, [['a', 'b'], [1, 2], [3, 4]])
+
+    @patch('api.sources.client.SourceClient.get')
+    @patch('api.sources.stream.TAIL_SIZE', 4)
+    def test_rewritten_source_is_fetched_in_full(self, mock_get):
+        lineage = self.fetch(mock_get, mock_stream(b'a,b\n1,2\n')).lineage
+        rewritten = mock_stream(b'9,9\n3,4\n', status_code=206, headers={ 'Content-Range': 'bytes 4-11/12' })
+        mock_get.side_effect = [rewritten, mock_stream(b'a,b\n9,9\n3,4\n')]
+        snapshot = fetch_source(self.location, append_only=True)
+        self.assertEqual(snapshot.rows, [['a', 'b'], [9, 9], [3, 4]])
+        self.assertNotEqual(snapshot.lineage, lineage)
+        self.assertNotIn('Range', mock_get.call_args.kwargs['headers'] or {})
+        rewritten.close.assert_called_once()
+
+    @patch('api.sources.client.SourceClient.get')
+    def test_ignored_range_is_fetched_in_full(self, mock_get):
+        self.fetch(mock_get, mock_stream(b'a\n1\n'))
+        mock_get.side_effect = [mock_stream(b'a\n1\n2\n'), mock_stream(b'a\n1\n2\n')]
+        self.assertEqual(fetch_source(self.location, append_only=True).rows, [['a'], [1], [2]])
+        self.assertEqual(mock_get.call_count, 3)
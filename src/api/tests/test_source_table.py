@@ -0,0 +1,73 @@
+from django.test import TestCase
+from api.sources import ParsedSource
+from api.sources.table import _CHUNK_SIZE
+
+class ParsedSourceTests(TestCase):
+    def test_ragged_rows(self):
+        rows = [['h1', 'h2'], ['1'], [], ['2', '3', '4']]
+        table = ParsedSource.from_rows(rows)
+        self.assertEqual(table.row_count, 4)
+        self.assertEqual(table.column_count, 3)
+        self.assertEqual(table.column(0, 1), ['1', None, '2'])
+        self.assertEqual(table.column(2), [None, None, None, '4'])
+        self.assertEqual([table.row_length(index) for index in range(4)], [2, 1, 0, 3])
+        self.assertEqual(table.rows(), rows)
+        self.assertTrue(table.ragged)
+        self.assertEqual(table.values(0, 1), ['1', '2'])
+
+    def test_values_of_ragged_rows_with_null_cells(self):
+        rows = [['x', 'y'], ['1', '1'], ['2'], ['3', 'n/a']] + [[str(value), str(value)] for value in range(4, 14)]
+        table = ParsedSource.from_rows(rows)
+        table.infer_types(non_numeric='null')
+        self.assertEqual(table.column_type(1), 'int')
+        self.assertEqual(table.values(0, 1), list(range(1, 14)))
+        self.assertEqual(table.values(1, 1), [1, None] + list(range(4, 14)))
+        self.assertEqual(table.values(1, 2, 4), [None])
+        self.assertEqual(list(table.iter_values(1, 1)), table.values(1, 1))
+
+    def test_values_of_uniform_rows(self):
+        table = ParsedSource.from_rows([['a', 'b'], ['1', '2'], ['3', '4']])
+        self.assertFalse(table.ragged)
+        self.assertEqual(table.values(1, 1), ['2', '4'])
+
+    def test_rows_span_chunks(self):
+        rows = [[str(index), str(index * 2)] for index in range(_CHUNK_SIZE * 2 + 3)]
+        rows[_CHUNK_SIZE + 1] = ['x']
+        table = ParsedSource.from_rows(rows)
+        self.assertEqual(table.rows(), rows)
+
+    def test_iter_values(self):
+        rows = [[str(index), str(index * 2)] for index in range(_CHUNK_SIZE * 2 + 3)]
+        rows[_CHUNK_SIZE + 1] = ['x']
+        table = ParsedSource.from_rows(rows)
+        for start, stop in [(0, None), (1, _CHUNK_SIZE + 5), (_CHUNK_SIZE, _CHUNK_SIZE * 10)]:
+            self.assertEqual(list(table.iter_values(1, start, stop)), table.values(1, start, stop))
+
+    def test_head(self):
+        table = ParsedSource.from_rows([['a'], ['1'], ['2', 'extra']])
+        head = table.head(2)
+        self.assertEqual(head.rows(), [['a'], ['1']])
+        self.assertEqual(head.column_count, 1)
+
+        # The original table is unchanged when the head is extended:
+        head.append(['3'])
+        self.assertEqual(table.rows(), [['a'], ['1'], ['2', 'extra']])
+
+    def test_round_trip(self):
+        table = ParsedSource.from_rows([['a', 'b'], ['1']])
+        self.assertEqual(ParsedSource.from_dict(table.as_dict()).rows(), [['a', 'b'], ['1']])
+
+    def test_digest(self):
+        table = ParsedSource.from_rows([['a', 'b'], ['1', '2'], ['3']])
+        self.assertEqual(table.digest(), ParsedSource.from_dict(table.as_dict()).digest())
+        self.assertNotEqual(table.digest(), ParsedSource.from_rows([['a', 'b'], ['1', '2'], ['4']]).digest())
+        self.assertNotEqual(table.digest(), ParsedSource.from_rows([['a', 'b'], ['1', '2'], ['3', '']]).digest())
+        digest = table.digest()
+        table.infer_types()
+        self.assertNotEqual(table.digest(), digest)
+
+    def test_estimate_size(self):
+        small = ParsedSource.from_rows([['1', '2']] * 10)
+        large = ParsedSource.from_rows([['1', '2']] * 10000)
+        self.assertGreater(small.estimate_size(), 0)
+        self.assertGreater(large.estimate_size(), small.estimate_size() * 500)
@@ -1,12 +1,12 @@
 from django.core.cache import cache
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from django.test import RequestFactory
+from django.test import RequestFactory, override_settings
 from rest_framework.test import APIClient, APITestCase
 from unittest.mock import patch, MagicMock
 from api.models import Source
+from api.sources import SourceSnapshot
 from api.views.source import *
-from io import StringIO
 
 class SourceListViewTests(APITestCase):
     databases = {'default', 'graph'}
@@ -45,6 +45,19 @@ class SourceListViewTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()['data']), 2)
 
+    def test_get_sources_not_modified(self):
+        Source.objects.create(name="Source 1", location="path/to/source1.csv", has_header=True)
+
+        response = self.client.get('/api/source/')
+        response = self.client.get('/api/source/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        Source.objects.update(name="Renamed")
+        response = self.client.get('/api/source/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['name'], 'Renamed')
+
     def test_get_sources_no_permission(self):
         """
         Ensure that a user without the 'view_source' permission cannot access the get method.
@@ -175,12 +188,13 @@ class SourceDataViewTests(APITestCase):
     
     @patch('api.views.source.read_source_at')
     def test_get_source_data_success(self, mock_read_source_at):
-        # Mock the CSV file content as a string, like a real CSV file
-        mock_csv_content = "Header1,Header2\nRow1Col1,Row1Col2\n"
-        mock_csv_file = StringIO(mock_csv_content)
+        # Mock the CSV rows, as they would be parsed from a real CSV file
+        mock_csv_rows = [['Header1', 'Header2'], ['Row1Col1', 'Row1Col2']]
+        mock_snapshot = SourceSnapshot('http://example.com/test.csv', mock_csv_rows)
 
-        # Mock the read_source_at function to return success with the mock file:
-        mock_read_source_at.return_value = (True, mock_csv_file)
+        # Mock the read_source_at function to return success with the mock
+        # snapshot:
+        mock_read_source_at.return_value = (True, mock_snapshot)
 
         # Set the source location and headers
         self.source.location = 'http://example.com/test.csv'
@@ -188,8 +202,11 @@ class SourceDataViewTests(APITestCase):
         self.source.save()
 
         # Perform the GET request:
+        mock_snapshot.fetched_at -= 30
         response = self.client.get(f'/api/source/{self.source.id}/data/')
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Age'], '30')
+        self.assertEqual(response.json()['age'], 30)
         
         # Validate the data structure:
         response_data = response.json()  # Extract the response JSON
@@ -203,6 +220,94 @@ class SourceDataViewTests(APITestCase):
         self.assertEqual(data[0]['name'], 'Header1')
         self.assertEqual(data[1]['name'], 'Header2')
 
+    @patch('api.views.source.read_source_at')
+    def test_get_source_data_typed_columns(self, mock_read_source_at):
+        rows = [['Time', 'Value', 'Name'], ['2024-01-01', 'n/a', '<b>']] + [[f'2024-01-{day:02}', f'{day}.5', 'x'] for day in range(2, 11)]
+        mock_snapshot = SourceSnapshot(self.source.location, rows)
+        mock_snapshot.table.infer_types()
+        mock_read_source_at.return_value = (True, mock_snapshot)
+
+        response = self.client.get(f'/api/source/{self.source.id}/data/')
+        data = response.json()['data']
+        self.assertEqual([column['type'] for column in data], ['timestamp', 'float', 'string'])
+        self.assertEqual(data[1]['data'][:3], ['n/a', 2.5, 3.5])
+        self.assertEqual(data[2]['data'][:2], ['&lt;b&gt;', 'x'])
+
+    @patch('api.views.source.read_source_at')
+    def test_get_source_data_window(self, mock_read_source_at):
+        mock_snapshot = SourceSnapshot(self.source.location, [['Value']] + [[str(index)] for index in range(10)])
+        mock_read_source_at.return_value = (True, mock_snapshot)
+
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'tail': 3 })
+        self.assertEqual(response.json()['data'][0]['data'], ['7', '8', '9'])
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'offset': 8, 'limit': 5 })
+        self.assertEqual(response.json()['data'][0]['data'], ['8', '9'])
+
+        # There is no timestamp column to find a time range in:
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'from': '2024-01-01' })
+        self.assertEqual(response.status_code, 400)
+
+    @patch('api.views.source.read_source_at')
+    def test_get_source_data_selection(self, mock_read_source_at):
+        mock_snapshot = SourceSnapshot(self.source.location, [['A', 'B', 'C']] + [[str(index), str(index * 2), 'x'] for index in range(10)])
+        mock_read_source_at.return_value = (True, mock_snapshot)
+
+        with patch.object(mock_snapshot.table, 'values', wraps=mock_snapshot.table.values) as mock_values:
+            response = self.client.get(f'/api/source/{self.source.id}/data/', { 'columns': '2,1', 'offset': 2, 'limit': 3 })
+        body = response.json()
+        self.assertEqual((body['total_rows'], body['total_columns'], body['offset']), (10, 3, 2))
+        self.assertEqual([(column['index'], column['name']) for column in body['data']], [(2, 'C'), (1, 'B')])
+        self.assertEqual(body['data'][1]['data'], ['4', '6', '8'])
+        # The column that was not selected is never read:
+        self.assertEqual([call.args[0] for call in mock_values.call_args_list], [2, 1])
+
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'header_only': '1' })
+        self.assertEqual([column['data'] for column in response.json()['data']], [[], [], []])
+        self.assertEqual(response.json()['total_rows'], 10)
+
+        for query in [{ 'columns': '3' }, { 'columns': 'a' }]:
+            response = self.client.get(f'/api/source/{self.source.id}/data/', query)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('api.views.source.read_source_at')
+    def test_get_source_data_not_modified(self, mock_read_source_at):
+        mock_snapshot = SourceSnapshot(self.source.location, [['A', 'B'], ['1', '2'], ['3', '4']])
+        mock_read_source_at.return_value = (True, mock_snapshot)
+
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'columns': '1' })
+        etag = response['ETag']
+
+        with patch.object(mock_snapshot.table, 'values') as mock_values:
+            response = self.client.get(f'/api/source/{self.source.id}/data/', { 'columns': '1' }, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        mock_values.assert_not_called()
+
+        # Other queries and new versions of the source have other ETags:
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'columns': '0' }, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        mock_read_source_at.return_value = (True, SourceSnapshot(self.source.location, [['A', 'B'], ['1', '2'], ['3', '5']]))
+        response = self.client.get(f'/api/source/{self.source.id}/data/', { 'columns': '1' }, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @patch('api.views.source.read_source_at')
+    def test_get_source_data_streamed(self, mock_read_source_at):
+        mock_snapshot = SourceSnapshot(self.source.location, [['A', 'B']] + [[str(index), f'<b>{index}</b>'] for index in range(10)])
+        mock_read_source_at.return_value = (True, mock_snapshot)
+
+        response = self.client.get(f'/api/source/{self.source.id}/data/')
+        self.assertFalse(response.streaming)
+
+        # Sources with at least as many values as the threshold are streamed,
+        # and their values are still cleaned:
+        with override_settings(SOURCE_STREAMING_THRESHOLD=20):
+            streamed_response = self.client.get(f'/api/source/{self.source.id}/data/')
+        self.assertTrue(streamed_response.streaming)
+        self.assertEqual(streamed_response['Age'], response['Age'])
+        self.assertEqual(b''.join(streamed_response.streaming_content), response.content)
+        self.assertEqual(response.json()['data'][1]['data'][0], '&lt;b&gt;0&lt;/b&gt;')
+
     @patch('api.views.source.read_source_at')
     def test_get_source_data_read_failure(self, mock_read_source_at):
         mock_read_source_at.return_value = (False, error_response('Failed to read source.', 400))
@@ -212,4 +317,79 @@ class SourceDataViewTests(APITestCase):
 
     def test_get_source_data_not_found(self):
         response = self.client.get('/api/source/999/data/')
-        self.assertEqual(response.status_code, 404)
\ No newline at end of file
+        self.assertEqual(response.status_code, 404)
+
+class SourceRefreshIntervalTests(APITestCase):
+    databases = {'default', 'graph'}
+
+    def setUp(self):
+        self.user_with_perms = User.objects.create_user(username='permuser', password='password')
+        content_type = ContentType.objects.get(app_label='api', model='source')
+        for codename in ['view_source', 'add_source', 'change_source']:
+            permission = Permission.objects.get(codename=codename, content_type=content_type)
+            self.user_with_perms.user_permissions.add(permission)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_with_perms)
+
+    def test_post_source_with_refresh_interval(self):
+        response = self.client.post('/api/source/', {
+            "name": "Test Source",
+            "location": "http://example.com/test.csv",
+            "has_header": True,
+            "refresh_interval": 30
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        source = Source.objects.get()
+        self.assertEqual(source.refresh_interval, 30)
+
+        response = self.client.get(f'/api/source/{source.id}/')
+        self.assertEqual(response.json()['data']['refresh_interval'], 30)
+
+    def test_post_source_invalid_refresh_interval(self):
+        for refresh_interval in [0, -5, "30", True]:
+            response = self.client.post('/api/source/', {
+                "name": "Test Source",
+                "location": "http://example.com/test.csv",
+                "has_header": True,
+                "refresh_interval": refresh_interval
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_put_source_refresh_interval(self):
+        source = Source.objects.create(name="Source 1", location="http://example.com/test.csv", has_header=True, refresh_interval=30)
+        payload = {
+            "name": "Source 1",
+            "location": "http://example.com/test.csv",
+            "has_header": True
+        }
+
+        # Omitting the refresh interval keeps the existing value:
+        response = self.client.put(f'/api/source/{source.id}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        source.refresh_from_db()
+        self.assertEqual(source.refresh_interval, 30)
+
+        # An explicit null clears it:
+        response = self.client.put(f'/api/source/{source.id}/', { **payload, "refresh_interval": None }, format='json')
+        self.assertEqual(response.status_code, 200)
+        source.refresh_from_db()
+        self.assertIsNone(source.refresh_interval)
+
+    def test_append_only(self):
+        payload = {
+            "name": "Test Source",
+            "location": "http://example.com/test.csv",
+            "has_header": True
+        }
+        response = self.client.post('/api/source/', { **payload, "append_only": "yes" }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/source/', { **payload, "append_only": True }, format='json')
+        self.assertEqual(response.status_code, 200)
+        source = Source.objects.get()
+        self.assertTrue(source.append_only)
+
+        # Omitting the flag keeps the existing value:
+        response = self.client.put(f'/api/source/{source.id}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/source/{source.id}/')
+        self.assertTrue(response.json()['data']['append_only'])
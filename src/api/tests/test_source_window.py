@@ -0,0 +1,33 @@
+from django.test import TestCase
+from api.sources.window import RowWindow, parse_timestamp
+
+class RowWindowTests(TestCase):
+    def test_counts(self):
+        self.assertEqual(RowWindow().bounds(10), (0, 10))
+        self.assertEqual(RowWindow(tail=3).bounds(10), (7, 10))
+        self.assertEqual(RowWindow(tail=30).bounds(10), (0, 10))
+        self.assertEqual(RowWindow(offset=2, limit=5).bounds(10), (2, 7))
+        self.assertEqual(RowWindow(offset=20).bounds(10), (10, 10))
+
+    def test_time_range(self):
+        timestamps = ['Time'] + [f'2024-01-01T{hour:02}:00:00' for hour in range(24)]
+        window = RowWindow(start_time=parse_timestamp('2024-01-01T05:30:00'), end_time=parse_timestamp('2024-01-01T08:00:00+00:00'))
+        self.assertEqual(window.bounds(24, timestamps, start=1), (6, 9))
+
+        # The time range is applied before the tail:
+        window.tail = 2
+        self.assertEqual(window.bounds(24, timestamps, start=1), (7, 9))
+
+    def test_time_range_not_sorted_by_text(self):
+        # Cells that are not timestamps are ordered first, and timestamps are
+        # compared by time rather than by their text:
+        timestamps = ['', '2024-01-01T00:00:00Z', '2024-01-01T03:00:00+02:00', '2024-01-01T02:00:00Z', '2024-01-01T04:00:00Z']
+        window = RowWindow(start_time=parse_timestamp('2024-01-01T01:00:00Z'), end_time=parse_timestamp('2024-01-01T02:00:00Z'))
+        self.assertEqual(window.bounds(5, timestamps), (2, 4))
+
+    def test_parse_timestamp(self):
+        utc = parse_timestamp('2024-01-01T05:00:00Z')
+        self.assertEqual(utc, parse_timestamp('2024-01-01T05:00:00'))
+        self.assertEqual(utc, parse_timestamp('2024-01-01T07:00:00+02:00'))
+        with self.assertRaises(ValueError):
+            parse_timestamp('yesterday')
@@ -7,7 +7,7 @@ from api.views import (
     error_response,
     read_source_at,
 )
-from io import StringIO
+from api.sources import SourceSnapshot
 
 class UtilityFunctionTests(TestCase):
     def test_clean_csv_value(self):
@@ -58,22 +58,23 @@ class UtilityFunctionTests(TestCase):
             }
         )
             
-    @patch("api.views.utility.requests.get")
+    @patch("api.sources.client.SourceClient.get")
     def test_read_source_at_http(self, mock_get):
         # Mock response from `requests.get`:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.headers = {'Content-Type': 'text/csv'}
-        mock_response.text = "col1,col2\nval1,val2"
+        mock_response.encoding = 'utf-8'
+        mock_response.iter_content.return_value = [b"col1,col2\nval1,val2"]
         mock_get.return_value = mock_response
 
         # Call the function:
-        success, csv_file = read_source_at("http://example.com/source.csv")
+        success, snapshot = read_source_at("http://example.com/source.csv")
 
         # Assertions:
         self.assertTrue(success)
-        self.assertIsInstance(csv_file, StringIO)
-        self.assertEqual(csv_file.read(), "col1,col2\nval1,val2")
+        self.assertIsInstance(snapshot, SourceSnapshot)
+        self.assertEqual(snapshot.rows, [["col1", "col2"], ["val1", "val2"]])
 
     def test_read_source_at_invalid_url(self):
         success, response = read_source_at("invalid-url")
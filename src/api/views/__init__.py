@@ -1,2 +1,3 @@
 from .graph import *
-from .source import *
\ No newline at end of file
+from .source import *
+from .stream import *
\ No newline at end of file
@@ -3,14 +3,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.db.models import Prefetch
 
 from api.models import Source, Graph, GraphDataset
+from api.sources import ColumnProjection, SourceFetchError, fetch_sources
+from api.sources.delta import appended_since, data_version
+from api.sources.downsample import DOWNSAMPLE_METHODS, MIN_POINTS, downsample_indices
 from api.views.response import *
-from api.views.utility import decode_json_body, read_source_at
+from api.views.utility import decode_json_body, read_row_window, read_sources_at
 
-import csv
 from json import JSONDecodeError
 
+def _is_valid_max_points(max_points):
+    """
+    Checks that a `max_points` value is an integer that a series can be
+    downsampled to.
+    """
+
+    return isinstance(max_points, int) and not isinstance(max_points, bool) and max_points >= MIN_POINTS
+
 class GraphListView(APIView):
     """
     RESTful API endpoint for interacting with many graphs.
@@ -42,10 +53,15 @@ class GraphListView(APIView):
                 'id': graph.id,
                 'name': graph.name,
                 'description': graph.description,
+                'max_points': graph.max_points,
             })
         
-        # Return the graph JSON data:
-        return success_response(graph_json, 200)
+        # Return the graph JSON data, unless the client already has it:
+        etag = make_etag('graphs', graph_json)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return success_response(graph_json, 200, etag=etag)
     
     def post(self, request):
         """
@@ -73,10 +89,13 @@ class GraphListView(APIView):
             return error_response_expected_field('description')
         elif not isinstance(description, str):
             return error_response_invalid_field('description')
+        max_points = json_request.get('max_points')
+        if max_points is not None and not _is_valid_max_points(max_points):
+            return error_response_invalid_field('max_points')
         
         # Create the graph:
         try:
-            graph_instance = Graph(name=name.strip(), description=description.strip())
+            graph_instance = Graph(name=name.strip(), description=description.strip(), max_points=max_points)
             graph_instance.save()
         except ValidationError:
             return error_response('Failed to validate graph data.', 400)
@@ -109,7 +128,7 @@ class GraphDetailView(APIView):
             return error_response_graph_not_found(graph_id)
         
         # Return the graph:
-        return success_response({ 'name': graph.name, 'description': graph.description }, 200)
+        return success_response({ 'name': graph.name, 'description': graph.description, 'max_points': graph.max_points }, 200)
     
     def delete(self, request, graph_id):
         """
@@ -156,6 +175,9 @@ class GraphDetailView(APIView):
             return error_response_expected_field('description')
         elif not isinstance(description, str):
             return error_response_invalid_field('description')
+        max_points = json_request.get('max_points')
+        if max_points is not None and not _is_valid_max_points(max_points):
+            return error_response_invalid_field('max_points')
         
         # Get the requested graph:
         try:
@@ -166,6 +188,8 @@ class GraphDetailView(APIView):
         # Edit the graph:
         graph.name = name.strip()
         graph.description = description.strip()
+        if 'max_points' in json_request.as_dict():
+            graph.max_points = max_points
         graph.save()
         return success_response(None, 200, message=f'Updated graph `{graph_id}`.')
 
@@ -204,8 +228,13 @@ class GraphDatasetListView(APIView):
                 'column_id': dataset.column
             })
         
-        # Construct and return the response data:
-        return success_response(datasets_json, 200)
+        # Construct and return the response data, unless the client already
+        # has it:
+        etag = make_etag('graph datasets', graph_id, datasets_json)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return success_response(datasets_json, 200, etag=etag)
     
     def post(self, request, graph_id):
         """
@@ -375,12 +404,331 @@ class GraphDatasetDetailView(APIView):
         dataset.save()
         return success_response(f'Updated dataset `{dataset_id}`.', 200)
 
+def read_graph_query(request):
+    """
+    Reads how the ChartJs data of graphs should be built from the query
+    parameters of a request: `max_points`, `downsample`, and the window of rows
+    to return.
+
+    Returns:
+    This function returns a tuple of two values:
+    1. Success state: If this is false, the 2nd tuple value will be a JSON error
+       response that should be returned immediately.
+    2. Response: This will be either a JSON error response (if the first tuple
+       value is false), or a tuple of the most points to return for each
+       dataset (`None` to use the default of each graph), the downsampling
+       method and the `RowWindow`.
+    """
+
+    # The `max_points` query parameter overrides the default of the graph:
+    max_points = None
+    if 'max_points' in request.query_params:
+        try:
+            max_points = int(request.query_params['max_points'])
+        except ValueError:
+            return False, error_response_invalid_field('max_points')
+        if max_points < MIN_POINTS:
+            return False, error_response_invalid_field('max_points')
+    method = request.query_params.get('downsample', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        return False, error_response_invalid_field('downsample')
+
+    # Get the window of rows to return:
+    window_result = read_row_window(request)
+    if not window_result[0]:
+        return window_result
+    return True, (max_points, method, window_result[1])
+
+def plotted_datasets(datasets):
+    """
+    Gets the datasets of a graph that its ChartJs data is built from: its axis
+    and each dataset that is plotted.
+    """
+
+    return [dataset for dataset in datasets if dataset.is_axis or dataset.plot_type != 'none']
+
+def graph_data_config(graph, plotted, query_params):
+    """
+    Gets everything other than its sources that the ChartJs data of a graph is
+    built from, for `data_version`. It does not depend on `since`, so that the
+    version of the data does not either.
+
+    Arguments:
+    - graph (Graph): The graph.
+    - plotted (list of GraphDataset): See `plotted_datasets`.
+    - query_params (QueryDict): Query parameters of the request.
+
+    Returns:
+    tuple: The configuration.
+    """
+
+    return (
+        graph.id,
+        graph.max_points,
+        [
+            (dataset.id, dataset.label, dataset.plot_type, dataset.is_axis, dataset.column, dataset.source.location, dataset.source.has_header)
+            for dataset in plotted
+        ],
+        sorted((key, values) for key, values in query_params.lists() if key != 'since')
+    )
+
+def graph_data_etag(config, snapshots, since=None):
+    """
+    Builds the ETag of the ChartJs data of a graph, which only depends on how
+    it is built and the sources it is built from, so it is known before the
+    data is built.
+
+    Arguments:
+    - config (tuple): See `graph_data_config`.
+    - snapshots (dict): Maps each location to its `SourceSnapshot`.
+    - since (str, optional): Version that only the rows appended since are
+      returned from.
+
+    Returns:
+    str: The ETag.
+    """
+
+    return make_etag(
+        'graph data',
+        config,
+        sorted((location, snapshot.version) for location, snapshot in snapshots.items()),
+        since
+    )
+
+def build_graph_data(graph, plotted, snapshots, query, config, since=None):
+    """
+    Builds the ChartJs data of a graph from snapshots of its sources.
+
+    Arguments:
+    - graph (Graph): The graph.
+    - plotted (list of GraphDataset): See `plotted_datasets`.
+    - snapshots (dict): Maps the location of each plotted source to its
+      `SourceSnapshot`.
+    - query (tuple): How to build the data, as read by `read_graph_query`.
+    - config (tuple): See `graph_data_config`.
+    - since (str, optional): Version of the data that the client has, so that
+      only the rows appended since are returned if possible.
+
+    Returns:
+    This function returns a tuple of two values:
+    1. Success state: If this is false, the data cannot be built and the 2nd
+       tuple value describes why.
+    2. Result: This will be either a tuple of an error message and the HTTP
+       status to return it with (if the first tuple value is false), or a
+       tuple of the ChartJs data, the fields returned alongside it (`version`
+       and, if only the appended rows were returned, `start`), and the number
+       of points in the data.
+    """
+
+    max_points, method, window = query
+    if max_points is None:
+        max_points = graph.max_points
+
+    # Create ChartJS fields:
+    data_json = {}
+    datasets_json = []
+    options_json = {
+        'scales': {
+            'x': {},
+            'y': {}
+        }
+    }
+    hide_scales = True
+
+    # Plan the columns of each source that are plotted, checking that each
+    # column is in bounds. Each distinct column is extracted once and shared
+    # by every dataset that plots it; other columns are never copied:
+    projection = ColumnProjection()
+    columns = {}
+    row_count = 0
+    axis = None
+    for dataset in plotted:
+        table = snapshots[dataset.source.location].table
+
+        # If the source has a header, we should skip it:
+        start = 1 if dataset.source.has_header else 0
+        if table.row_count <= start:
+            # There is no data to plot, we should skip this dataset:
+            continue
+        
+        # We should check that the columns value is in bounds:
+        # NOTE: The below section has been marked `nosec` because it
+        # flags a false-positive during a security scan and is
+        # identified as a potential SQL injection vector though
+        # string-based query construction. This is likely due to the
+        # variable names chosen. This code has nothing to do with
+        # SQL databases and never interacts with them. It is simply
+        # a bounds check that ensures the `column_index` exists.
+        column_index = dataset.column
+        row_length = table.row_length(start)
+        if not (0 <= column_index < row_length): # nosec
+            return False, ( # nosec
+                f'Column is out of bounds (value: `{column_index}`, min: `0`, max: `{row_length}`). ' # nosec
+                f'Please update the column within the graph dataset to point to an existing column.', # nosec
+                400 # nosec
+            ) # nosec
+
+        columns[dataset.id] = projection.add(dataset.source.location, column_index, start)
+        row_count = max(row_count, table.row_count - start)
+        if dataset.is_axis:
+            axis = (table, column_index, start)
+
+    # Find the rows inside the requested window. The same rows are taken
+    # from every column, so the datasets stay aligned with the labels. A
+    # time range is looked up in the axis, which must be a timestamp column:
+    first, last = 0, None
+    if not window.is_empty:
+        if window.has_time_range and (axis is None or axis[0].column_type(axis[1]) != 'timestamp'):
+            return False, ('The `from` and `to` parameters require a timestamp axis.', 400)
+        timestamps, timestamps_start = (axis[0].columns[axis[1]], axis[2]) if axis is not None else (None, 0)
+        first, last = window.bounds(row_count, timestamps, timestamps_start)
+
+    # If the client asked for the rows appended since the version that it
+    # has, only return the rows from the first row that any source has
+    # appended (or completed) since. Windows and downsampling select rows
+    # from the whole of each series, so all of the data is returned for
+    # them, as it is if a source was rewritten:
+    start = None
+    if since is not None and window.is_empty and (max_points is None or row_count <= max_points):
+        appended = appended_since(since, config, snapshots)
+        if appended is not None:
+            start = max(0, min((
+                appended[dataset.source.location] - (1 if dataset.source.has_header else 0)
+                for dataset in plotted if dataset.id in columns
+            ), default=0))
+            first = start
+
+    # Extract the planned columns. Rows that are too short to have a value
+    # for a column are `None`, and trailing `None` values are removed:
+    projected = projection.extract({ location: snapshots[location].table for location in projection.locations() }, first, last)
+
+    # Downsample the columns if there are more rows than points to return.
+    # The same rows are kept for every column, so the datasets stay aligned
+    # with the labels:
+    length = max((len(values) for values in projected.values()), default=0)
+    if max_points is not None and length > max_points:
+        series_keys = dict.fromkeys(columns[dataset.id] for dataset in plotted if dataset.id in columns and not dataset.is_axis)
+        indices = downsample_indices([projected[key] for key in series_keys], length, max_points, method)
+        projected = {
+            key: [values[index] for index in indices if index < len(values)]
+            for key, values in projected.items()
+        }
+
+    # Populate the data with the datasets:
+    for dataset in plotted:
+        if dataset.id not in columns:
+            # There is no data to plot for the dataset:
+            continue
+        dataset_data = projected[columns[dataset.id]]
+
+        # Determine if the dataset represents an axis or a plot:
+        if dataset.is_axis:
+            # The dataset represents an axis:
+            data_json['labels'] = dataset_data
+            options_json['scales']['x'] = {
+                'title': {
+                    'display': True,
+                    'text': dataset.label
+                }
+            }
+        else:
+            # The dataset needs plotting, get the plot type:
+            plot_type = GraphDataset.PlotType(dataset.plot_type)
+            # Construct the dataset JSON object:
+            datasets_json.append({
+                'type': plot_type.label,
+                'label': dataset.label if dataset.label is not None else f'Dataset {dataset.id}',
+                'data': dataset_data
+            })
+            # Check if the scales should be hidden:
+            if plot_type is GraphDataset.PlotType.LINE or plot_type is GraphDataset.PlotType.BAR or plot_type is GraphDataset.PlotType.SCATTER:
+                hide_scales = False
+
+    if hide_scales:
+        options_json.pop('scales')
+
+    # Assign the datasets:
+    data_json['datasets'] = datasets_json
+
+    # The version is returned so that the client can ask for only the rows
+    # appended since. If only those rows are returned, `start` is the index
+    # of the first of them:
+    meta = { 'version': data_version(config, snapshots) }
+    if start is not None:
+        meta['start'] = start
+    point_count = sum(len(values) for values in projected.values())
+    return True, ({
+        'data': data_json,
+        'options': options_json,
+    }, meta, point_count)
+
+def graph_data_response(request, graph):
+    """
+    Builds the response with the ChartJs data of a graph, following the query
+    parameters of a request. Shared by the data endpoint of a graph and its
+    stream of updates.
+
+    Arguments:
+    - request (Request): The request for the data of the graph.
+    - graph (Graph): The graph.
+
+    Returns:
+    HttpResponse: The response with the data, `304 Not Modified` if the client
+    already has it, or an error response.
+    """
+
+    query_result = read_graph_query(request)
+    if not query_result[0]:
+        return query_result[1]
+    query = query_result[1]
+
+    # Get datasets for the graph:
+    datasets = GraphDataset.objects.filter(graph_id=graph.id).select_related('source')
+
+    # Read every source that is required to plot the graph. Each distinct
+    # source is read once and all of them are read concurrently:
+    plotted = plotted_datasets(datasets)
+    csv_read_result = read_sources_at(
+        (dataset.source.location for dataset in plotted),
+        append_only={ dataset.source.location for dataset in plotted if dataset.source.append_only }
+    )
+    if not csv_read_result[0]:
+        # The read failed, this is an error response; we should return the
+        # error response:
+        return csv_read_result[1]
+    snapshots = csv_read_result[1]
+    age = max((snapshot.age for snapshot in snapshots.values()), default=None)
+
+    # There is nothing to build if the client already has the data:
+    since = request.query_params.get('since')
+    config = graph_data_config(graph, plotted, request.query_params)
+    etag = graph_data_etag(config, snapshots, since)
+    not_modified = not_modified_response(request, etag, age=age)
+    if not_modified is not None:
+        return not_modified
+
+    build_result = build_graph_data(graph, plotted, snapshots, query, config, since)
+    if not build_result[0]:
+        return error_response(*build_result[1])
+    data, meta, point_count = build_result[1]
+
+    # Return the ChartJS data. The age of the graph is the age of the oldest
+    # source that it was built from. Graphs with many points are streamed,
+    # so the encoded data is never held in memory as a whole:
+    respond = streaming_success_response if is_streamed(point_count) else success_response
+    return respond(data, 200, age=age, meta=meta, etag=etag)
+
 class GraphDataView(APIView):
     """
     RESTful API endpoint for fetching graph data for ChartJs.
     """
     
     permission_classes = [IsAuthenticated]
+
+    # Data responses are large, so they are compressed at a lower level to
+    # keep the time spent compressing down:
+    gzip_level = 4
+    brotli_quality = 4
     
     def get(self, request, graph_id):
         """
@@ -397,113 +745,123 @@ class GraphDataView(APIView):
         except ObjectDoesNotExist:
             return error_response_graph_not_found(graph_id)
 
-        # Get datasets for the graph:
-        datasets = GraphDataset.objects.filter(graph_id=graph_id)
+        return graph_data_response(request, graph)
 
-        # Create ChartJS fields:
-        data_json = {}
-        datasets_json = []
-        options_json = {
-            'scales': {
-                'x': {},
-                'y': {}
-            }
-        }
-        csv_files = {}
-        hide_scales = True
-
-        # Populate the data with the datasets:
-        if len(datasets) > 0:
-            for dataset in datasets:
-                if not dataset.is_axis and dataset.plot_type == 'none':
-                    # The dataset should not be plotted.
-                    pass
-                else:
-                    # The dataset should be plotted, we should read the dataset
-                    # CSV values:
-                    csv_file = csv_files.get(dataset.source.location)
-                    if csv_file is None:
-                        csv_read_result = read_source_at(dataset.source.location)
-                        if not csv_read_result[0]:
-                            # The read failed, this is an error response; we should
-                            # return the error response:
-                            return csv_read_result[1]
-                        csv_file = csv_read_result[1]
-                        csv_files[dataset.source.location] = csv_file
-                    else:
-                        csv_file.seek(0)
-                    csv_reader = csv.reader(csv_file)
-
-                    # If the source has a header, we should skip it:
-                    if dataset.source.has_header:
-                        next(csv_reader, None)
-                    # We should get the current row:
-                    current_row = next(csv_reader, None)
-                    if current_row is None:
-                        # There is no data to plot, we should skip this iteration:
-                        continue
-                    
-                    # We should check that the columns value is in bounds:
-                    # NOTE: The below section has been marked `nosec` because it
-                    # flags a false-positive during a security scan and is
-                    # identified as a potential SQL injection vector though
-                    # string-based query construction. This is likely due to the
-                    # variable names chosen. This code has nothing to do with
-                    # SQL databases and never interacts with them. It is simply
-                    # a bounds check that ensures the `column_index` exists.
-                    column_index = dataset.column
-                    if not (0 <= column_index < len(current_row)): # nosec
-                        return error_response( # nosec
-                            f'Column is out of bounds (value: `{column_index}`, min: `0`, max: `{len(current_row)}`). ' # nosec
-                            f'Please update the column within the graph dataset to point to an existing column.', # nosec
-                            400 # nosec
-                        ) # nosec
-                    
-                    # We should read the dataset data:
-                    dataset_data = []
-                    while current_row is not None:
-                        if column_index < len(current_row):
-                            dataset_data.append(current_row[column_index])
-                        else:
-                            dataset_data.append(None)
-                        current_row = next(csv_reader, None)
-                    
-                    # Remove trailing None values from the end of the dataset
-                    # data:
-                    while dataset_data and dataset_data[-1] is None:
-                        dataset_data.pop()
-
-                    # Determine if the dataset represents an axis or a plot:
-                    if dataset.is_axis:
-                        # The dataset represents an axis:
-                        data_json['labels'] = dataset_data
-                        options_json['scales']['x'] = {
-                            'title': {
-                                'display': True,
-                                'text': dataset.label
-                            }
-                        }
-                    else:
-                        # The dataset needs plotting, get the plot type:
-                        plot_type = GraphDataset.PlotType(dataset.plot_type)
-                        # Construct the dataset JSON object:
-                        datasets_json.append({
-                            'type': plot_type.label,
-                            'label': dataset.label if dataset.label is not None else f'Dataset {dataset.id}',
-                            'data': dataset_data
-                        })
-                        # Check if the scales should be hidden:
-                        if plot_type is GraphDataset.PlotType.LINE or plot_type is GraphDataset.PlotType.BAR or plot_type is GraphDataset.PlotType.SCATTER:
-                            hide_scales = False
-
-        if hide_scales:
-            options_json.pop('scales')
-
-        # Assign the datasets:
-        data_json['datasets'] = datasets_json
-
-        # Return the ChartJS data:
-        return success_response({
-            'data': data_json,
-            'options': options_json,
-        }, 200)
\ No newline at end of file
+class GraphBatchDataView(APIView):
+    """
+    RESTful API endpoint for fetching the ChartJs data of many graphs at once.
+
+    The main use of this endpoint is to fill a dashboard with a single request.
+    The datasets of every graph are looked up together, and each distinct
+    source is fetched once, no matter how many of the graphs plot it. A graph
+    that cannot be built does not stop the others from being returned.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    # Data responses are large, so they are compressed at a lower level to
+    # keep the time spent compressing down:
+    gzip_level = 4
+    brotli_quality = 4
+
+    def get(self, request):
+        """
+        Fetches the ChartJs data for the graphs in the `ids` query parameter (a
+        comma-separated list of IDs), or for every graph if it is `all` or is
+        not given. The data of each graph is returned under its ID, in the same
+        form as the data endpoint of the graph returns it.
+        """
+
+        # Check permissions:
+        if not request.user.has_perm('api.view_graph'):
+            return error_response_no_perms()
+
+        # Get the IDs of the graphs:
+        ids = request.query_params.get('ids', 'all')
+        graph_ids = None
+        if ids != 'all':
+            try:
+                graph_ids = list(dict.fromkeys(int(graph_id) for graph_id in ids.split(',')))
+            except ValueError:
+                return error_response_invalid_field('ids')
+
+        query_result = read_graph_query(request)
+        if not query_result[0]:
+            return query_result[1]
+        query = query_result[1]
+
+        # The data of each graph is built as the data endpoint of the graph
+        # would build it, so versions can be used with either endpoint:
+        query_params = request.query_params.copy()
+        query_params.pop('ids', None)
+        query_params.pop('since', None)
+
+        # Get the graphs, with the datasets of all of them in one query:
+        graphs = Graph.objects.prefetch_related(
+            Prefetch('graphdataset_set', queryset=GraphDataset.objects.select_related('source'))
+        )
+        if graph_ids is not None:
+            graphs = graphs.filter(id__in=graph_ids)
+        graphs = { graph.id: graph for graph in graphs }
+        if graph_ids is None:
+            graph_ids = sorted(graphs)
+        plotted = { graph.id: plotted_datasets(graph.graphdataset_set.all()) for graph in graphs.values() }
+
+        # Fetch every source of every graph concurrently. Each distinct source
+        # is fetched once:
+        results = fetch_sources(
+            (dataset.source.location for datasets in plotted.values() for dataset in datasets),
+            append_only={ dataset.source.location for datasets in plotted.values() for dataset in datasets if dataset.source.append_only }
+        )
+
+        # Find what each graph is built from, so that there is nothing to build
+        # if the client already has the data of every graph:
+        builds = {}
+        for graph_id in graph_ids:
+            if graph_id not in graphs:
+                builds[graph_id] = f'Graph `{graph_id}` does not exist.'
+                continue
+            locations = dict.fromkeys(dataset.source.location for dataset in plotted[graph_id])
+            errors = [results[location] for location in locations if isinstance(results[location], SourceFetchError)]
+            if errors:
+                builds[graph_id] = errors[0].message
+                continue
+            snapshots = { location: results[location] for location in locations }
+            config = graph_data_config(graphs[graph_id], plotted[graph_id], query_params)
+            builds[graph_id] = (config, snapshots)
+
+        age = max((result.age for result in results.values() if not isinstance(result, SourceFetchError)), default=None)
+        etag = make_etag('graph batch data', [
+            (graph_id, build if isinstance(build, str) else graph_data_etag(*build))
+            for graph_id, build in builds.items()
+        ])
+        not_modified = not_modified_response(request, etag, age=age)
+        if not_modified is not None:
+            return not_modified
+
+        # Build the data of each graph. An error only fails the graph that it
+        # belongs to:
+        data = {}
+        point_count = 0
+        for graph_id, build in builds.items():
+            if isinstance(build, str):
+                data[str(graph_id)] = { 'result': 'error', 'message': build }
+                continue
+            config, snapshots = build
+            build_result = build_graph_data(graphs[graph_id], plotted[graph_id], snapshots, query, config)
+            if not build_result[0]:
+                data[str(graph_id)] = { 'result': 'error', 'message': build_result[1][0] }
+                continue
+            graph_data, meta, graph_point_count = build_result[1]
+
+            # The age is rounded as the data endpoint of the graph rounds it:
+            graph_age = max((snapshot.age for snapshot in snapshots.values()), default=None)
+            data[str(graph_id)] = { 'result': 'success' }
+            if graph_age is not None:
+                data[str(graph_id)]['age'] = int(graph_age)
+            data[str(graph_id)].update(meta)
+            data[str(graph_id)]['data'] = graph_data
+            point_count += graph_point_count
+
+        respond = streaming_success_response if is_streamed(point_count) else success_response
+        return respond(data, 200, age=age, etag=etag)
@@ -1,20 +1,229 @@
-from django.http import JsonResponse
+import hashlib
+from collections.abc import Iterator
+from itertools import islice
 
-def success_response(data, status, message=None):
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+
+from api.views.encoders import get_json_encoder
+
+# Number of values of an array that are encoded at a time by a streaming
+# response:
+_STREAM_BATCH_SIZE = 4096
+
+# Types of the values that are encoded as JSON scalars:
+_JSON_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+# Number of bytes that a streaming response buffers before it is sent:
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+def json_response(data, status):
     """
-    Constructs a successful JSON response body.
+    Constructs a JSON response, encoding the body with the encoder selected by
+    the `API_JSON_ENCODER` setting.
 
     Arguments:
-    - data (context dependant): Payload for the response data.
+    - data (context dependant): Body of the response.
     - status (int): HTTP response code.
-    - message (str, optional): Optional success message.
+    """
+    return HttpResponse(get_json_encoder().encode(data), status=status, content_type='application/json')
+
+def success_body(data, message=None, age=None, meta=None):
+    """
+    Constructs the body of a successful JSON response, before it is encoded.
+    See `success_response` for the arguments.
     """
     response_data = { 'result': 'success' }
     if message != None:
         response_data['message'] = message
+    if age != None:
+        response_data['age'] = int(age)
+    if meta != None:
+        response_data.update(meta)
     if data != None:
         response_data['data'] = data
-    return JsonResponse(response_data, status=status)
+    return response_data
+
+def success_response(data, status, message=None, age=None, meta=None, etag=None):
+    """
+    Constructs a successful JSON response body.
+
+    Arguments:
+    - data (context dependant): Payload for the response data.
+    - status (int): HTTP response code.
+    - message (str, optional): Optional success message.
+    - age (float, optional): Age of the data in seconds. If provided, this is
+      returned in both the `age` field and the `Age` header.
+    - meta (dict, optional): Additional fields that describe the data, such as
+      totals for paged data. These are returned alongside the `data` field.
+    - etag (str, optional): `ETag` of the response, from `make_etag`. If
+      provided, the `ETag` and `Cache-Control` headers are set.
+    """
+    response_data = success_body(data, message=message, age=age, meta=meta)
+    response = json_response(response_data, status)
+    if age != None:
+        response['Age'] = str(int(age))
+    if etag != None:
+        _set_cache_headers(response, etag)
+    return response
+
+def make_etag(*parts):
+    """
+    Constructs a strong `ETag` from everything that the body of a response is
+    built from, such as the query parameters, the models that are read and the
+    `version` of each source snapshot. This lets a view decide whether the
+    client already has the body before the body is built.
+
+    The name of the JSON encoder is included too, since each encoder encodes
+    the same data to different bytes.
+
+    Arguments:
+    - parts (list): Values that the body is built from. Each is hashed by its
+      `repr`, so they should be built-in types.
+
+    Returns:
+    str: The quoted `ETag`.
+    """
+    digest = hashlib.blake2b(repr((get_json_encoder().name,) + parts).encode('utf-8'), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+def not_modified_response(request, etag, age=None):
+    """
+    Constructs a `304 Not Modified` response without a body if the
+    `If-None-Match` header of the request matches the `ETag` of the response
+    that would be returned, so that the client can re-use the body it already
+    has. ETags are compared weakly, as compressed responses have weak ETags.
+
+    Arguments:
+    - request (Request): The request being responded to.
+    - etag (str): `ETag` of the response, from `make_etag`.
+    - age (float, optional): Age of the data in seconds. If provided, this is
+      returned in the `Age` header.
+
+    Returns:
+    HttpResponseNotModified: The response, or `None` if the client does not
+    have the current body.
+    """
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' not in etags and etag.removeprefix('W/') not in (tag.removeprefix('W/') for tag in etags):
+        return None
+    response = HttpResponseNotModified()
+    if age != None:
+        response['Age'] = str(int(age))
+    _set_cache_headers(response, etag)
+    return response
+
+def _set_cache_headers(response, etag):
+    """
+    Sets the `ETag` and `Cache-Control` headers of a response.
+    """
+    from django.conf import settings
+    response['ETag'] = etag
+    response['Cache-Control'] = settings.API_CACHE_CONTROL
+
+def is_streamed(value_count):
+    """
+    Determines whether a response with the given number of values should be
+    streamed with `streaming_success_response`. Streaming is disabled if
+    `SOURCE_STREAMING_THRESHOLD` is zero.
+
+    Arguments:
+    - value_count (int): Number of values in the data of the response.
+    """
+    from django.conf import settings
+    threshold = settings.SOURCE_STREAMING_THRESHOLD
+    return threshold > 0 and value_count >= threshold
+
+def streaming_success_response(data, status, message=None, age=None, meta=None, etag=None):
+    """
+    Constructs a successful JSON response body that is encoded as it is sent,
+    rather than all at once. The body is the same as the one constructed by
+    `success_response`.
+
+    Lists, tuples and iterators (such as generators) in `data` are encoded as
+    arrays, a batch of values at a time, so a column can be produced by a
+    generator and never held in memory as a whole.
+
+    Arguments:
+    - data (context dependant): Payload for the response data.
+    - status (int): HTTP response code.
+    - message (str, optional): Optional success message.
+    - age (float, optional): Age of the data in seconds. If provided, this is
+      returned in both the `age` field and the `Age` header.
+    - meta (dict, optional): Additional fields that describe the data, such as
+      totals for paged data. These are returned alongside the `data` field.
+    - etag (str, optional): `ETag` of the response, from `make_etag`. If
+      provided, the `ETag` and `Cache-Control` headers are set.
+    """
+    response_data = success_body(data, message=message, age=age, meta=meta)
+    response = StreamingHttpResponse(
+        _buffer_json(_iter_json(response_data, get_json_encoder())),
+        status=status,
+        content_type='application/json'
+    )
+    if age != None:
+        response['Age'] = str(int(age))
+    if etag != None:
+        _set_cache_headers(response, etag)
+    return response
+
+def _is_json_container(value):
+    """
+    Determines whether a value is encoded as a JSON object or array.
+    """
+    return isinstance(value, (dict, list, tuple, Iterator))
+
+def _iter_json(value, encoder):
+    """
+    Encodes a value as JSON, yielding the encoded bytes in parts. Arrays are
+    read `_STREAM_BATCH_SIZE` values at a time, and batches that only contain
+    scalar values are encoded together.
+    """
+    if isinstance(value, dict):
+        yield b'{'
+        separator = b''
+        for key, item in value.items():
+            yield separator + encoder.encode(str(key)) + encoder.key_separator
+            yield from _iter_json(item, encoder)
+            separator = encoder.item_separator
+        yield b'}'
+    elif _is_json_container(value):
+        yield b'['
+        separator = b''
+        items = iter(value)
+        batch = list(islice(items, _STREAM_BATCH_SIZE))
+        while batch:
+            if _JSON_SCALAR_TYPES.issuperset(map(type, batch)):
+                # The batch is only scalars, so it is encoded at once:
+                yield separator + encoder.encode(batch)[1:-1]
+                separator = encoder.item_separator
+            else:
+                for item in batch:
+                    yield separator
+                    yield from _iter_json(item, encoder)
+                    separator = encoder.item_separator
+            batch = list(islice(items, _STREAM_BATCH_SIZE))
+        yield b']'
+    else:
+        yield encoder.encode(value)
+
+def _buffer_json(parts):
+    """
+    Joins the parts of an encoded JSON value into chunks of at least
+    `_STREAM_CHUNK_SIZE` bytes (except the last one), so that each chunk that
+    is sent is a reasonable size.
+    """
+    chunk = []
+    length = 0
+    for part in parts:
+        chunk.append(part)
+        length += len(part)
+        if length >= _STREAM_CHUNK_SIZE:
+            yield b''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield b''.join(chunk)
 
 def error_response(message, status):
     """
@@ -24,7 +233,7 @@ def error_response(message, status):
     - message (str): Error message.
     - status (int): HTTP response code.
     """
-    return JsonResponse({ 'result': 'error', 'message': message }, status=status)
+    return json_response({ 'result': 'error', 'message': message }, status)
 
 def error_response_no_perms():
     """
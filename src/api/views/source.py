@@ -5,10 +5,10 @@ from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 
 from api.models import Source
+from api.sources import breaker_stats, coalesce_stats, source_cache
 from api.views.response import *
-from api.views.utility import clean_csv_value, decode_json_body, read_source_at
+from api.views.utility import clean_csv_column, clean_csv_value, decode_json_body, iter_csv_column, read_row_window, read_source_at
 
-import csv
 from json import JSONDecodeError
 
 class SourceListView(APIView):
@@ -43,12 +43,19 @@ class SourceListView(APIView):
                 'id': source.id,
                 'name': source.name,
                 'location': source.location,
-                'has_header': source.has_header
+                'has_header': source.has_header,
+                'refresh_interval': source.refresh_interval,
+                'append_only': source.append_only
             }
             sources_json.append(source_data)
 
-        # Construct and return the response data:
-        return success_response(sources_json, 200)
+        # Construct and return the response data, unless the client already
+        # has it:
+        etag = make_etag('sources', sources_json)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return success_response(sources_json, 200, etag=etag)
     
     def post(self, request):
         """
@@ -80,10 +87,16 @@ class SourceListView(APIView):
             return error_response_expected_field('has_header')
         elif not isinstance(has_header, bool):
             return error_response_invalid_field('has_header')
+        refresh_interval = json_request.get('refresh_interval')
+        if refresh_interval is not None and (isinstance(refresh_interval, bool) or not isinstance(refresh_interval, int) or refresh_interval < 1):
+            return error_response_invalid_field('refresh_interval')
+        append_only = json_request.get('append_only', False)
+        if not isinstance(append_only, bool):
+            return error_response_invalid_field('append_only')
 
         # Create the source:
         try:
-            source_instance = Source(name=name.strip(), location=location.strip(), has_header=has_header)
+            source_instance = Source(name=name.strip(), location=location.strip(), has_header=has_header, refresh_interval=refresh_interval, append_only=append_only)
             source_instance.save()
         except ValidationError:
             return error_response('Failed to validate source data.', 400)
@@ -119,7 +132,13 @@ class SourceDetailView(APIView):
             source = Source.objects.get(id=source_id)
         except ObjectDoesNotExist:
             return error_response_source_not_found(source_id)
-        return success_response({ 'name': source.name, 'location': source.location, 'has_header': source.has_header }, 200)
+        return success_response({
+            'name': source.name,
+            'location': source.location,
+            'has_header': source.has_header,
+            'refresh_interval': source.refresh_interval,
+            'append_only': source.append_only
+        }, 200)
     
     def delete(self, request, source_id):
         """
@@ -184,6 +203,12 @@ class SourceDetailView(APIView):
             return error_response_expected_field('has_header')
         elif not isinstance(has_header, bool):
             return error_response_invalid_field('has_header')
+        refresh_interval = json_request.get('refresh_interval')
+        if refresh_interval is not None and (isinstance(refresh_interval, bool) or not isinstance(refresh_interval, int) or refresh_interval < 1):
+            return error_response_invalid_field('refresh_interval')
+        append_only = json_request.get('append_only', False)
+        if not isinstance(append_only, bool):
+            return error_response_invalid_field('append_only')
 
         # Get the requested source:
         try:
@@ -195,6 +220,10 @@ class SourceDetailView(APIView):
         source.name = name.strip()
         source.location = location.strip()
         source.has_header = has_header
+        if 'refresh_interval' in json_request.as_dict():
+            source.refresh_interval = refresh_interval
+        if 'append_only' in json_request.as_dict():
+            source.append_only = append_only
         source.save()
         return success_response(None, 200, message=f'Updated source `{source_id}`.')
 
@@ -204,6 +233,11 @@ class SourceDataView(APIView):
     """
     
     permission_classes = [IsAuthenticated]
+
+    # Data responses are large, so they are compressed at a lower level to
+    # keep the time spent compressing down:
+    gzip_level = 4
+    brotli_quality = 4
     
     def get(self, request, source_id):
         # Check permissions:
@@ -216,46 +250,115 @@ class SourceDataView(APIView):
         except ObjectDoesNotExist:
             return error_response_source_not_found(source_id)
 
-        csv_read_result = read_source_at(source.location)
+        # Get the window of rows to return:
+        window_result = read_row_window(request)
+        if not window_result[0]:
+            return window_result[1]
+        window = window_result[1]
+        header_only = request.query_params.get('header_only', '0') in ('1', 'true', 'True')
+
+        csv_read_result = read_source_at(source.location, source.append_only)
         if not csv_read_result[0]:
             # The read failed, this is an error response; we should return it:
             return csv_read_result[1]
-        csv_reader = csv.reader(csv_read_result[1])
-
-        # Get the first row of the CSV resource. This may correspond to the
-        # header, or may be the first row of actual data. This is required to
-        # find the number of columns in the CSV file and if this is the header,
-        # it is used to get column names:
-        current_row = next(csv_reader, None)
-
-        # Get the number of columns, this is useful to know. We can also
-        # validate that the CSV file has at least one column and is therefore
-        # valid by checking if there are no columns:
-        column_count = len(current_row)
+        snapshot = csv_read_result[1]
+        table = snapshot.table
+
+        # The response only depends on the source, the version of its content
+        # and the query, so there is nothing to build if the client already
+        # has it:
+        etag = make_etag('source data', source.id, source.has_header, snapshot.version, sorted(request.query_params.lists()))
+        not_modified = not_modified_response(request, etag, age=snapshot.age)
+        if not_modified is not None:
+            return not_modified
+
+        # Get the number of columns from the first row of the CSV resource.
+        # This may correspond to the header, or may be the first row of actual
+        # data. We can also validate that the CSV file has at least one column
+        # and is therefore valid by checking if there are no columns:
+        column_count = table.row_length(0) if table.row_count > 0 else 0
         if column_count == 0:
             return error_response('CSV source has zero columns.', 406)
 
-        # Construct `columns` with pre-populated headers:
+        # Get the columns to return. Columns that are not selected are never
+        # read:
+        selected = range(column_count)
+        if 'columns' in request.query_params:
+            try:
+                selected = [int(index) for index in request.query_params['columns'].split(',')]
+            except ValueError:
+                return error_response_invalid_field('columns')
+            if not all(0 <= index < column_count for index in selected):
+                return error_response_invalid_field('columns')
+
+        # If there is a header, the data starts from the second row:
+        start = 1 if source.has_header else 0
+
+        # Find the rows inside the requested window. A time range is looked up
+        # in the first timestamp column:
+        total_rows = max(table.row_count - start, 0)
+        first, last = 0, total_rows
+        if not window.is_empty:
+            timestamps = None
+            if window.has_time_range:
+                timestamp_columns = [index for index in range(column_count) if table.column_type(index) == 'timestamp']
+                if not timestamp_columns:
+                    return error_response('The `from` and `to` parameters require a timestamp column.', 400)
+                timestamps = table.columns[timestamp_columns[0]]
+            first, last = window.bounds(total_rows, timestamps, start)
+        if header_only:
+            last = first
+
+        # Construct `columns` from the selected columns of the parsed source.
+        # Values that are missing because their row is too short are skipped,
+        # and the values of numeric columns are numbers. Large responses are
+        # streamed, and each column is read and cleaned as it is sent:
+        streamed = is_streamed(len(selected) * (last - first))
         columns = [
             {
-                'name': clean_csv_value(column) if source.has_header else None,
+                'index': index,
+                'name': clean_csv_value(table.columns[index][0]) if source.has_header else None,
                 'unit': None,
                 'transform': None,
-                'data': []
+                'type': table.column_type(index),
+                'data': iter_csv_column(table.iter_values(index, start + first, start + last)) if streamed
+                    else clean_csv_column(table.values(index, start + first, start + last))
             }
-            for column in (current_row if source.has_header else range(column_count))
+            for index in selected
         ]
         
-        # Collect the CSV rows:
-        if source.has_header:
-            # We should make sure we move to the next row if there is a header
-            # so that we are pointing at the first row of data:
-            current_row = next(csv_reader, None)
-        
-        while current_row is not None:
-            for index, entry in enumerate(current_row):
-                columns[index]['data'].append(clean_csv_value(entry))
-            current_row = next(csv_reader, None)
-        
-        # Return the CSV data as JSON:
-        return success_response(columns, 200)
\ No newline at end of file
+        # Return the CSV data as JSON, along with the totals that clients need
+        # to page through the source:
+        respond = streaming_success_response if streamed else success_response
+        return respond(columns, 200, age=snapshot.age, etag=etag, meta={
+            'total_rows': total_rows,
+            'total_columns': column_count,
+            'offset': first,
+        })
+
+class SourceMetricsView(APIView):
+    """
+    This API end-point reports the health of the source fetch pipeline for the
+    process that handles the request.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Gets the state of every source circuit breaker, the fetch coalescing
+        counters and the source cache counters.
+
+        The user must have permission to view sources to interact with this API
+        endpoint.
+        """
+
+        # Check permissions:
+        if not request.user.has_perm('api.view_source'):
+            return error_response_no_perms()
+
+        return success_response({
+            'breakers': breaker_stats(),
+            'coalesce': coalesce_stats(),
+            'cache': source_cache.stats(),
+        }, 200)
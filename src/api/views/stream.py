@@ -0,0 +1,632 @@
+import asyncio
+import collections
+import functools
+import json
+import logging
+import threading
+import time
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from api.models import Graph, GraphDataset
+from api.sources import SourceFetchError, fetch_sources
+from api.views.encoders import get_json_encoder
+from api.views.graph import build_graph_data, graph_data_config, graph_data_etag, plotted_datasets, read_graph_query
+from api.views.response import *
+
+logger = logging.getLogger(__name__)
+
+def format_event(data=None, event=None, retry=None, comment=None):
+    """
+    Formats a Server-Sent Event.
+
+    Arguments:
+    - data (bytes, optional): Data of the event, which must not contain line
+      breaks. Encoded JSON never does.
+    - event (str, optional): Type of the event. Clients treat events without a
+      type as `message` events.
+    - retry (int, optional): Time in milliseconds that the client should wait
+      before reconnecting if the stream is closed.
+    - comment (str, optional): Comment, which clients ignore. Used to keep the
+      connection open.
+
+    Returns:
+    bytes: The event.
+    """
+
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}'.encode('utf-8'))
+    if retry is not None:
+        lines.append(f'retry: {retry}'.encode('utf-8'))
+    if event is not None:
+        lines.append(f'event: {event}'.encode('utf-8'))
+    if data is not None:
+        lines.append(b'data: ' + data)
+    return b'\n'.join(lines) + b'\n\n'
+
+class PollError(Exception):
+    """
+    Raised when the data that subscribers are sent could not be built.
+
+    Attributes:
+    - status (int): HTTP status code of the failure.
+    """
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+class Subscription:
+    """
+    Subscription of a single client to some channels of a `Broadcaster`.
+
+    Messages are held until the client takes them, either from a thread with
+    `get` or from an event loop with `get_async`. Only the newest message of
+    each channel is held, so a client that falls behind must be able to catch
+    up from the latest message of a channel.
+
+    Attributes:
+    - keys (list): Keys of the channels.
+    """
+
+    def __init__(self, broadcaster, keys):
+        """
+        Arguments:
+        - broadcaster (Broadcaster): Broadcaster of the channels.
+        - keys (list): Keys of the channels.
+        """
+
+        self.keys = keys
+        self._broadcaster = broadcaster
+        self._pending = collections.OrderedDict()
+        self._condition = threading.Condition()
+        # Event loop that `get_async` waits on, and the event that wakes it:
+        self._ready = None
+        self._loop = None
+
+    def put(self, key, message):
+        """
+        Holds a message of a channel for the client, replacing any message of
+        the channel that the client has not taken yet. Called from the thread
+        of the channel.
+        """
+
+        with self._condition:
+            self._pending.pop(key, None)
+            self._pending[key] = message
+            self._condition.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def _take(self):
+        """
+        Takes the oldest message. The condition must be held.
+        """
+
+        return self._pending.popitem(last=False) if self._pending else None
+
+    def get(self, timeout):
+        """
+        Takes the next message, waiting for at most `timeout` seconds.
+
+        Returns:
+        tuple: The key of the channel and the message, or `None` if there was
+        no message in time.
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending, timeout)
+            return self._take()
+
+    async def get_async(self, timeout):
+        """
+        Takes the next message from an event loop. See `get`.
+        """
+
+        if self._loop is None:
+            self._ready = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+
+        deadline = self._loop.time() + timeout
+        while True:
+            self._ready.clear()
+            with self._condition:
+                message = self._take()
+            if message is not None:
+                return message
+            try:
+                await asyncio.wait_for(self._ready.wait(), max(0, deadline - self._loop.time()))
+            except asyncio.TimeoutError:
+                with self._condition:
+                    return self._take()
+
+    def seed(self, key, state):
+        """
+        Sets the state that a channel polls from, if it has not polled yet.
+        This saves the channel from building the data that the client was
+        just sent a second time.
+        """
+
+        self._broadcaster._seed(key, state)
+
+    def close(self):
+        """
+        Ends the subscription. Each channel stops once it has no
+        subscriptions.
+        """
+
+        self._broadcaster._unsubscribe(self)
+
+class _Channel:
+    """
+    Poller shared by every subscription to the same key.
+    """
+
+    def __init__(self, poll):
+        self.poll = poll
+        self.state = None
+        self.subscriptions = []
+        self.stopped = threading.Event()
+
+class Broadcaster:
+    """
+    Fans out updates of some data to every client that is subscribed to it.
+
+    Each channel is identified by a key and has a thread that polls for changes
+    to its data every `interval` seconds, for as long as it has subscriptions.
+    A subscription may be to many channels. The data of a channel is polled
+    once for all of its subscriptions, no matter how many there are, and a
+    message is only sent when the poll finds a change. When a poll fails, the
+    failure is sent to the subscriptions, and the delay before the next poll
+    doubles with each consecutive failure (up to `max_backoff`).
+
+    Attributes:
+    - interval (float): Time in seconds between polls.
+    - max_backoff (float): Maximum time in seconds between polls after a
+      failure.
+    """
+
+    def __init__(self, interval, max_backoff):
+        """
+        Arguments:
+        - interval (float): Time in seconds between polls.
+        - max_backoff (float): Maximum time in seconds between polls after a
+          failure.
+        """
+
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channels):
+        """
+        Subscribes to some channels, starting any that are not running.
+
+        Arguments:
+        - channels (dict): Maps the key (hashable) of each channel to its poll
+          function. The poll function is called with the state of the last
+          poll (`None` at first) and returns a tuple of the new state and a
+          message, or `None` if there is nothing to send. It raises to report
+          a failure. It is only used if the channel is started.
+
+        Returns:
+        Subscription: The subscription, which must be closed once the client
+        has gone.
+        """
+
+        subscription = Subscription(self, list(channels))
+        with self._lock:
+            for key, poll in channels.items():
+                channel = self._channels.get(key)
+                if channel is None:
+                    channel = self._channels[key] = _Channel(poll)
+                    threading.Thread(target=self._run, args=(key, channel), name='broadcast', daemon=True).start()
+                channel.subscriptions.append(subscription)
+        return subscription
+
+    def poll(self, key):
+        """
+        Polls a channel once and sends any message to its subscriptions.
+
+        Arguments:
+        - key (hashable): Key of the channel.
+
+        Returns:
+        bool: Whether the poll succeeded.
+        """
+
+        with self._lock:
+            channel = self._channels.get(key)
+        if channel is None:
+            return True
+
+        try:
+            channel.state, message = channel.poll(channel.state)
+            succeeded = True
+        except Exception as error:
+            if not isinstance(error, PollError):
+                logger.exception('Failed to poll channel `%s`.', key)
+            message = error
+            succeeded = False
+
+        if message is not None:
+            with self._lock:
+                subscriptions = list(channel.subscriptions)
+            for subscription in subscriptions:
+                subscription.put(key, message)
+        return succeeded
+
+    def delay(self, failures):
+        """
+        Gets the time in seconds before the next poll of a channel.
+
+        Arguments:
+        - failures (int): Number of consecutive polls that have failed.
+        """
+
+        if failures == 0:
+            return self.interval
+        return min(self.interval * 2 ** failures, self.max_backoff)
+
+    def _run(self, key, channel):
+        """
+        Polls a channel until it has no subscriptions.
+        """
+
+        failures = 0
+        try:
+            while not channel.stopped.wait(self.delay(failures)):
+                failures = 0 if self.poll(key) else failures + 1
+                # The poll runs outside of a request, so its database
+                # connections are cleaned up as a request's would be:
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+    def _seed(self, key, state):
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is not None and channel.state is None:
+                channel.state = state
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            for key in subscription.keys:
+                channel = self._channels.get(key)
+                if channel is None or subscription not in channel.subscriptions:
+                    continue
+                channel.subscriptions.remove(subscription)
+                if not channel.subscriptions:
+                    del self._channels[key]
+                    channel.stopped.set()
+
+    def channel_count(self):
+        """
+        Gets the number of channels that are running.
+        """
+
+        with self._lock:
+            return len(self._channels)
+
+# Broadcaster of graph updates, created when it is first used:
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster():
+    """
+    Gets the broadcaster of graph updates, following the `GRAPH_STREAM_*`
+    settings.
+    """
+
+    global _broadcaster
+    from django.conf import settings
+
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = Broadcaster(settings.GRAPH_STREAM_INTERVAL, settings.GRAPH_STREAM_MAX_BACKOFF)
+        return _broadcaster
+
+class GraphUpdate:
+    """
+    Update of the ChartJs data of a graph, as sent to its subscribers.
+
+    Attributes:
+    - previous (str): Version of the data that the update applies to, or `None`
+      if it replaces all of the data.
+    - version (str): Version of the data after the update.
+    - body (bytes): Encoded body of the update, which is the body that the data
+      endpoint of the graph returns along with the ID of the `graph`.
+    """
+
+    def __init__(self, previous, version, body):
+        self.previous = previous
+        self.version = version
+        self.body = body
+
+def build_graph_update(graph_id, params, query, since=None, etag=None):
+    """
+    Builds the ChartJs data of a graph in the same way as its data endpoint.
+
+    Arguments:
+    - graph_id (int): ID of the graph.
+    - params (QueryDict): Query parameters of the data, without `since`.
+    - query (tuple): How to build the data, as read from `params` by
+      `read_graph_query`.
+    - since (str, optional): Version of the data that the client has, so that
+      only the rows appended since are built.
+    - etag (str, optional): ETag of the data that the client has.
+
+    Returns:
+    1. GraphUpdate: The update, or `None` if the data matches `etag`.
+    2. str: ETag of the data.
+
+    Throws:
+    - PollError: The graph does not exist, or its data could not be built.
+    """
+
+    try:
+        graph = Graph.objects.get(id=graph_id)
+    except ObjectDoesNotExist:
+        raise PollError(f'Graph `{graph_id}` does not exist.', 404)
+
+    # Read every source that is required to plot the graph:
+    plotted = plotted_datasets(GraphDataset.objects.filter(graph_id=graph.id).select_related('source'))
+    results = fetch_sources(
+        (dataset.source.location for dataset in plotted),
+        append_only={ dataset.source.location for dataset in plotted if dataset.source.append_only }
+    )
+    for result in results.values():
+        if isinstance(result, SourceFetchError):
+            raise PollError(result.message, result.status)
+
+    # There is nothing to build if the client already has the data:
+    config = graph_data_config(graph, plotted, params)
+    data_etag = graph_data_etag(config, results, since)
+    if data_etag == etag:
+        return None, etag
+
+    build_result = build_graph_data(graph, plotted, results, query, config, since)
+    if not build_result[0]:
+        raise PollError(*build_result[1])
+    data, meta, _ = build_result[1]
+
+    # The body is encoded once, and sent as it is to every subscriber:
+    age = max((snapshot.age for snapshot in results.values()), default=None)
+    body = get_json_encoder().encode({ 'graph': graph_id, **success_body(data, age=age, meta=meta) })
+    return GraphUpdate(since if 'start' in meta else None, meta['version'], body), data_etag
+
+def _poll_graph(graph_id, params, query, state):
+    """
+    Polls the data of a graph for a `Broadcaster`. The state is the version and
+    ETag of the last data that was built.
+    """
+
+    version, etag = state if state is not None else (None, None)
+    update, etag = build_graph_update(graph_id, params, query, since=version, etag=etag)
+    if update is None:
+        return (version, etag), None
+    if update.version == version:
+        # Nothing was appended since the last poll, but the ETag of the data
+        # since this version is now known:
+        return (version, etag), None
+    return (update.version, etag), update
+
+class _IgnoreAcceptNegotiation(BaseContentNegotiation):
+    """
+    Content negotiation that always picks the first renderer. Clients of an
+    event stream only accept `text/event-stream`, which no renderer produces;
+    the stream itself is not rendered, and errors are returned as JSON.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+class GraphStreamView(APIView):
+    """
+    Server-Sent Events endpoint that pushes updates of the ChartJs data of many
+    graphs over a single stream, so that a dashboard only needs one connection
+    for all of its graphs.
+
+    The stream starts with all of the data of each graph, as returned by the
+    data endpoint of the graph with the same query parameters, or only the rows
+    appended since the version that the client has. After that, an `update`
+    event is sent only when a source of a graph changes. If rows were only
+    appended, the update holds just those rows and the index that they `start`
+    from; otherwise it holds all of the data. Each event carries the ID of its
+    `graph`. Every client of the same graph and query is served from one poll
+    of its sources.
+
+    A comment is sent as a heartbeat when nothing else has been sent for a
+    while, and a `failure` event is sent when the data of a graph could not be
+    built. The stream is closed after `GRAPH_STREAM_MAX_AGE` seconds, and the
+    client reconnects.
+
+    Under ASGI, the stream is sent from the event loop, so a client does not
+    hold a thread while it waits for an update. Under WSGI, each client holds a
+    thread for as long as its stream is open, which is why streams are only
+    served when `GRAPH_STREAM_ENABLED` is set.
+    """
+
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = _IgnoreAcceptNegotiation
+
+    def get(self, request):
+        """
+        Opens the stream of updates of the graphs in the `ids` query parameter
+        (a comma-separated list of IDs), or of every graph if it is `all` or is
+        not given. The `since` query parameter is a comma-separated list of
+        `<graph ID>:<version>` pairs, for the graphs whose data the client
+        already has.
+        """
+
+        from django.conf import settings
+
+        if not settings.GRAPH_STREAM_ENABLED:
+            return error_response('Graph streams are not enabled.', 404)
+
+        # Check permissions:
+        if not request.user.has_perm('api.view_graph'):
+            return error_response_no_perms()
+
+        # The remaining query parameters are those of the data of each graph:
+        params = request.query_params.copy()
+        ids = params.pop('ids', ['all'])[-1]
+        since = params.pop('since', [''])[-1]
+        query_result = read_graph_query(request)
+        if not query_result[0]:
+            return query_result[1]
+        query = query_result[1]
+
+        # Get the IDs of the graphs, and the versions that the client has:
+        existing = set(Graph.objects.values_list('id', flat=True))
+        if ids == 'all':
+            graph_ids = sorted(existing)
+        else:
+            try:
+                graph_ids = list(dict.fromkeys(int(graph_id) for graph_id in ids.split(',')))
+            except ValueError:
+                return error_response_invalid_field('ids')
+            for graph_id in graph_ids:
+                if graph_id not in existing:
+                    return error_response_graph_not_found(graph_id)
+        try:
+            versions = { int(graph_id): version for graph_id, version in (pair.split(':', 1) for pair in since.split(',') if pair) }
+        except ValueError:
+            return error_response_invalid_field('since')
+
+        # Subscribe before building the data that the client is sent first, so
+        # that no change in between is missed:
+        keys = { graph_id: (graph_id, params.urlencode()) for graph_id in graph_ids }
+        subscription = get_broadcaster().subscribe({
+            keys[graph_id]: functools.partial(_poll_graph, graph_id, params, query)
+            for graph_id in graph_ids
+        })
+        initial = []
+        for graph_id in graph_ids:
+            try:
+                update, etag = build_graph_update(graph_id, params, query, since=versions.get(graph_id))
+            except PollError as error:
+                initial.append((keys[graph_id], error))
+                continue
+            subscription.seed(keys[graph_id], (update.version, etag))
+            initial.append((keys[graph_id], update))
+
+        stream = _GraphStream(subscription, params, query, versions, initial, settings)
+        # Django only sends an iterator of the same kind as the server
+        # without first consuming all of it, so an ASGI server is sent an
+        # asynchronous iterator, and a WSGI server a synchronous one:
+        events = stream.iter_async() if isinstance(request._request, ASGIRequest) else stream.iter()
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop proxies such as nginx from buffering the events:
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class _GraphStream:
+    """
+    Events sent to a single client of `GraphStreamView`.
+    """
+
+    def __init__(self, subscription, params, query, versions, initial, settings):
+        self._subscription = subscription
+        self._params = params
+        self._query = query
+        self._versions = dict(versions)
+        self._initial = initial
+        self._heartbeat = settings.GRAPH_STREAM_HEARTBEAT
+        self._retry = settings.GRAPH_STREAM_RETRY
+        self._deadline = time.monotonic() + settings.GRAPH_STREAM_MAX_AGE
+
+    def _first_events(self):
+        events = [format_event(retry=int(self._retry * 1000))]
+        for key, message in self._initial:
+            if isinstance(message, GraphUpdate):
+                self._versions[key[0]] = message.version
+                events.append(format_event(message.body, event='update'))
+            else:
+                events.append(self._event((key, message)))
+        return events
+
+    def _event(self, item):
+        """
+        Builds the event sent for a message of a channel.
+        """
+
+        if item is None:
+            return format_event(comment='heartbeat')
+        key, message = item
+        graph_id = key[0]
+        if isinstance(message, Exception):
+            error = str(message) if isinstance(message, PollError) else 'Failed to check the graph for updates.'
+            return format_event(json.dumps({ 'result': 'error', 'graph': graph_id, 'message': error }).encode('utf-8'), event='failure')
+        version = self._versions.get(graph_id)
+        if message.version == version:
+            return None
+
+        if message.previous is not None and message.previous != version:
+            # The client has a different version to the one that the update
+            # applies to, because it joined or fell behind while the update
+            # was built, so it is sent the rows that it is missing:
+            try:
+                message = build_graph_update(graph_id, self._params, self._query, since=version)[0]
+            except PollError as error:
+                return self._event((key, error))
+        self._versions[graph_id] = message.version
+        return format_event(message.body, event='update')
+
+    def _event_in_thread(self, item):
+        """
+        Builds the event sent for a message of a channel from a worker thread,
+        closing the database connections that catching up opened in it.
+        """
+
+        try:
+            return self._event(item)
+        finally:
+            connections.close_all()
+
+    def iter(self):
+        """
+        Iterates over the events from a thread.
+        """
+
+        try:
+            yield from self._first_events()
+            while time.monotonic() < self._deadline:
+                event = self._event(self._subscription.get(self._heartbeat))
+                if event is not None:
+                    yield event
+        finally:
+            self._subscription.close()
+
+    async def iter_async(self):
+        """
+        Iterates over the events from an event loop.
+        """
+
+        from asgiref.sync import sync_to_async
+
+        try:
+            for event in self._first_events():
+                yield event
+            while time.monotonic() < self._deadline:
+                item = await self._subscription.get_async(self._heartbeat)
+                # Catching up may query the database, so it runs in a thread.
+                # It does not touch state shared with other requests, so it
+                # does not need to wait for the thread shared by sync code:
+                event = await sync_to_async(self._event_in_thread, thread_sensitive=False)(item)
+                if event is not None:
+                    yield event
+        finally:
+            self._subscription.close()
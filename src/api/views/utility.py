@@ -1,13 +1,9 @@
 import nh3
-import json
-import requests
-from io import StringIO
-from urllib.parse import urlparse
-from urllib.error import URLError
 
-from api.views.response import error_response
-
-ALLOWED_CSV_CHARSET='abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-./\\({)}[]+<>,!?£$%^&* '
+from api.sources import SourceFetchError, fetch_source, fetch_sources
+from api.sources.sanitise import clean_value
+from api.sources.window import RowWindow, parse_timestamp
+from api.views.response import error_response, error_response_invalid_field
 
 class SanitisedJSON:
     def __init__(self, data):
@@ -55,6 +51,9 @@ def clean_csv_value(value):
     Cleans a CSV entry by retaining only allowed characters and trimming any
     leading or trailing whitespace. Additionally, this will clean the text to
     prevent things such as XSS attacks.
+
+    Values that are already clean are returned untouched. See
+    `api.sources.sanitise.clean_value`.
     
     Arguments:
     - value (any): The input value to clean.
@@ -63,48 +62,122 @@ def clean_csv_value(value):
     str: The cleaned value as a string.
     """
     
-    # Validate the value is a valid string:
-    if value is None:
-        return ''
-    value = str(value)
-    
-    # Remove disallowed characters and trim whitespace:
-    return nh3.clean(''.join([char for char in value if char in ALLOWED_CSV_CHARSET]).strip())
+    return clean_value(value)
+
+def clean_csv_column(values):
+    """
+    Cleans the values of a column with `clean_csv_value`. Numbers, and cells of
+    numeric columns that are `None`, are not text and are kept as they are.
+
+    Arguments:
+    - values (list): The values of the column.
+
+    Returns:
+    list: The cleaned values.
+    """
+
+    return list(iter_csv_column(values))
 
-def read_source_at(location):
+def iter_csv_column(values):
     """
-    Reads a CSV source at the given location and returns the raw CSV data.
+    Cleans the values of a column with `clean_csv_value` as they are read, so
+    that the cleaned column is never held in memory as a whole. This is used
+    by streaming responses.
+
+    Arguments:
+    - values (list): The values of the column.
+
+    Returns:
+    generator: The cleaned values.
+    """
+
+    return (clean_value(value) if isinstance(value, str) else value for value in values)
+
+def read_source_at(location, append_only=False):
+    """
+    Reads a CSV source at the given location.
     
-    This function will also clean the CSV resource fetched (if it was found),
-    preventing things such as XSS.
+    The CSV resource fetched (if it was found) is cleaned, preventing things
+    such as XSS. Sources that have not changed since they were last fetched are
+    served from the source cache.
 
     Returns:
     This function returns a tuple of two values:
     1. Success state: If this is false, the 2nd tuple value will be a JSON error
        response that should be returned immediately.
     2. Response: This will be either a JSON error response (if the first tuple
-       value is false), or the CSV file.
+       value is false), or the source snapshot. The rows of the CSV file are
+       `snapshot.rows` and `snapshot.age` describes how old the data is.
     """
-    # Parse the URL for the source:
-    try:
-        url = urlparse(location)
-    except URLError:
-        return False, error_response(f'Cannot parse location: `{location}`.', 400)
-    
-    if url.scheme not in ('http', 'https'):
-        return False, error_response(f'Cannot open location because `{url.scheme}` is not a supported URL scheme.', 400)
-    
-    # Read the CSV data from the source:
     try:
-        response = requests.get(location, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
-        if 'text/csv' not in response.headers.get('Content-Type', ''):
-            return False, error_response('The provided URL does not return a valid CSV file.', 400)
-        csv_content = response.text
-    except requests.exceptions.RequestException as exception:
-        return False, error_response(f'Failed to read CSV data from location `{location}`: {exception}.', 400)
-
-    # Convert the CSV content into a CSV file:
-    csv_file = StringIO(nh3.clean(csv_content))
-
-    return True, csv_file
\ No newline at end of file
+        snapshot = fetch_source(location, append_only)
+    except SourceFetchError as error:
+        return False, error_response(error.message, error.status)
+
+    return True, snapshot
+
+def read_sources_at(locations, append_only=()):
+    """
+    Reads many CSV sources concurrently. Each distinct location is only read
+    once. Locations in `append_only` are only ever appended to.
+
+    Returns:
+    This function returns a tuple of two values:
+    1. Success state: If this is false, the 2nd tuple value will be a JSON error
+       response for the first location (in the order given) that could not be
+       read.
+    2. Response: This will be either a JSON error response (if the first tuple
+       value is false), or a dictionary that maps each location to its source
+       snapshot.
+    """
+    snapshots = {}
+    for location, result in fetch_sources(locations, append_only).items():
+        if isinstance(result, SourceFetchError):
+            return False, error_response(result.message, result.status)
+        snapshots[location] = result
+
+    return True, snapshots
+
+def read_row_window(request):
+    """
+    Reads the window of rows that a request asks for from its query
+    parameters: `tail`, `offset` and `limit`, and `from` and `to` for a
+    timestamp column. `tail` cannot be combined with `offset` or `limit`.
+
+    Returns:
+    This function returns a tuple of two values:
+    1. Success state: If this is false, the 2nd tuple value will be a JSON error
+       response that should be returned immediately.
+    2. Response: This will be either a JSON error response (if the first tuple
+       value is false), or the `RowWindow`.
+    """
+    params = request.query_params
+    counts = {}
+    for name in ('tail', 'offset', 'limit'):
+        if name not in params:
+            continue
+        try:
+            counts[name] = int(params[name])
+        except ValueError:
+            return False, error_response_invalid_field(name)
+        if counts[name] < 0:
+            return False, error_response_invalid_field(name)
+    if 'tail' in counts and ('offset' in counts or 'limit' in counts):
+        return False, error_response('The `tail` parameter cannot be combined with `offset` or `limit`.', 400)
+
+    times = {}
+    for name in ('from', 'to'):
+        if name not in params:
+            continue
+        try:
+            times[name] = parse_timestamp(params[name])
+        except ValueError:
+            return False, error_response_invalid_field(name)
+
+    return True, RowWindow(
+        tail=counts.get('tail'),
+        offset=counts.get('offset', 0),
+        limit=counts.get('limit'),
+        start_time=times.get('from'),
+        end_time=times.get('to')
+    )
@@ -3,6 +3,10 @@ ASGI config for CSV Mapper project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project with an ASGI server lets the Server-Sent Events streams of
+graph updates (``/api/graph/stream/``) wait for updates on the event loop,
+rather than each holding a thread as they do under WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -78,6 +78,7 @@ from .logging import *
 from .login import *
 from .passwords import *
 from .security import *
+from .sources import *
 
 # Get the deployment environment specific setting overrides:
 environment = os.getenv('DJANGO_ENVIRONMENT', 'DEVELOPMENT')
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ApiCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -129,4 +130,91 @@ REST_FRAMEWORK = {
         'anon': '100/min', # 100 requests per minute for anonymous users
         'user': '500/min', # 500 requests per minute for authenticated users
     },
-}
\ No newline at end of file
+}
+
+
+
+################################################################################
+# API JSON ENCODER                                                             #
+################################################################################
+# The encoder that API response bodies are encoded with:                       #
+#                                                                              #
+# - `auto`: `orjson` if it is installed, otherwise `json`.                     #
+# - `orjson`: The `orjson` library, which is much faster on large arrays. The  #
+#   `json` encoder is used instead if it is not installed.                     #
+# - `json`: The standard library encoder, as used by `JsonResponse`.           #
+################################################################################
+
+import os
+
+API_JSON_ENCODER = os.getenv('API_JSON_ENCODER', 'auto')
+
+
+
+################################################################################
+# API RESPONSE CACHING                                                         #
+################################################################################
+# The list and data endpoints of the API return an `ETag` with each response,  #
+# and a `304 Not Modified` response when the client already has the current    #
+# body. This is the `Cache-Control` header returned alongside the `ETag`. By   #
+# default, clients must revalidate their copy before each use.                 #
+################################################################################
+
+API_CACHE_CONTROL = os.getenv('API_CACHE_CONTROL', 'private, no-cache')
+
+
+
+################################################################################
+# API RESPONSE COMPRESSION                                                     #
+################################################################################
+# Responses of the API are compressed with brotli (if it is installed) or gzip #
+# when the client accepts them.                                                #
+#                                                                              #
+# - `API_COMPRESSION_ENABLED`: Whether responses are compressed.               #
+# - `API_COMPRESSION_MIN_SIZE`: Smallest body in bytes that is compressed.     #
+#   Streaming responses are always compressed.                                 #
+# - `API_GZIP_LEVEL`: gzip compression level, from 1 (fastest) to 9.           #
+# - `API_BROTLI_QUALITY`: Brotli quality, from 0 (fastest) to 11.              #
+#                                                                              #
+# Views can override the levels with `gzip_level` and `brotli_quality` class   #
+# attributes.                                                                  #
+################################################################################
+
+API_COMPRESSION_ENABLED = os.getenv('API_COMPRESSION_ENABLED', 'True') == 'True'
+API_COMPRESSION_MIN_SIZE = int(os.getenv('API_COMPRESSION_MIN_SIZE', '1024'))
+API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', '6'))
+API_BROTLI_QUALITY = int(os.getenv('API_BROTLI_QUALITY', '5'))
+
+
+
+################################################################################
+# API GRAPH STREAMS                                                            #
+################################################################################
+# Clients can subscribe to the updates of graphs with Server-Sent Events at    #
+# `/api/graph/stream/`. One stream carries the updates of every graph that a   #
+# client asks for, and every subscriber of a graph is served by one poll of    #
+# its sources.                                                                 #
+#                                                                              #
+# - `GRAPH_STREAM_ENABLED`: Serve streams, and have the dashboard and graph    #
+#   pages subscribe to them instead of polling. Only enable this when the      #
+#   project is served by an ASGI server (see below).                           #
+# - `GRAPH_STREAM_INTERVAL`: Seconds between polls of the sources of a graph.  #
+# - `GRAPH_STREAM_MAX_BACKOFF`: Most seconds between polls after failures.     #
+# - `GRAPH_STREAM_HEARTBEAT`: Seconds without an event before a heartbeat is   #
+#   sent, which keeps proxies from closing the connection.                     #
+# - `GRAPH_STREAM_MAX_AGE`: Seconds before a stream is closed, after which the #
+#   client reconnects.                                                         #
+# - `GRAPH_STREAM_RETRY`: Seconds that clients wait before reconnecting.       #
+#                                                                              #
+# Under WSGI (such as `manage.py runserver`), each open stream holds a thread  #
+# of the server for up to `GRAPH_STREAM_MAX_AGE` seconds, so every open page   #
+# ties up a worker. Serve the project with an ASGI server                      #
+# (`base.asgi:application`) before enabling streams.                           #
+################################################################################
+
+GRAPH_STREAM_ENABLED = os.getenv('GRAPH_STREAM_ENABLED', 'False') == 'True'
+GRAPH_STREAM_INTERVAL = float(os.getenv('GRAPH_STREAM_INTERVAL', '5'))
+GRAPH_STREAM_MAX_BACKOFF = float(os.getenv('GRAPH_STREAM_MAX_BACKOFF', '300'))
+GRAPH_STREAM_HEARTBEAT = float(os.getenv('GRAPH_STREAM_HEARTBEAT', '15'))
+GRAPH_STREAM_MAX_AGE = float(os.getenv('GRAPH_STREAM_MAX_AGE', '600'))
+GRAPH_STREAM_RETRY = float(os.getenv('GRAPH_STREAM_RETRY', '5'))
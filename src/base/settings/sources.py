@@ -0,0 +1,239 @@
+################################################################################
+# SOURCE HTTP CLIENT                                                           #
+################################################################################
+# CSV sources are fetched through a single process-wide HTTP client. The       #
+# client keeps a pool of connections per upstream host so that repeated polls  #
+# of the same source re-use an existing TCP/TLS connection instead of paying   #
+# for a new handshake on every request.                                        #
+#                                                                              #
+# - `SOURCE_HTTP_TIMEOUT`: Seconds to wait for an upstream source to respond.  #
+# - `SOURCE_HTTP_POOL_CONNECTIONS`: Number of per-host connection pools to     #
+#   cache.                                                                     #
+# - `SOURCE_HTTP_POOL_MAXSIZE`: Maximum number of connections kept alive per   #
+#   host.                                                                      #
+# - `SOURCE_HTTP_POOL_BLOCK`: If `True`, requests wait for a free connection   #
+#   instead of opening a throw-away one once a host's pool is exhausted.       #
+# - `SOURCE_HTTP_KEEP_ALIVE`: If `False`, connections are closed after every   #
+#   request.                                                                   #
+# - `SOURCE_HTTP_MAX_RETRIES`: Number of times a failed connection attempt is  #
+#   retried before giving up.                                                  #
+################################################################################
+
+import os
+
+SOURCE_HTTP_TIMEOUT = float(os.getenv('SOURCE_HTTP_TIMEOUT', '10'))
+SOURCE_HTTP_POOL_CONNECTIONS = int(os.getenv('SOURCE_HTTP_POOL_CONNECTIONS', '16'))
+SOURCE_HTTP_POOL_MAXSIZE = int(os.getenv('SOURCE_HTTP_POOL_MAXSIZE', '16'))
+SOURCE_HTTP_POOL_BLOCK = os.getenv('SOURCE_HTTP_POOL_BLOCK', 'False') == 'True'
+SOURCE_HTTP_KEEP_ALIVE = os.getenv('SOURCE_HTTP_KEEP_ALIVE', 'True') == 'True'
+SOURCE_HTTP_MAX_RETRIES = int(os.getenv('SOURCE_HTTP_MAX_RETRIES', '0'))
+
+
+
+################################################################################
+# SOURCE CACHE                                                                 #
+################################################################################
+# Sources that return an `ETag` or `Last-Modified` validator are cached in     #
+# memory. Subsequent fetches send `If-None-Match` / `If-Modified-Since` and    #
+# re-use the cached, already sanitised copy when the upstream answers with     #
+# `304 Not Modified`.                                                          #
+#                                                                              #
+# - `SOURCE_CACHE_MAX_BYTES`: Memory budget of the cache in bytes, estimated   #
+#   from the parsed tables. The least recently used sources are evicted when   #
+#   the cache is over budget, and larger sources are never cached.             #
+################################################################################
+
+SOURCE_CACHE_ENABLED = os.getenv('SOURCE_CACHE_ENABLED', 'True') == 'True'
+SOURCE_CACHE_MAX_BYTES = int(os.getenv('SOURCE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+
+
+################################################################################
+# PARALLEL SOURCE FETCHING                                                     #
+################################################################################
+# Graphs that are built from several sources fetch every distinct source       #
+# concurrently from a process-wide thread pool.                                #
+#                                                                              #
+# - `SOURCE_FETCH_WORKERS`: Size of the fetch thread pool. This bounds the     #
+#   number of concurrent fetches across the entire process.                    #
+# - `SOURCE_FETCH_MAX_PARALLEL`: Maximum number of concurrent fetches that a   #
+#   single request may use.                                                    #
+################################################################################
+
+SOURCE_FETCH_WORKERS = int(os.getenv('SOURCE_FETCH_WORKERS', '16'))
+SOURCE_FETCH_MAX_PARALLEL = int(os.getenv('SOURCE_FETCH_MAX_PARALLEL', '8'))
+
+
+
+################################################################################
+# SOURCE FETCH COALESCING                                                      #
+################################################################################
+# Concurrent requests for the same source location wait on a single in-flight  #
+# fetch and share its result instead of each fetching the source themselves.   #
+#                                                                              #
+# - `SOURCE_COALESCE_ENABLED`: Coalesce fetches made by threads within the     #
+#   same process.                                                              #
+# - `SOURCE_COALESCE_LOCK_DIR`: Directory shared by every worker process. If   #
+#   set, workers take a lock file per location so that only one worker         #
+#   fetches a source while the others read the result it writes. A worker      #
+#   waits for at most `SOURCE_HTTP_TIMEOUT` seconds per attempt before it      #
+#   fetches the source itself.                                                 #
+################################################################################
+
+SOURCE_COALESCE_ENABLED = os.getenv('SOURCE_COALESCE_ENABLED', 'True') == 'True'
+SOURCE_COALESCE_LOCK_DIR = os.getenv('SOURCE_COALESCE_LOCK_DIR') or None
+
+
+
+################################################################################
+# BACKGROUND SOURCE REFRESH                                                    #
+################################################################################
+# Sources that have a `refresh_interval` can be prefetched in the background   #
+# by running `python manage.py refresh_sources`. Prefetched copies are written #
+# to a directory shared with the web workers, which serve them instead of      #
+# fetching the source on the request path.                                     #
+#                                                                              #
+# - `SOURCE_PREFETCH_DIR`: Directory that prefetched copies are written to.    #
+#   Prefetching is disabled if this is not set.                                #
+# - `SOURCE_PREFETCH_GRACE`: Multiple of a source's refresh interval that its  #
+#   prefetched copy may be served for. This keeps the copy available when a    #
+#   refresh fails.                                                             #
+# - `SOURCE_REFRESH_WORKERS`: Number of sources refreshed at once.             #
+# - `SOURCE_REFRESH_JITTER`: Maximum random jitter added to each delay, as a   #
+#   fraction of the delay.                                                     #
+# - `SOURCE_REFRESH_MAX_BACKOFF`: Maximum delay (in seconds) before retrying a #
+#   source whose refresh failed.                                               #
+# - `SOURCE_REFRESH_RELOAD`: Seconds between reloading the sources from the    #
+#   database.                                                                  #
+################################################################################
+
+SOURCE_PREFETCH_DIR = os.getenv('SOURCE_PREFETCH_DIR') or None
+SOURCE_PREFETCH_GRACE = float(os.getenv('SOURCE_PREFETCH_GRACE', '2'))
+SOURCE_REFRESH_WORKERS = int(os.getenv('SOURCE_REFRESH_WORKERS', '4'))
+SOURCE_REFRESH_JITTER = float(os.getenv('SOURCE_REFRESH_JITTER', '0.1'))
+SOURCE_REFRESH_MAX_BACKOFF = float(os.getenv('SOURCE_REFRESH_MAX_BACKOFF', '3600'))
+SOURCE_REFRESH_RELOAD = float(os.getenv('SOURCE_REFRESH_RELOAD', '60'))
+
+
+
+################################################################################
+# STALE-WHILE-REVALIDATE                                                       #
+################################################################################
+# When enabled, the last good copy of a source is served immediately instead   #
+# of waiting for the upstream. Responses report how old the data is through    #
+# the `Age` header and the `age` response field.                               #
+#                                                                              #
+# - `SOURCE_SWR_ENABLED`: Serve cached copies of sources while they are stale. #
+# - `SOURCE_SWR_FRESH_TTL`: Seconds that a copy is served without contacting   #
+#   the upstream at all.                                                       #
+# - `SOURCE_SWR_MAX_STALE`: Seconds after which a copy is too old to serve.    #
+#   Copies older than `SOURCE_SWR_FRESH_TTL` but younger than this are served  #
+#   while a refresh runs in the background; older copies make the request wait #
+#   for fresh data.                                                            #
+################################################################################
+
+SOURCE_SWR_ENABLED = os.getenv('SOURCE_SWR_ENABLED', 'False') == 'True'
+SOURCE_SWR_FRESH_TTL = float(os.getenv('SOURCE_SWR_FRESH_TTL', '20'))
+SOURCE_SWR_MAX_STALE = float(os.getenv('SOURCE_SWR_MAX_STALE', '300'))
+
+
+
+################################################################################
+# SOURCE CIRCUIT BREAKERS                                                      #
+################################################################################
+# Every source location and every upstream host has a circuit breaker. Once    #
+# an upstream has failed enough times in a row its breaker opens and requests  #
+# for it fail immediately instead of waiting on the upstream. After a timeout  #
+# the breaker lets a single request through to probe whether the upstream has  #
+# recovered. Only connection errors, timeouts and 5xx responses are counted.   #
+#                                                                              #
+# - `SOURCE_BREAKER_ENABLED`: Use circuit breakers and the negative cache.     #
+# - `SOURCE_BREAKER_HOST_THRESHOLD`: Consecutive failures across every         #
+#   location on a host that open the breaker for the host.                     #
+# - `SOURCE_BREAKER_LOCATION_THRESHOLD`: Consecutive failures of a location    #
+#   that open the breaker for the location.                                    #
+# - `SOURCE_BREAKER_RESET_TIMEOUT`: Seconds that a breaker stays open before   #
+#   a probe request is allowed.                                                #
+# - `SOURCE_BREAKER_IDLE_TIMEOUT`: Seconds after which the breaker of a        #
+#   location or host that is closed and not being fetched is discarded.        #
+# - `SOURCE_NEGATIVE_TTL`: Seconds that a failed location is remembered for,   #
+#   during which requests for it fail without contacting the upstream.         #
+# - `SOURCE_STALE_IF_ERROR`: Serve the last good copy of a source instead of   #
+#   an error while its upstream is unavailable. The last good copy of every    #
+#   source is kept in memory when this is enabled.                             #
+################################################################################
+
+SOURCE_BREAKER_ENABLED = os.getenv('SOURCE_BREAKER_ENABLED', 'True') == 'True'
+SOURCE_BREAKER_HOST_THRESHOLD = int(os.getenv('SOURCE_BREAKER_HOST_THRESHOLD', '5'))
+SOURCE_BREAKER_LOCATION_THRESHOLD = int(os.getenv('SOURCE_BREAKER_LOCATION_THRESHOLD', '3'))
+SOURCE_BREAKER_RESET_TIMEOUT = float(os.getenv('SOURCE_BREAKER_RESET_TIMEOUT', '30'))
+SOURCE_BREAKER_IDLE_TIMEOUT = float(os.getenv('SOURCE_BREAKER_IDLE_TIMEOUT', '600'))
+SOURCE_NEGATIVE_TTL = float(os.getenv('SOURCE_NEGATIVE_TTL', '5'))
+SOURCE_STALE_IF_ERROR = os.getenv('SOURCE_STALE_IF_ERROR', 'False') == 'True'
+
+
+
+################################################################################
+# LOCAL FILE SOURCES                                                           #
+################################################################################
+# Sources can be read from the local filesystem with `file://` locations,      #
+# which skips the HTTP client entirely. Files are read and parsed in chunks,   #
+# and are only parsed again when their modification time or size changes.      #
+# Files that are rewritten rather than appended to should be replaced          #
+# atomically (written to a temporary file that is renamed over the source), or #
+# a read may see a partially written file.                                     #
+#                                                                              #
+# - `SOURCE_FILE_ROOT`: Directory that every `file://` source must be inside   #
+#   of. If this is not set, `file://` locations are rejected.                  #
+################################################################################
+
+SOURCE_FILE_ROOT = os.getenv('SOURCE_FILE_ROOT') or None
+
+
+
+################################################################################
+# SOURCE SIZE LIMITS                                                           #
+################################################################################
+# Sources are streamed and parsed as they are downloaded. The download is      #
+# abandoned as soon as a source exceeds either limit.                          #
+#                                                                              #
+# - `SOURCE_MAX_BYTES`: Maximum size of a source in bytes.                     #
+# - `SOURCE_MAX_ROWS`: Maximum number of rows in a source, including the       #
+#   header.                                                                    #
+# - `SOURCE_STREAM_CHUNK_SIZE`: Number of bytes read from the upstream at a    #
+#   time.                                                                      #
+################################################################################
+
+SOURCE_MAX_BYTES = int(os.getenv('SOURCE_MAX_BYTES', str(64 * 1024 * 1024)))
+SOURCE_MAX_ROWS = int(os.getenv('SOURCE_MAX_ROWS', '1000000'))
+SOURCE_STREAM_CHUNK_SIZE = int(os.getenv('SOURCE_STREAM_CHUNK_SIZE', '65536'))
+
+
+
+################################################################################
+# SOURCE COLUMN TYPES                                                          #
+################################################################################
+# The type of each column of a source (`int`, `float`, `timestamp` or          #
+# `string`) is inferred once when the source is parsed. Numeric columns are    #
+# stored as compact arrays and are returned as JSON numbers.                   #
+#                                                                              #
+# - `SOURCE_INFER_TYPES`: Whether column types are inferred. If disabled,      #
+#   every value is returned as a string.                                       #
+# - `SOURCE_NON_NUMERIC`: What a cell of a numeric column that is not a        #
+#   number is returned as: `null`, or `string` to keep its original text.      #
+################################################################################
+
+SOURCE_INFER_TYPES = os.getenv('SOURCE_INFER_TYPES', 'True') == 'True'
+SOURCE_NON_NUMERIC = os.getenv('SOURCE_NON_NUMERIC', 'string')
+
+
+
+################################################################################
+# SOURCE STREAMING RESPONSES                                                   #
+################################################################################
+# Source data and graph data responses with at least this many values are      #
+# encoded as they are sent, rather than being built in memory first. Setting   #
+# this to zero disables streaming.                                             #
+################################################################################
+
+SOURCE_STREAMING_THRESHOLD = int(os.getenv('SOURCE_STREAMING_THRESHOLD', '100000'))
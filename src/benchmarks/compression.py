@@ -0,0 +1,67 @@
+"""
+Compares the bytes sent and the time spent compressing a `GraphDataView`
+payload with gzip and brotli at a range of levels, as
+`api.middleware.ApiCompressionMiddleware` does.
+
+- `size`: Size of the compressed body.
+- `ratio`: Size of the compressed body as a percentage of the original.
+- `time`: Fastest time taken to compress the body.
+
+Usage (from the `src` directory):
+    python -m benchmarks.compression [--points 100000] [--datasets 4] [--repeat 3]
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.json_encoders import make_payload
+
+# Levels of each content coding to measure:
+GZIP_LEVELS = [1, 4, 5, 6, 9]
+BROTLI_QUALITIES = [0, 2, 4, 5, 6, 9, 11]
+
+def timed(compress, body, repeat):
+    """
+    Returns the fastest time taken to compress the body, and the size of the
+    compressed body.
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = compress(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(compressed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100000, help='Number of points of each dataset.')
+    parser.add_argument('--datasets', type=int, default=4, help='Number of datasets.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times each body is compressed.')
+    arguments = parser.parse_args()
+
+    # The middleware is imported for its compressor, which does not need the
+    # application to be set up:
+    from api.middleware import _Compressor, brotli
+
+    body = json.dumps(make_payload(arguments.points, arguments.datasets)).encode('utf-8')
+    print(f'{arguments.points} points x {arguments.datasets} datasets ({len(body) / 2 ** 10:.0f}KB)')
+
+    codings = [('gzip', level) for level in GZIP_LEVELS]
+    if brotli is not None:
+        codings += [('br', level) for level in BROTLI_QUALITIES]
+    else:
+        print('brotli is not installed, only gzip is measured.')
+
+    print(f'{"coding":<10} {"size":>8} {"ratio":>6} {"time":>9}')
+    for encoding, level in codings:
+        def compress(data):
+            compressor = _Compressor(encoding, level)
+            return compressor.compress(data) + compressor.finish()
+        elapsed, size = timed(compress, body, arguments.repeat)
+        print(f'{f"{encoding} {level}":<10} {size / 2 ** 10:6.0f}KB {size / len(body) * 100:5.1f}% {elapsed * 1000:7.1f}ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares how long the JSON encoders in `api.views.encoders` take to encode
+ChartJS payloads like the ones returned by `GraphDataView`.
+
+Each payload has timestamp labels and a mix of line datasets of floats, bar
+datasets of integers and a dataset of text values, as they are returned once
+the column types of a source have been inferred. The whole success response
+is encoded, as `success_response` does.
+
+Usage (from the `src` directory):
+    python -m benchmarks.json_encoders [--points 1000 10000 100000] [--datasets 4] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import django
+from django.conf import settings
+
+def make_payload(points, datasets):
+    """
+    Builds the body of a `GraphDataView` response.
+    """
+
+    generator = random.Random(0)
+    start = datetime(2024, 1, 1)
+    kinds = [kind for _, kind in zip(range(datasets), ['line', 'bar', 'text'] * datasets)]
+    datasets_json = []
+    for index, kind in enumerate(kinds):
+        if kind == 'line':
+            data = [round(generator.gauss(20, 5), 3) for _ in range(points)]
+        elif kind == 'bar':
+            data = [generator.randrange(1000) for _ in range(points)]
+        else:
+            data = [generator.choice(['ok', 'warning', 'fault']) for _ in range(points)]
+        datasets_json.append({ 'type': 'Bar' if kind == 'bar' else 'Line', 'label': f'Dataset {index}', 'data': data })
+    return {
+        'result': 'success',
+        'age': 12,
+        'data': {
+            'data': {
+                'labels': [(start + timedelta(seconds=point)).isoformat() for point in range(points)],
+                'datasets': datasets_json,
+            },
+            'options': { 'scales': { 'x': { 'title': { 'display': True, 'text': 'Time' } }, 'y': {} } },
+        },
+    }
+
+def timed(encoder, payload, repeat):
+    """
+    Returns the fastest time taken to encode the payload, and its size.
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encoder.encode(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000], help='Number of points of each dataset.')
+    parser.add_argument('--datasets', type=int, default=4, help='Number of datasets.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times each payload is encoded.')
+    arguments = parser.parse_args()
+
+    # The encoders are imported with the API views, which need the application
+    # to be set up:
+    settings.configure(INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'api'])
+    django.setup()
+    from api.views.encoders import JSON_ENCODERS, orjson
+
+    if orjson is None:
+        print('orjson is not installed, only the standard library encoder is measured.')
+    encoders = [encoder() for name, encoder in JSON_ENCODERS.items() if name != 'orjson' or orjson is not None]
+
+    print(f'{"points":>8} ' + ' '.join(f'{encoder.name:>17}' for encoder in encoders))
+    for points in arguments.points:
+        payload = make_payload(points, arguments.datasets)
+        results = [timed(encoder, payload, arguments.repeat) for encoder in encoders]
+        print(f'{points:>8} ' + ' '.join(f'{elapsed * 1000:8.1f}ms {size / 2 ** 10:6.0f}KB' for elapsed, size in results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares how long `GraphDataView` and `SourceDataView` take to read a wide
+source with the original row-by-row code against reading columns from a
+`ParsedSource` that is parsed once per body.
+
+- `graph`: The original view ran `csv.reader` over the whole body once per
+  dataset. The parsed source is parsed once and each dataset is a column
+  slice.
+- `source data`: The original view walked every row appending each value to
+  its column. The parsed source already stores values by column.
+
+Cleaning values with `clean_csv_value` is the same for both and is left out.
+
+Usage (from the `src` directory):
+    python -m benchmarks.parsed_source [--rows 200000] [--columns 50] [--datasets 5]
+"""
+
+import argparse
+import csv
+import gc
+import time
+from io import StringIO
+
+from api.sources.table import ParsedSource
+from benchmarks.stub_server import make_csv
+
+def graph_original(text, dataset_columns):
+    data = []
+    for column_index in dataset_columns:
+        csv_reader = csv.reader(StringIO(text))
+        next(csv_reader, None)
+        dataset_data = []
+        for row in csv_reader:
+            dataset_data.append(row[column_index] if column_index < len(row) else None)
+        data.append(dataset_data)
+    return data
+
+def graph_parsed(table, dataset_columns):
+    return [table.column(column_index, 1) for column_index in dataset_columns]
+
+def source_data_original(rows):
+    csv_reader = iter(rows)
+    current_row = next(csv_reader)
+    columns = [{ 'name': name, 'data': [] } for name in current_row]
+    for current_row in csv_reader:
+        for index, entry in enumerate(current_row):
+            columns[index]['data'].append(entry)
+    return columns
+
+def source_data_parsed(table):
+    return [
+        { 'name': table.columns[index][0], 'data': table.values(index, 1) }
+        for index in range(table.row_length(0))
+    ]
+
+def timed(function, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help='Number of data rows.')
+    parser.add_argument('--columns', type=int, default=50, help='Number of columns.')
+    parser.add_argument('--datasets', type=int, default=5, help='Number of datasets plotted from the source.')
+    arguments = parser.parse_args()
+
+    text = make_csv(arguments.rows, arguments.columns)
+    dataset_columns = [index * arguments.columns // arguments.datasets for index in range(arguments.datasets)]
+    print(f'{arguments.rows} rows x {arguments.columns} columns ({len(text) / 2 ** 20:.0f}MB), {arguments.datasets} datasets')
+
+    # The original views. Each is measured on its own so that only one copy of
+    # the rows is held at a time:
+    result, graph_before = timed(graph_original, text, dataset_columns)
+    del result
+    rows, parse_rows = timed(lambda: list(csv.reader(StringIO(text))))
+    result, source_before = timed(source_data_original, rows)
+    del result, rows
+
+    # The parsed source:
+    table, parse_table = timed(lambda: ParsedSource.from_rows(csv.reader(StringIO(text))))
+    result, graph_after = timed(graph_parsed, table, dataset_columns)
+    del result
+    result, source_after = timed(source_data_parsed, table)
+    del result, table
+
+    print(f'{"":<12} {"original":>10} {"parsed":>10}')
+    print(f'{"parse":<12} {parse_rows:9.2f}s {parse_table:9.2f}s')
+    print(f'{"graph":<12} {graph_before:9.2f}s {graph_after:9.2f}s')
+    print(f'{"source data":<12} {source_before:9.2f}s {source_after:9.2f}s')
+
+if __name__ == '__main__':
+    main()
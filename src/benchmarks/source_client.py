@@ -0,0 +1,57 @@
+"""
+Compares the per-fetch latency of a fresh `requests.get` call against the
+pooled `SourceClient` when fetching a CSV source from a local HTTP stub.
+
+Usage (from the `src` directory):
+    python -m benchmarks.source_client [--fetches N] [--rows N]
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+from api.sources.client import SourceClient
+from benchmarks.stub_server import StubServer, make_csv
+
+def measure(fetch, url, fetches):
+    """
+    Times `fetches` calls to `fetch(url)` and returns each latency in
+    milliseconds.
+    """
+
+    latencies = []
+    for _ in range(fetches):
+        start = time.perf_counter()
+        response = fetch(url)
+        response.raise_for_status()
+        response.content
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(name, latencies):
+    print(
+        f'{name:<12} mean {statistics.mean(latencies):7.3f} ms  '
+        f'p50 {statistics.median(latencies):7.3f} ms  '
+        f'max {max(latencies):7.3f} ms'
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fetches', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=100)
+    arguments = parser.parse_args()
+
+    with StubServer(make_csv(arguments.rows, 4)) as stub:
+        unpooled = measure(lambda url: requests.get(url, timeout=10), stub.url, arguments.fetches)
+        client = SourceClient()
+        pooled = measure(client.get, stub.url, arguments.fetches)
+        client.close()
+
+    print(f'{arguments.fetches} fetches of a {arguments.rows} row CSV:')
+    report('unpooled', unpooled)
+    report('pooled', pooled)
+
+if __name__ == '__main__':
+    main()
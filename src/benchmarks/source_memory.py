@@ -0,0 +1,71 @@
+"""
+Compares the peak memory used to download and parse a CSV source when the body
+is buffered in full (the original `read_source_at` behaviour) against the
+streaming parser.
+
+For each file size, `retained` is the memory held by the parsed rows once the
+read has finished and `overhead` is how far above that the peak went. The
+buffered overhead grows with the size of the file, the streamed overhead stays
+flat.
+
+Usage (from the `src` directory):
+    python -m benchmarks.source_memory [--sizes 1 4 16]
+"""
+
+import argparse
+import csv
+import gc
+import tracemalloc
+from io import StringIO
+
+import nh3
+import requests
+
+from api.sources.client import SourceClient
+from api.sources.stream import read_csv_stream
+from benchmarks.stub_server import StubServer, make_csv
+
+def read_buffered(url):
+    response = requests.get(url, timeout=10)
+    csv_file = StringIO(nh3.clean(response.text))
+    return list(csv.reader(csv_file))
+
+def read_streamed(client, url):
+    response = client.get(url, stream=True)
+    try:
+        return read_csv_stream(response, max_bytes=1 << 30, max_rows=1 << 30)
+    finally:
+        response.close()
+
+def measure(read):
+    """
+    Runs `read()` and returns the memory (in MiB) retained by its result, and
+    the peak memory used while it ran.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    rows = read()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return retained / 2 ** 20, peak / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='File sizes in MiB.')
+    arguments = parser.parse_args()
+
+    client = SourceClient()
+    print(f'{"size":>8} {"method":<9} {"retained":>10} {"peak":>10} {"overhead":>10}')
+    for size in arguments.sizes:
+        # Each row of 8 columns is roughly 75 bytes:
+        body = make_csv(int(size * 2 ** 20 / 75), 8)
+        with StubServer(body) as stub:
+            for name, read in (('buffered', lambda: read_buffered(stub.url)), ('streamed', lambda: read_streamed(client, stub.url))):
+                retained, peak = measure(read)
+                print(f'{len(body) / 2 ** 20:6.1f}MB {name:<9} {retained:8.1f}MB {peak:8.1f}MB {peak - retained:8.1f}MB')
+    client.close()
+
+if __name__ == '__main__':
+    main()
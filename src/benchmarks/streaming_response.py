@@ -0,0 +1,105 @@
+"""
+Compares the source data response built by `success_response` against the
+same response streamed by `streaming_success_response`.
+
+- `peak`: Peak memory while the response is built and its body is read, as a
+  server would send it, measured with `tracemalloc`. The parsed table that the
+  columns are read from is not counted.
+- `first`: Time until the first chunk of the body is ready.
+- `total`: Time until the whole body has been read.
+
+Each column is read and cleaned as `SourceDataView` does: all at once with
+`values` and `clean_csv_column`, or a chunk at a time with `iter_values` and
+`iter_csv_column` for the streamed response.
+
+Usage (from the `src` directory):
+    python -m benchmarks.streaming_response [--rows 1000000] [--columns 4]
+"""
+
+import argparse
+import csv
+import gc
+import time
+import tracemalloc
+from io import StringIO
+
+import django
+from django.conf import settings
+
+def build(table, streamed):
+    from api.views.response import streaming_success_response, success_response
+    from api.views.utility import clean_csv_column, iter_csv_column
+
+    columns = [
+        {
+            'index': index,
+            'name': table.columns[index][0],
+            'data': iter_csv_column(table.iter_values(index, 1)) if streamed else clean_csv_column(table.values(index, 1))
+        }
+        for index in range(table.row_length(0))
+    ]
+    respond = streaming_success_response if streamed else success_response
+    return respond(columns, 200)
+
+def read(response):
+    """
+    Reads the body of a response a chunk at a time, returning the seconds
+    taken until the first chunk was ready.
+    """
+
+    start = time.perf_counter()
+    first = None
+    chunks = response.streaming_content if response.streaming else [response.content]
+    for _ in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+def measure(table, streamed):
+    gc.collect()
+    start = time.perf_counter()
+    response = build(table, streamed)
+    built = time.perf_counter() - start
+    first = built + read(response)
+    total = time.perf_counter() - start
+    del response
+
+    gc.collect()
+    tracemalloc.start()
+    read(build(table, streamed))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20, first, total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of data rows.')
+    parser.add_argument('--columns', type=int, default=4, help='Number of columns.')
+    arguments = parser.parse_args()
+
+    # The response helpers are imported with the API views, which need the
+    # application to be set up:
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'api'],
+        SOURCE_STREAMING_THRESHOLD=0,
+    )
+    django.setup()
+    from api.sources.table import ParsedSource
+
+    lines = [','.join(f'Column {index}' for index in range(arguments.columns))]
+    lines += [','.join(f'{row * index}.{row % 7}' for index in range(arguments.columns)) for row in range(arguments.rows)]
+    table = ParsedSource.from_rows(csv.reader(StringIO('\n'.join(lines))))
+    table.infer_types()
+    del lines
+    print(f'{arguments.rows} rows x {arguments.columns} columns')
+
+    buffered = measure(table, streamed=False)
+    streamed = measure(table, streamed=True)
+
+    print(f'{"":<6} {"buffered":>10} {"streamed":>10}')
+    print(f'{"peak":<6} {buffered[0]:8.1f}MB {streamed[0]:8.1f}MB')
+    print(f'{"first":<6} {buffered[1]:9.2f}s {streamed[1]:9.2f}s')
+    print(f'{"total":<6} {buffered[2]:9.2f}s {streamed[2]:9.2f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Local HTTP stub used by the benchmarks to serve CSV data without touching the
+network.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_csv(rows, columns, header=True):
+    """
+    Builds a CSV document of numeric data.
+
+    Arguments:
+    - rows (int): Number of data rows.
+    - columns (int): Number of columns.
+    - header (bool, optional): Include a header row.
+    """
+
+    lines = []
+    if header:
+        lines.append(','.join(f'Column {column}' for column in range(columns)))
+    for row in range(rows):
+        lines.append(','.join(str(row * columns + column) for column in range(columns)))
+    return '\n'.join(lines) + '\n'
+
+class StubServer:
+    """
+    Serves a fixed CSV body from a background thread.
+
+    The stub speaks HTTP/1.1 so that clients are able to keep connections
+    alive between requests.
+
+    Attributes:
+    - body (bytes): Body returned for every request.
+    - headers (dict): Additional headers returned for every request.
+    - requests (int): Number of requests that have been served.
+    """
+
+    def __init__(self, body, headers=None):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.headers = headers or {}
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(stub.body)))
+                for name, value in stub.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """
+        URL that the stub is serving from.
+        """
+
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/source.csv'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,104 @@
+"""
+Compares a parsed source whose values are all strings against the same source
+once its column types have been inferred, so that numeric columns are stored
+in arrays.
+
+- `memory`: Memory retained by the parsed table, measured with `tracemalloc`.
+- `json`: Size of the columns as they are returned by `SourceDataView`.
+- `time`: Time taken to parse the source, and to infer its column types. This
+  is measured separately, without `tracemalloc`.
+
+The source has an integer counter, float readings, an ISO timestamp and a text
+column, repeated to fill the requested number of columns.
+
+Usage (from the `src` directory):
+    python -m benchmarks.typed_columns [--rows 200000] [--columns 20]
+"""
+
+import argparse
+import csv
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import StringIO
+
+from api.sources.table import ParsedSource
+
+def make_source(rows, columns):
+    """
+    Builds a CSV document with a mix of column types.
+    """
+
+    generator = random.Random(0)
+    start = datetime(2024, 1, 1)
+    kinds = [kind for _, kind in zip(range(columns), ['int', 'float', 'timestamp', 'string'] * columns)]
+    lines = [','.join(f'{kind} {index}' for index, kind in enumerate(kinds))]
+    for row in range(rows):
+        values = []
+        for kind in kinds:
+            if kind == 'int':
+                values.append(str(row))
+            elif kind == 'float':
+                values.append(f'{generator.gauss(20, 5):.3f}')
+            elif kind == 'timestamp':
+                values.append((start + timedelta(seconds=row)).isoformat())
+            else:
+                values.append(generator.choice(['ok', 'warning', 'fault']))
+        lines.append(','.join(values))
+    return '\n'.join(lines) + '\n'
+
+def parse(text, infer):
+    table = ParsedSource.from_rows(csv.reader(StringIO(text)))
+    if infer:
+        table.infer_types()
+    return table
+
+def measure(text, infer):
+    """
+    Returns the parsed table, the memory (in MiB) that it retains and the
+    seconds taken to parse it.
+    """
+
+    gc.collect()
+    start = time.perf_counter()
+    table = parse(text, infer)
+    elapsed = time.perf_counter() - start
+    del table
+
+    gc.collect()
+    tracemalloc.start()
+    table = parse(text, infer)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return table, retained / 2 ** 20, elapsed
+
+def payload_size(table):
+    columns = [table.values(index, 1) for index in range(table.column_count)]
+    return len(json.dumps(columns, separators=(',', ':'))) / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help='Number of data rows.')
+    parser.add_argument('--columns', type=int, default=20, help='Number of columns.')
+    arguments = parser.parse_args()
+
+    text = make_source(arguments.rows, arguments.columns)
+    print(f'{arguments.rows} rows x {arguments.columns} columns ({len(text) / 2 ** 20:.0f}MB)')
+
+    table, strings_memory, strings_time = measure(text, infer=False)
+    strings_json = payload_size(table)
+    del table
+    table, typed_memory, typed_time = measure(text, infer=True)
+    typed_json = payload_size(table)
+    del table
+
+    print(f'{"":<8} {"strings":>10} {"typed":>10}')
+    print(f'{"memory":<8} {strings_memory:8.1f}MB {typed_memory:8.1f}MB')
+    print(f'{"json":<8} {strings_json:8.1f}MB {typed_json:8.1f}MB')
+    print(f'{"time":<8} {strings_time:9.2f}s {typed_time:9.2f}s')
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,14 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 
 # Dashboard view:
 @login_required
 def dashboard_view(request):
-    return render(request, 'dashboard.html')
+    return render(request, 'dashboard.html', { 'graph_stream_enabled': settings.GRAPH_STREAM_ENABLED })
 
 def graphs_view(request):
-    return render(request, 'graphs.html')
+    return render(request, 'graphs.html', { 'graph_stream_enabled': settings.GRAPH_STREAM_ENABLED })
 
 def sources_view(request):
     return render(request, 'sources.html')
\ No newline at end of file
@@ -20,6 +20,29 @@ const validPlotTypes = [
     'scatter'
 ];
 
+/**
+ * Bodies of the `GET` responses that the API returned an `ETag` for, keyed by
+ * endpoint. Each entry holds the `etag` and the `body` of the response, so that
+ * the body can be re-used when the API responds with `304 Not Modified`. The
+ * entries are kept in the order they were last used, so that the least
+ * recently used entry can be evicted once there are `apiResponseCacheSize` of
+ * them.
+ */
+const apiResponseCache = new Map();
+const apiResponseCacheSize = 64;
+
+/**
+ * Checks if the response from an endpoint should be cached. Responses to
+ * requests for the changes `since` a version are never requested again once
+ * the client has a newer version, so they are not cached.
+ *
+ * @param {string} endpoint API endpoint that the response is from.
+ * @returns Returns true if the response should be cached.
+ */
+function isCacheableEndpoint(endpoint) {
+    return !new URL(endpoint, window.location.origin).searchParams.has('since');
+}
+
 /**
  * Handles an error when communicating with the API.
  * 
@@ -58,16 +81,45 @@ async function queryApi(endpoint, method='GET', body=null) {
     if (body != null && body.constructor == Object) {
         body = JSON.stringify(body);
     }
+    const headers = {
+        'X-CSRFToken': csrfToken,
+        'Content-Type': 'application/json'
+    };
+    // Ask the API to only send the body if it has changed since it was cached:
+    const cached = method == 'GET' ? apiResponseCache.get(endpoint) : undefined;
+    if (cached !== undefined) {
+        headers['If-None-Match'] = cached.etag;
+        // Mark the entry as the most recently used:
+        apiResponseCache.delete(endpoint);
+        apiResponseCache.set(endpoint, cached);
+    }
     try {
         const response = await fetch(endpoint, {
             method: method,
-            headers: {
-                'X-CSRFToken': csrfToken,
-                'Content-Type': 'application/json'
-            },
+            headers: headers,
             body: body
         })
-        return await response.json();
+        if (response.status == 304 && cached !== undefined) {
+            // The cached body is still current. A copy is returned so that the
+            // cached body cannot be modified by the caller:
+            const cachedBody = structuredClone(cached.body);
+            const age = response.headers.get('Age');
+            if (age !== null && 'age' in cachedBody) {
+                cachedBody.age = parseInt(age);
+            }
+            return cachedBody;
+        }
+        const responseBody = await response.json();
+        const etag = response.headers.get('ETag');
+        if (method == 'GET' && response.ok && etag !== null && isCacheableEndpoint(endpoint)) {
+            apiResponseCache.delete(endpoint);
+            apiResponseCache.set(endpoint, { etag: etag, body: structuredClone(responseBody) });
+            // Evict the least recently used entries:
+            while (apiResponseCache.size > apiResponseCacheSize) {
+                apiResponseCache.delete(apiResponseCache.keys().next().value);
+            }
+        }
+        return responseBody;
     } catch (error) {
         console.error(error);
         return apiError("Failed to communicate with API. Check console for more information.");
@@ -199,17 +251,37 @@ async function updateSource(sourceId, name, location, hasHeader) {
  * Fetches the source data.
  * 
  * @param {number} sourceId ID of the source.
- * @returns Returns a JSON object containing the source data.
+ * @param {object} options Optional parameters: `columns` (an array of the
+ * indices of the columns to fetch), `offset` and `limit` (the rows to fetch),
+ * and `headerOnly` (fetch the names and types of the columns without any
+ * rows).
+ * @returns Returns a JSON object containing the source data, along with the
+ * `total_rows` and `total_columns` of the source.
  */
-async function getSourceData(sourceId) {
+async function getSourceData(sourceId, options = {}) {
     // Validate parameters:
     if (typeof sourceId !== 'number' || !Number.isInteger(sourceId)) {
         return apiError("Invalid parameter: `sourceId` must be an integer.");
     }
 
+    // Build the query:
+    const query = new URLSearchParams();
+    if (options.columns !== undefined) {
+        query.set('columns', options.columns.join(','));
+    }
+    if (options.offset !== undefined) {
+        query.set('offset', options.offset);
+    }
+    if (options.limit !== undefined) {
+        query.set('limit', options.limit);
+    }
+    if (options.headerOnly) {
+        query.set('header_only', '1');
+    }
+
     // Submit to the API:
     return await queryApi(
-        `/api/source/${sourceId}/data/`,
+        query.toString() !== '' ? `/api/source/${sourceId}/data/?${query}` : `/api/source/${sourceId}/data/`,
         method = 'GET'
     );
 }
@@ -507,22 +579,177 @@ async function updateGraphDataset(graphId, datasetId, label, plotType, isAxis, s
  * Requests the ChartJs data to plot for a given graph.
  * 
  * @param {number} graphId ID of the graph to fetch the ChartJs data for.
+ * @param {number} maxPoints Most points to fetch for each dataset. Datasets
+ * with more points are downsampled by the server. If this is `null`, the
+ * default of the graph is used.
+ * @param {string} since `version` returned with the data that the caller
+ * already has. If the server can, it only returns the rows appended since,
+ * along with `start`: the index of the first of them. If this is `null`, all
+ * of the data is fetched.
  * @returns Returns a JSON object containing the ChartJs data to plot for the
  * graph.
  */
-async function getGraphChartJsData(graphId) {
+async function getGraphChartJsData(graphId, maxPoints = null, since = null) {
     // Validate parameters:
     if (typeof graphId !== 'number' || !Number.isInteger(graphId)) {
         return apiError("Invalid parameter: `graphId` must be an integer.");
     }
+    if (maxPoints !== null && (typeof maxPoints !== 'number' || !Number.isInteger(maxPoints))) {
+        return apiError("Invalid parameter: `maxPoints` must be an integer.");
+    }
+    if (since !== null && typeof since !== 'string') {
+        return apiError("Invalid parameter: `since` must be a string.");
+    }
+
+    // Submit to the API:
+    const query = new URLSearchParams();
+    if (maxPoints !== null) {
+        query.set('max_points', maxPoints);
+    }
+    if (since !== null) {
+        query.set('since', since);
+    }
+    return await queryApi(
+        query.toString() !== '' ? `/api/graph/${graphId}/data/?${query}` : `/api/graph/${graphId}/data/`,
+        method = 'GET',
+    );
+}
+
+/**
+ * Requests the ChartJs data to plot for many graphs in a single request. Each
+ * distinct source is only read once by the server, no matter how many of the
+ * graphs plot it.
+ * 
+ * @param {Array} graphIds IDs of the graphs to fetch the ChartJs data for. If
+ * this is `null`, the data of every graph is fetched.
+ * @param {number} maxPoints Most points to fetch for each dataset. If this is
+ * `null`, the default of each graph is used.
+ * @returns Returns a JSON object whose `data` maps the ID of each graph to the
+ * same JSON object that `getGraphChartJsData` returns for it. A graph that
+ * could not be built has an error result, without failing the others.
+ */
+async function getGraphsChartJsData(graphIds = null, maxPoints = null) {
+    // Validate parameters:
+    if (graphIds !== null && (!Array.isArray(graphIds) || !graphIds.every(Number.isInteger))) {
+        return apiError("Invalid parameter: `graphIds` must be an array of integers.");
+    }
+    if (maxPoints !== null && (typeof maxPoints !== 'number' || !Number.isInteger(maxPoints))) {
+        return apiError("Invalid parameter: `maxPoints` must be an integer.");
+    }
 
     // Submit to the API:
+    const query = new URLSearchParams();
+    if (graphIds !== null) {
+        query.set('ids', graphIds.join(','));
+    }
+    if (maxPoints !== null) {
+        query.set('max_points', maxPoints);
+    }
     return await queryApi(
-        `/api/graph/${graphId}/data/`,
+        query.toString() !== '' ? `/api/graph/data/?${query}` : `/api/graph/data/`,
         method = 'GET',
     );
 }
 
+/**
+ * Subscribes to the ChartJs data of many graphs over a single connection. The
+ * server pushes all of the data of each graph first, and then an update only
+ * when a source of a graph changes, so the data does not need to be polled.
+ *
+ * @param {Array} graphIds IDs of the graphs to subscribe to.
+ * @param {Object} since Maps the ID of each graph whose data the caller
+ * already has to the `version` returned with it, so that the server starts
+ * with only the rows appended since. The server starts with all of the data
+ * of every other graph.
+ * @param {function} onUpdate Called with the ID of the graph and each update,
+ * which is a JSON object like the one returned by `getGraphChartJsData`. If
+ * `start` is set, the update only contains the rows from the index `start`
+ * onwards.
+ * @param {function} onError Called with an error message and the ID of the
+ * graph when an update could not be built, or with an error message and
+ * `null` when the subscription has failed and has been closed. The caller
+ * should fall back to `getGraphsChartJsData` if it has been closed.
+ * @returns Returns the `EventSource` of the subscription, which should be
+ * closed with `close()` once it is no longer needed, or `null` if the browser
+ * does not support subscriptions.
+ */
+function subscribeGraphsChartJsData(graphIds, since, onUpdate, onError = null) {
+    // Validate parameters:
+    if (!Array.isArray(graphIds) || !graphIds.every(Number.isInteger)) {
+        apiError("Invalid parameter: `graphIds` must be an array of integers.");
+        return null;
+    }
+    if (since === null || typeof since !== 'object' || !Object.values(since).every(version => typeof version === 'string')) {
+        apiError("Invalid parameter: `since` must map graph IDs to strings.");
+        return null;
+    }
+    if (typeof EventSource === 'undefined') {
+        return null;
+    }
+
+    // The browser reconnects on its own if the connection is lost, and only
+    // closes the subscription if the server refuses it:
+    const query = new URLSearchParams({ ids: graphIds.join(',') });
+    const versions = Object.entries(since).map(([graphId, version]) => `${graphId}:${version}`);
+    if (versions.length > 0) {
+        query.set('since', versions.join(','));
+    }
+    const source = new EventSource(`/api/graph/stream/?${query}`);
+    source.addEventListener('update', (event) => {
+        const update = JSON.parse(event.data);
+        onUpdate(update.graph, update);
+    });
+    source.addEventListener('failure', (event) => {
+        if (onError !== null) {
+            const failure = JSON.parse(event.data);
+            onError(failure.message, failure.graph);
+        }
+    });
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED && onError !== null) {
+            onError("The subscription to the graphs has closed.", null);
+        }
+    });
+    return source;
+}
+
+/**
+ * Subscribes to the ChartJs data of a given graph. See
+ * `subscribeGraphsChartJsData`.
+ *
+ * @param {number} graphId ID of the graph to subscribe to.
+ * @param {string} since `version` returned with the data that the caller
+ * already has, so that the server starts with only the rows appended since.
+ * If this is `null`, the server starts with all of the data.
+ * @param {function} onUpdate Called with each update, which is a JSON object
+ * like the one returned by `getGraphChartJsData`. If `start` is set, the
+ * update only contains the rows from the index `start` onwards.
+ * @param {function} onError Called with an error message when an update
+ * could not be built, or when the subscription has failed and has been
+ * closed. The caller should fall back to `getGraphChartJsData` if it has been
+ * closed.
+ * @returns Returns the `EventSource` of the subscription, which should be
+ * closed with `close()` once it is no longer needed, or `null` if the browser
+ * does not support subscriptions.
+ */
+function subscribeGraphChartJsData(graphId, since, onUpdate, onError = null) {
+    // Validate parameters:
+    if (typeof graphId !== 'number' || !Number.isInteger(graphId)) {
+        apiError("Invalid parameter: `graphId` must be an integer.");
+        return null;
+    }
+    if (since !== null && typeof since !== 'string') {
+        apiError("Invalid parameter: `since` must be a string.");
+        return null;
+    }
+    return subscribeGraphsChartJsData(
+        [graphId],
+        since !== null ? { [graphId]: since } : {},
+        (updateGraphId, update) => onUpdate(update),
+        onError !== null ? (message) => onError(message) : null
+    );
+}
+
 /**
  * Gets a URL parameter from the URL.
  * 
@@ -1,5 +1,21 @@
-function updateChart(chart, json, animate) {
+/**
+ * Updates a chart with the ChartJs data returned by the API.
+ * 
+ * @param {Chart} chart Chart to update.
+ * @param {*} json ChartJs data and options to plot.
+ * @param {boolean} animate Whether the update should be animated.
+ * @param {number} start If the API only returned the rows appended since the
+ * data that the chart already has, the index of the first of them. The rows
+ * of the chart from this index onwards are replaced. If this is `null`, all of
+ * the data of the chart is replaced.
+ * @returns Returns true if the chart was updated.
+ */
+function updateChart(chart, json, animate, start = null) {
     if (chart == null || json == null) return false;
+    if (start !== null && appendChart(chart, json, start)) {
+        chart.update(animate ? undefined : 'none');
+        return true;
+    }
     const datasetCount = json.data.datasets.length;
     const visibility = [];
     chart.data.datasets.forEach((_dataset, index) => {
@@ -22,4 +38,37 @@ function updateChart(chart, json, animate) {
     chart.options = json.options;
     chart.update();
     return true;
-}
\ No newline at end of file
+}
+
+/**
+ * Replaces the rows of a chart from `start` onwards with the rows returned by
+ * the API, keeping the rows before `start`.
+ * 
+ * @param {Chart} chart Chart to update.
+ * @param {*} json ChartJs data and options to plot.
+ * @param {number} start Index of the first row returned by the API.
+ * @returns Returns false if the chart does not have the same datasets as the
+ * data, in which case all of the data should be replaced instead.
+ */
+function appendChart(chart, json, start) {
+    const datasets = chart.data.datasets ?? [];
+    if (datasets.length != json.data.datasets.length || ('labels' in json.data) != Array.isArray(chart.data.labels)) {
+        return false;
+    }
+    const append = (values, appended) => {
+        // Rows with no value at the end of a dataset were not returned, so
+        // they are filled in before the appended rows:
+        values.length = Math.min(values.length, start);
+        while (values.length < start) {
+            values.push(null);
+        }
+        for (const value of appended) {
+            values.push(value);
+        }
+    };
+    if ('labels' in json.data) {
+        append(chart.data.labels, json.data.labels);
+    }
+    datasets.forEach((dataset, index) => append(dataset.data, json.data.datasets[index].data));
+    return true;
+}